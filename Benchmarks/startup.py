@@ -0,0 +1,165 @@
+""" Startup time of Mordor. It measures the time from launching Python until the splash window is shown
+(time-to-splash) and the time from selecting an experiment until its window is drawn, with its empty plot
+(time-to-first-plot).
+
+Each measurement is done in a new process, with an empty home directory so the data and configuration of the user are
+not touched and the dummy devices are used. The first run of each experiment is 'cold': Python has to compile all the
+modules (Mordor's and those of numpy, matplotlib...) because it uses a new bytecode cache. The following runs are
+'warm': they reuse that cache. The disk cache of the operating system can not be cleared from here, so the cold times
+are a lower limit of what is seen after rebooting the computer.
+
+A display is needed, as the real windows are created. Run it from the Mordor folder with:
+
+    python Benchmarks/startup.py [--runs 5] [--output startup.jsonl] [IV Spectroscopy ...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The name of each experiment and the method of the splash that opens it
+experiments = {'Spectroscopy': 'spectroscopy',
+               'IV': 'iv',
+               'Temperature': 'temperature',
+               'Flash': 'flash',
+               'CV': 'cv'}
+
+
+def child(experiment, start):
+    """ Launches Mordor without starting the main loop, opens one experiment and prints the times as a JSON line. This
+    is run in a new process by measure.
+
+    :param experiment: The name of the experiment to open
+    :param start: The time (time.time) at which the process was launched
+    :return: None
+    """
+    sys.path.insert(0, root)
+    os.chdir(root)
+
+    import Mordor
+
+    # The preload is disabled, so the import of the experiment is part of its time-to-first-plot
+    splash = Mordor.Splash(mainloop=False, preload=False)
+    splash.splashroot.update()
+    splash_time = time.time() - start
+
+    t0 = time.perf_counter()
+    getattr(splash, experiments[experiment])()
+    splash.splashroot.update()
+    plot_time = time.perf_counter() - t0
+
+    print(json.dumps({'splash': splash_time, 'plot': plot_time}))
+    sys.stdout.flush()
+
+    splash.devman.close_all()
+    splash.splashroot.destroy()
+
+
+def measure(experiment, cache, home, timeout=120):
+    """ Runs a new process that opens an experiment and gets its times
+
+    :param experiment: The name of the experiment
+    :param cache: The folder used as bytecode cache
+    :param home: The folder used as home directory
+    :param timeout: Maximum time (s) for the process to finish. Default=120
+    :return: A dictionary with the time-to-splash and time-to-first-plot, in seconds
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=cache, HOME=home, USERPROFILE=home)
+    start = time.time()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', experiment, '--start', repr(start)],
+                            cwd=root, env=env, stdout=subprocess.PIPE, universal_newlines=True, timeout=timeout)
+
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+
+    raise RuntimeError('{0} did not report its times (exit code {1})'.format(experiment, result.returncode))
+
+
+def benchmark(names, runs=5):
+    """ Measures the cold and warm times of each experiment
+
+    :param names: List with the names of the experiments
+    :param runs: Number of warm runs of each experiment. Default=5
+    :return: A list of dictionaries with the results of each experiment
+    """
+    results = []
+    for name in names:
+        cache = tempfile.mkdtemp(prefix='mordor_cache_')
+        home = tempfile.mkdtemp(prefix='mordor_home_')
+        try:
+            cold = measure(name, cache, home)
+            warm = [measure(name, cache, home) for _ in range(runs)]
+        finally:
+            shutil.rmtree(cache, ignore_errors=True)
+            shutil.rmtree(home, ignore_errors=True)
+
+        results.append({'experiment': name,
+                        'cold_splash': cold['splash'],
+                        'cold_plot': cold['plot'],
+                        'warm_splash': float(np.median([w['splash'] for w in warm])),
+                        'warm_plot': float(np.median([w['plot'] for w in warm])),
+                        'runs': runs})
+
+    return results
+
+
+def report(results):
+    """ Formats the results as a table, with the times in ms. The warm times are the median of all the runs.
+
+    :param results: The list of results given by benchmark
+    :return: A string with the table
+    """
+    lines = ['{0:<14}{1:>14}{2:>14}{3:>14}{4:>14}'.format('Experiment', 'Cold splash', 'Warm splash', 'Cold plot',
+                                                         'Warm plot')]
+    for r in results:
+        lines.append('{0:<14}{1:>14.0f}{2:>14.0f}{3:>14.0f}{4:>14.0f}'.format(r['experiment'], r['cold_splash'] * 1000,
+                                                                          r['warm_splash'] * 1000,
+                                                                          r['cold_plot'] * 1000,
+                                                                          r['warm_plot'] * 1000))
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-to-splash and time-to-first-plot of Mordor.')
+    parser.add_argument('experiments', nargs='*',
+                        help='Experiments to measure, among: {0}. Default: all of them'.format(', '.join(experiments)))
+    parser.add_argument('--runs', type=int, default=5, help='Number of warm runs of each experiment. Default: 5')
+    parser.add_argument('--output', help='File where the results are appended, as JSON lines')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--start', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    for name in args.experiments:
+        if name not in experiments:
+            parser.error('unknown experiment: {0}'.format(name))
+
+    if args.child is not None:
+        child(args.child, args.start)
+        return
+
+    results = benchmark(args.experiments or list(experiments), args.runs)
+    print(report(results))
+
+    if args.output is not None:
+        with open(args.output, 'a') as f:
+            for r in results:
+                r.update({'date': datetime.now().isoformat(), 'python': platform.python_version(),
+                          'platform': platform.platform()})
+                f.write(json.dumps(r) + '\n')
+
+
+if __name__ == '__main__':
+    main()
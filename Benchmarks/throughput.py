@@ -0,0 +1,585 @@
+""" End to end throughput of the scans of each experiment, using the dummy devices. It measures how many points per
+second get from the devices to the plot and the disk, how the time is split between the stages of the scan and the peak
+memory used.
+
+Mordor itself is run, with the experiment selector hidden, and the scans are started with the Run buttons of the
+experiments, as a user would do, once their entries are filled. The stages are timed by wrapping, while the benchmark
+runs, the methods of Mordor where each of them is done:
+
+- device: time spent in the calls to the devices, as timed by the device manager with 'Time device I/O'
+- processing: time spent by the experiment handling the new data, excluding the plot and the disk
+- plot: time spent updating the plot and rendering the canvas
+- disk: time spent writing the journal and finishing the measurement
+
+The peak memory is that allocated by Python (including numpy arrays) during a second run of the scan, as tracing the
+allocations slows down the first one too much to time it.
+
+Each run uses an empty home directory, so the data and configuration of the user are not touched and the dummy devices
+are used. A display is needed, as the real windows are created. Run it from the Mordor folder with:
+
+    python Benchmarks/throughput.py [--points 50] [--output throughput.jsonl] [IV Lock-in ...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import functools
+import threading
+import traceback
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import Mordor
+import plot_utils as pu
+from journal import Journal
+from Experiments.acquisition import Acquisition
+from Devices.instrumentation import IOStats
+
+stage_names = ['device', 'processing', 'plot', 'disk']
+
+# The name of each experiment and the method of the splash that opens it
+experiments = {'Spectroscopy': 'spectroscopy',
+               'IV': 'iv',
+               'Temperature': 'temperature',
+               'Flash': 'flash',
+               'CV': 'cv'}
+
+
+class Stages(object):
+    """ Accumulates the time spent in each stage of a scan. The time of a stage does not include the time of the stages
+    nested in it, so the stages can be added up. Each thread keeps its own nesting.
+    """
+
+    def __init__(self):
+        """ Constructor of the Stages class
+        """
+        self.totals = dict.fromkeys(stage_names, 0.)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def reset(self):
+        """ Sets the time of all the stages to zero
+
+        :return: None
+        """
+        with self.lock:
+            self.totals = dict.fromkeys(stage_names, 0.)
+
+    def stack(self):
+        """ The time spent in the nested stages of each stage that is running in the current thread
+
+        :return: A list, with the innermost stage at the end
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def add(self, name, elapsed, nested=0.):
+        """ Adds the time spent in a stage
+
+        :param name: The name of the stage
+        :param elapsed: The time, in seconds
+        :param nested: The part of that time spent in nested stages. Default=0.
+        :return: None
+        """
+        with self.lock:
+            self.totals[name] += elapsed - nested
+
+        stack = self.stack()
+        if len(stack) > 0:
+            stack[-1] += elapsed
+
+    @contextmanager
+    def __call__(self, name):
+        """ Times the code run in a with block as part of a stage
+
+        :param name: The name of the stage
+        """
+        stack = self.stack()
+        stack.append(0.)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(name, elapsed, stack.pop())
+
+    def timed(self, name, func):
+        """ Wraps a function so its calls are timed as part of a stage
+
+        :param name: The name of the stage
+        :param func: The function
+        :return: The wrapped function
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class Session(object):
+    """ Mordor running in a temporary home directory, with the methods where each stage of the scans is done timed. It
+    is used as a context manager, which restores the methods, the devices and the home directory when it exits.
+    """
+
+    def __init__(self, timeout=600, trace=False):
+        """ Constructor of the Session class
+
+        :param timeout: Maximum duration of the scan, in seconds. Default=600
+        :param trace: If the memory allocations of the scan must be traced. Default=False
+        """
+        self.timeout = timeout
+        self.trace = trace
+
+        self.stages = Stages()
+        self.splash = None
+        self.patched = []
+        self.finished = 0
+        self.wall = None
+        self.peak = None
+
+        self.home = None
+        self.environ = {}
+
+    def __enter__(self):
+        from Experiments import Temperature, Flash
+
+        # The methods where each stage is done. The calls to the devices are timed by the device manager itself
+        self.patch(Acquisition, 'poll', self.poll)
+        self.patch(Mordor.Mordor, 'prepare_meas', 'plot')
+        self.patch(Mordor.Mordor, 'update_plot', 'plot')
+        self.patch(Mordor.Mordor, 'finish_meas', 'disk')
+        self.patch(pu.Blitter, 'animate', 'plot')
+        self.patch(Journal, '__init__', 'disk')
+        self.patch(Journal, 'write', 'disk')
+        self.patch(Temperature, 'update_plot', 'plot')
+        self.patch(Flash, 'update_plot', 'plot')
+        self.patch(IOStats, 'add', self.add)
+
+        self.home = tempfile.mkdtemp(prefix='mordor_throughput_')
+        for key in ['HOME', 'USERPROFILE']:
+            self.environ[key] = os.environ.get(key)
+            os.environ[key] = self.home
+
+        try:
+            self.splash = Mordor.Splash(mainloop=False, preload=False)
+            self.splash.hide()
+            self.splash.devman.instrument_var.set(True)
+        except BaseException:
+            self.__exit__(*sys.exc_info())
+            raise
+
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        if self.splash is not None:
+            for window in self.splash.runing:
+                self.close(window)
+
+            self.splash.devman.close_all()
+            self.splash.splashroot.destroy()
+            self.splash = None
+
+        for cls, name, original in reversed(self.patched):
+            setattr(cls, name, original)
+        self.patched = []
+
+        for key, value in self.environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+        if self.home is not None:
+            shutil.rmtree(self.home, ignore_errors=True)
+            self.home = None
+
+        return False
+
+    def patch(self, cls, name, stage):
+        """ Replaces a method of a class by a timed one until the session exits
+
+        :param cls: The class
+        :param name: The name of the method
+        :param stage: The name of the stage where the method is timed, or a function that gets the original method and
+        gives the new one
+        :return: None
+        """
+        original = cls.__dict__[name]
+        self.patched.append((cls, name, original))
+
+        if callable(stage):
+            setattr(cls, name, stage(original))
+        else:
+            setattr(cls, name, self.stages.timed(stage, original))
+
+    def poll(self, original):
+        """ Times the data handling of the acquisitions and counts those that have finished
+
+        :param original: The original Acquisition.poll
+        :return: The new Acquisition.poll
+        """
+        @functools.wraps(original)
+        def poll(acquisition):
+            # If the worker was finished before the poll, on_finish is called in it
+            finished = acquisition.finished.is_set() and not acquisition.closed
+            with self.stages('processing'):
+                original(acquisition)
+            if finished:
+                self.finished += 1
+
+        return poll
+
+    def add(self, original):
+        """ Adds the calls to the devices timed by the device manager to the 'device' stage
+
+        :param original: The original IOStats.add
+        :return: The new IOStats.add
+        """
+        @functools.wraps(original)
+        def add(stats, device, method, value):
+            original(stats, device, method, value)
+            self.stages.add('device', value)
+
+        return add
+
+    def open(self, experiment):
+        """ Opens an experiment, as its button in the experiment selector does
+
+        :param experiment: The name of the experiment
+        :return: The Mordor window of the experiment or, for those with their own window, the experiment itself
+        """
+        getattr(self.splash, experiments[experiment])()
+        self.splash.splashroot.update()
+        return self.splash.runing[-1]
+
+    def click(self, command):
+        """ Runs the command of a button, timing it as part of the 'processing' stage
+
+        :param command: The command
+        :return: None
+        """
+        with self.stages('processing'):
+            command()
+
+    def run(self, command, done):
+        """ Starts a scan with the command of its button and runs the event loop until it is done. Only the scan is
+        timed and, if requested, traced: the stages and the I/O statistics are reset before.
+
+        :param command: The command that starts the scan
+        :param done: Function that tells if the scan is done. It can start a new scan, eg. the next of several sweeps
+        :return: None
+        """
+        self.stages.reset()
+        self.splash.devman.io_stats.reset()
+        self.finished = 0
+
+        if self.trace:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        self.click(command)
+
+        while not done():
+            if time.perf_counter() - start > self.timeout:
+                raise TimeoutError('The scan did not finish in {0} s'.format(self.timeout))
+
+            self.splash.splashroot.update()
+            time.sleep(0.001)
+
+        self.wall = time.perf_counter() - start
+
+        if self.trace:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def close(self, window):
+        """ Stops anything an experiment left running and releases its data, without the questions asked when its window
+        is closed
+
+        :param window: The Mordor window of the experiment, or the experiment itself
+        :return: None
+        """
+        experiment = getattr(window, 'experiment', window)
+
+        acquisition = getattr(experiment, 'acquisition', None)
+        if acquisition is not None:
+            acquisition.close()
+
+        if getattr(experiment, 'stream', None) is not None:
+            experiment.stop_stream()
+
+        # The data of the finished measurements might be memory mapped from the home directory
+        if isinstance(window, Mordor.Mordor):
+            window.all_data.clear()
+
+
+def set_entry(entry, value):
+    """ Writes a value in an entry of the front end
+
+    :param entry: The entry
+    :param value: The value
+    :return: None
+    """
+    entry.delete(0, 'end')
+    entry.insert(0, str(value))
+
+
+def sweeps(session, mordor, count):
+    """ Gives the function that tells if a number of scans run one after the other are done. Each one is started with
+    the Run button once the previous one has finished, as a user would do.
+
+    :param session: The session
+    :param mordor: The Mordor window of the experiment
+    :param count: The number of scans
+    :return: The function
+    """
+    experiment = mordor.experiment
+
+    def done():
+        if not experiment.stop:
+            return False
+
+        if len(mordor.all_data) < count:
+            session.click(experiment.start_stop_scan)
+            return False
+
+        return True
+
+    return done
+
+
+def measured(mordor):
+    """ The number of points of the measurements finished in a Mordor window
+
+    :param mordor: The Mordor window
+    :return: The number of points
+    """
+    return sum(len(data) for data in mordor.all_data.arrays())
+
+
+def scan_iv(session, options):
+    """ IV sweeps with the Dummy SMU, with the default settings of the experiment. With the shortest integration time,
+    each sweep takes 1 s.
+    """
+    mordor = session.open('IV')
+    experiment = mordor.experiment
+    experiment.integration_time_list.current(0)
+
+    session.run(experiment.start_stop_scan, sweeps(session, mordor, options.points))
+    return len(mordor.all_data), measured(mordor)
+
+
+def scan_lockin(session, options):
+    """ Spectroscopy scan with the Dummy lock-in, point by point, from 400 nm in steps of 1 nm
+    """
+    mordor = session.open('Spectroscopy')
+    experiment = mordor.experiment
+    experiment.adq_var.set('Dummy lockin')
+    experiment.select_adquisition()
+
+    set_entry(experiment.integration_time_entry, options.integration_time)
+    set_entry(experiment.waiting_time_entry, 0)
+    set_entry(experiment.Start_entry, 400)
+    set_entry(experiment.Stop_entry, 400 + options.points - 1)
+    set_entry(experiment.Step_entry, 1)
+
+    session.run(experiment.start_stop_scan, lambda: experiment.stop)
+    return experiment.num, measured(mordor)
+
+
+def scan_spectrometer(session, options):
+    """ Spectroscopy scan with the Dummy spectrometer, averaging several spectra. The integration time is split in as
+    many spectra as points requested, each with the longest integration time of the spectrometer.
+    """
+    mordor = session.open('Spectroscopy')
+    experiment = mordor.experiment
+    experiment.adq_var.set('Dummy spectrometer')
+    experiment.select_adquisition()
+
+    set_entry(experiment.integration_time_entry, options.points * experiment.adquisition.max_integration_time)
+    set_entry(experiment.waiting_time_entry, 0)
+    experiment.update_integration_time()
+    # An empty background, so we are not asked to measure one
+    experiment.get_background(False)
+
+    session.run(experiment.start_stop_scan, lambda: experiment.stop)
+    return experiment.num, experiment.num * measured(mordor)
+
+
+def scan_cv(session, options):
+    """ CV sweeps with the Dummy ZA, with the default settings of the experiment. The CV experiment does not use an
+    acquisition worker, so each sweep is run in the event loop when the Run button is pressed.
+    """
+    mordor = session.open('CV')
+
+    session.run(mordor.experiment.start_stop_scan, sweeps(session, mordor, options.points))
+    return len(mordor.all_data), measured(mordor)
+
+
+def scan_temperature(session, options):
+    """ Temperature record with the Dummy T controller, in its own window. It is stopped once it has the points
+    requested.
+    """
+    experiment = session.open('Temperature')
+    experiment.refresh_time_var.set(options.integration_time / 1000.)
+    experiment.update_refresh_time()
+
+    def done():
+        if experiment.recording and len(experiment.time_array) >= options.points:
+            session.click(experiment.start_recording)
+        return session.finished > 0
+
+    session.run(experiment.start_recording, done)
+    return len(experiment.time_array), len(experiment.time_array)
+
+
+def scan_flash(session, options):
+    """ Flash shots with the Dummy oscilloscope, triggered by the Dummy ADC-DAC, in their own window, with no wait
+    between them
+    """
+    experiment = session.open('Flash')
+    experiment.shots_var.set(options.points)
+    experiment.wait_var.set(0)
+    experiment.trig_delay_var.set(0)
+
+    session.run(experiment.run, lambda: session.finished > 0)
+    return options.points, options.points * experiment.settings['samples']
+
+
+# The scans that can be measured and their default number of acquisition steps
+scans = {'IV': scan_iv,
+         'Lock-in': scan_lockin,
+         'Spectrometer': scan_spectrometer,
+         'CV': scan_cv,
+         'Temperature': scan_temperature,
+         'Flash': scan_flash}
+
+points = {'IV': 5,
+          'Lock-in': 200,
+          'Spectrometer': 50,
+          'CV': 20,
+          'Temperature': 100,
+          'Flash': 20}
+
+
+def run(name, options, trace=False):
+    """ Runs a scan
+
+    :param name: The name of the scan
+    :param options: The options of the benchmark, with the number of points of the scan
+    :param trace: If the memory allocations must be traced. Default=False
+    :return: A dictionary with the number of steps and points of the scan, its duration (s), its peak memory (bytes),
+    None if not traced, the time spent in each stage (s) and the table of I/O statistics of the devices
+    """
+    with Session(options.timeout, trace) as session:
+        steps, count = scans[name](session, options)
+
+        result = {'steps': steps, 'points': count, 'wall': session.wall, 'peak_memory': session.peak,
+                  'io_stats': session.splash.devman.io_stats.table()}
+        result.update(session.stages.totals)
+
+    return result
+
+
+def measure(name, options):
+    """ Measures the throughput of a scan and the time spent in each stage and, in a second run of the scan, its peak
+    memory. Tracing the memory slows down the scan, specially the plot, so it is not done while timing it.
+
+    :param name: The name of the scan
+    :param options: The options of the benchmark, as given by the parser
+    :return: A dictionary with the results
+    """
+    options = argparse.Namespace(**vars(options))
+    options.points = points[name] if options.points is None else options.points
+
+    result = run(name, options)
+    result['peak_memory'] = run(name, options, trace=True)['peak_memory'] if options.memory else None
+
+    io_stats = result.pop('io_stats')
+    if options.verbose:
+        print('\n' + name)
+        print(io_stats)
+
+    result.update({'scan': name, 'points_per_s': result['points'] / result['wall'],
+                   'steps_per_s': result['steps'] / result['wall']})
+
+    return result
+
+
+def report(results):
+    """ Formats the results as a table, with the times in ms and the memory in MB
+
+    :param results: The list of results given by measure
+    :return: A string with the table
+    """
+    lines = ['{0:<14}{1:>9}{2:>12}{3:>10}{4:>10}{5:>12}{6:>10}{7:>10}{8:>10}'.format(
+        'Scan', 'Points', 'Points/s', 'Wall', 'Device', 'Processing', 'Plot', 'Disk', 'Peak MB')]
+    for r in results:
+        peak = '{0:.1f}'.format(r['peak_memory'] / 2 ** 20) if r['peak_memory'] is not None else '-'
+        lines.append('{0:<14}{1:>9d}{2:>12.1f}{3:>10.0f}{4:>10.0f}{5:>12.0f}{6:>10.0f}{7:>10.0f}{8:>10}'.format(
+            r['scan'], r['points'], r['points_per_s'], r['wall'] * 1000, r['device'] * 1000, r['processing'] * 1000,
+            r['plot'] * 1000, r['disk'] * 1000, peak))
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end throughput of the scans of Mordor with the dummy devices.')
+    parser.add_argument('scans', nargs='*',
+                        help='Scans to measure, among: {0}. Default: all of them'.format(', '.join(scans)))
+    parser.add_argument('--points', type=int,
+                        help='Number of acquisition steps (points, sweeps, spectra or shots) of each scan. '
+                             'Default: {0}'.format(', '.join('{0} {1}'.format(n, s) for s, n in points.items())))
+    parser.add_argument('--integration-time', type=int, default=10,
+                        help='Integration time (ms) of the lock-in and refresh time of the T controller. Default: 10')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Do not run each scan a second time to get its peak memory')
+    parser.add_argument('--timeout', type=float, default=600, help='Maximum duration (s) of each scan. Default: 600')
+    parser.add_argument('--output', help='File where the results are appended, as JSON lines')
+    parser.add_argument('--verbose', action='store_true', help='Show the I/O statistics of the devices of each scan')
+    options = parser.parse_args()
+
+    # Mordor looks for its images and the configuration of the devices in its folder
+    if options.output is not None:
+        options.output = os.path.abspath(options.output)
+    os.chdir(root)
+
+    for name in options.scans:
+        if name not in scans:
+            parser.error('unknown scan: {0}'.format(name))
+
+    results = []
+    for name in options.scans or list(scans):
+        try:
+            results.append(measure(name, options))
+        except Exception:
+            print('{0} could not be measured:'.format(name))
+            traceback.print_exc()
+
+    print(report(results))
+
+    if options.output is not None:
+        with open(options.output, 'a') as f:
+            for r in results:
+                r.update({'date': datetime.now().isoformat(), 'python': platform.python_version(),
+                          'platform': platform.platform(), 'integration_time': options.integration_time})
+                f.write(json.dumps(r) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 # Libraries
 import serial
 import time
+import asyncio
+from Devices.transport import open_transport, run
 from tkinter import messagebox, ttk
 import tkinter as tk
 
@@ -18,18 +20,15 @@ class ActonSP2500i:
         if info is not None:
             self.info.update(info)
 
-        # We use the serial driver
-        self.serial_comms = serial.Serial(
-            port=port,
-            baudrate=921600,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            bytesize=serial.EIGHTBITS,
-            timeout=100,
-            rtscts=True,
-            dsrdtr=True,
-            interCharTimeout=200*0.001,
-            writeTimeout=100*0.001)
+        # We use the serial driver. Each answer is a line ending with 'ok'.
+        self.transport = open_transport(port, read_termination='\n', write_termination='\r', timeout=5,
+                                        baudrate=921600,
+                                        parity=serial.PARITY_NONE,
+                                        stopbits=serial.STOPBITS_ONE,
+                                        bytesize=serial.EIGHTBITS,
+                                        rtscts=True,
+                                        dsrdtr=True,
+                                        write_timeout=100*0.001)
 
         # print(self.query('MONO-EESTATUS'))
 
@@ -54,7 +53,7 @@ class ActonSP2500i:
         print(textstring)
 
     def close(self):
-        self.serial_comms.close()
+        self.transport.close()
 
     def write(self, command, wait=None):
         global debug
@@ -62,29 +61,33 @@ class ActonSP2500i:
         if debug:
             print('to device: %s' % command)
     
-        self.serial_comms.write(bytes(command+'\r', 'UTF-8'))
+        run(self.transport.write(command))
 
         if wait is not None:
             time.sleep(wait)
 
         return 0
 
-    def query(self, command, bytes_to_read=500, lines_to_read=1, return_line=0, wait=None):
+    def query(self, command, timeout=None):
+        return run(self.query_async(command, timeout))
+
+    async def query_async(self, command, timeout=None):
+        """ Sends a command to the monochromator and reads the answer, without blocking the other devices
+
+        :param command: The command
+        :param timeout: Timeout, in seconds. Default=None (5 s)
+        :return: The answer
+        """
         global debug
-    
+
         if debug:
             print('to device: %s' % command)
-    
-        self.serial_comms.write(bytes(command+'\r', 'UTF-8'))
 
-        if wait is not None:
-            time.sleep(wait)
+        rawread = await self.transport.query(command, timeout)
 
-        rawread = self.serial_comms.readline(bytes_to_read).decode('utf-8')
-        
         if debug:
             print('from device: %s' % str(rawread))
-    
+
         return rawread.strip()
 
     def move(self, target, speed='Normal'):
@@ -94,30 +97,39 @@ class ActonSP2500i:
         :param speed: if speed='Fast', the maximum speed of the motor (unknown) is used.
         :return: None
         """
+        run(self.move_async(target, speed))
+
+    async def move_async(self, target, speed='Normal'):
+        """ Same as move, but other devices can be used while the motor moves
+        """
         global debug
 
         if speed == 'Fast':
-            self.query("%.3f GOTO" % float(target))
+            # The monochromator does not answer until it gets to the target
+            await self.query_async("%.3f GOTO" % float(target), timeout=100)
         else:
             waiting_time = abs(self.current_wl-target)/self.current_speed*60.0
-            self.query("%.3f >NM" % float(target))
+            await self.query_async("%.3f >NM" % float(target))
 
             if debug:
                 print(waiting_time)
 
-            time.sleep(waiting_time)
+            await asyncio.sleep(waiting_time)
 
-        ready = int(self.query('MONO-?DONE').split(' ')[0])
+        ready = int((await self.query_async('MONO-?DONE')).split(' ')[0])
         while not ready:
-            time.sleep(0.05)
-            ready = int(self.query('MONO-?DONE').split(' ')[0])
+            await asyncio.sleep(0.05)
+            ready = int((await self.query_async('MONO-?DONE')).split(' ')[0])
 
         self.current_wl = target
         return
 
 
     def wavelength(self, to_float=True):
-        raw = self.query("?NM")
+        return run(self.wavelength_async(to_float))
+
+    async def wavelength_async(self, to_float=True):
+        raw = await self.query_async("?NM")
 
         if to_float:
             return float(raw.split(" ")[0])
@@ -126,7 +138,7 @@ class ActonSP2500i:
 
     def speed(self, to_float=True):
 
-        raw = self.query("?NM/MIN", wait=0.2)
+        raw = self.query("?NM/MIN")
 
         if to_float:
             return float(raw.split(" ")[0])
@@ -142,12 +154,10 @@ class ActonSP2500i:
             return raw.split(" ")[0]
 
     def all_gratings(self):
-        self.write("?GRATINGS")
+        lines = run(self.transport.query("?GRATINGS", until=lambda line: 'ok' in line))
 
         gratings = []
-        rawread = ''
-        while 'ok' not in rawread:
-            rawread = self.serial_comms.readline().decode('utf-8')
+        for rawread in lines:
 
             if debug:
                 print('from device: %s' % str(rawread))
@@ -178,7 +188,8 @@ class ActonSP2500i:
     def set_grating(self, target):
         try:
             print('Changing grating...')
-            self.query(str(target+1) + ' GRATING', wait=2)
+            # Changing the grating takes a while, and there is no answer until it is finished
+            self.query(str(target+1) + ' GRATING', timeout=60)
             time.sleep(0.5)
             self.current_grating = self.grating()
             print('New grating = {0}\n\n'.format(self.grating_options[self.current_grating]))
@@ -1,5 +1,6 @@
 __author__ = 'D. Alonso-Álvarez'
 
+import time
 import numpy as np
 from tkinter import messagebox
 
@@ -34,6 +35,9 @@ class DummySMU:
         self.log_points = ['5', '10', '25', '50']
         self.int_time = ['0.416', '4', '16.67', '20']
 
+        # The number of points of the sweep, which the IV experiment needs to allocate the record while the points arrive
+        self.points = 1
+
     def query(self, msg):
         """ Send a message to the instrument and then waits for an answer. depending on the nature of the device and
         how is connected, this would look different
@@ -151,14 +155,19 @@ class DummySMU:
 
         # We estimate the runing time of the sweep, set the timeout time accordingly and return the control to the IV module.
         # This will wait in a "safe way" during the measurement, avoiding freezing the program
-        self.totalPoints = 100
+        self.points = 100
         minimumWait = 10
-        measTime = self.totalPoints * (self.itime + self.delay + minimumWait)
+        measTime = self.points * (self.itime + self.delay + minimumWait)
         if self.measRange == 0:
             measTime = measTime * 10
         # self.device.timeout = None
         print("Waiting for Dummy.\nEstimated measurement time = {} s".format(measTime / 1000))
 
+        # We simulate the data of the sweep, which will be available point by point during the measurement time
+        self.data = np.random.rand(self.points, 2)
+        self.start_time = time.time()
+        self.sweep_time = measTime / 1000.
+
 
         # Finally, we trigger the sweep. Depending on the SMU, you might need to turn it on first
 
@@ -184,6 +193,51 @@ class DummySMU:
         # And triger it, if need it
 
 
+    def get_partial_data(self):
+        """ We get the points of the sweep measured so far, for SMUs that can give them during the sweep, eg. from an
+        internal buffer. SMUs that can not do it just do not have this method.
+
+        :return: a tuple with the voltage and current measured so far and if the sweep is finished
+        """
+        # Here we simulate that the points arrive uniformly during the measurement time
+        elapsed = time.time() - self.start_time
+        count = self.points if elapsed >= self.sweep_time else int(self.points * elapsed / self.sweep_time)
+        data = self.data[:count]
+
+        if self.source == 0:
+            return data[:, 0], data[:, 1], count == self.points
+        else:
+            return data[:, 1], data[:, 0], count == self.points
+
+    def is_finished(self):
+        """ Checks if the sweep is finished, eg. with the status byte of the SMU
+
+        :return: True if the sweep is finished
+        """
+        return time.time() - self.start_time >= self.sweep_time
+
+    def wait_for_completion(self, timeout=None, stop=None, interval=0.1):
+        """ Waits until the sweep is finished, asking the SMU regularly. It must not be called from the graphical
+        interface. SMUs that can not tell when the sweep is finished just do not have this method.
+
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait until it is finished)
+        :param stop: A threading.Event that, if set, interrupts the wait. Default=None
+        :param interval: Time (s) between checks. Default=0.1
+        :return: True if the sweep is finished, False if the wait timed out or was interrupted
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while not self.is_finished():
+            if deadline is not None and time.time() >= deadline:
+                return False
+
+            if stop is None:
+                time.sleep(interval)
+            elif stop.wait(interval):
+                return False
+
+        return True
+
     def get_data(self):
         """ We get the data fromt he SMU. Depending on the order provided by the SMU we need to invert the output to
         have voltage-current, regardless of who is the bias or the meas. We convert the data to an array and re-shape
@@ -202,7 +256,7 @@ class DummySMU:
         if self.function == 'dc':
             data = np.random.rand(2)
         else:
-            data = np.random.rand(2*self.totalPoints)
+            data = self.data
         data = np.array(data, dtype=np.float32).reshape((-1, 2))
 
 
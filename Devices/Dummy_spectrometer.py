@@ -20,6 +20,8 @@ class Dummy_spectrometer:
         self.integration_time = 300
         self.max_integration_time = 100
         self.min_wavelength = 0.3
+        self.wl = np.arange(150, 1100, 0.2)
+        self.wl.flags.writeable = False
 
     def update_integration_time(self, new_time):
         """ Updates the integration time in the spectrometer based on the selection in the program
@@ -34,15 +36,28 @@ class Dummy_spectrometer:
 
         return new_time
 
-    def measure(self):
-        wl = np.arange(150, 1100, 0.2)
-        out = np.zeros_like(wl)
+    def wavelengths(self):
+        """ The wavelength axis of the spectra, without measuring anything
+
+        :return: the wavelength (in nm), a read only array
+        """
+        return self.wl
+
+    def measure(self, out=None):
+        """ Measures a random spectrum
+
+        :param out: Array where the signal is written. Default=None (a new array)
+        :return: a tupple with the wavelength (in nm) and the signal
+        """
+        out = np.zeros_like(self.wl) if out is None else out
+        out[:] = 0
         n = max(int(self.integration_time/10.), 1)
         for i in range(0, n):
-            out = out + np.random.random_sample(len(wl))
+            out += np.random.random_sample(len(self.wl))
 
         time.sleep(self.integration_time/1000.)
-        return wl, out/n
+        out /= n
+        return self.wl, out
 
     def close(self):
         pass
@@ -7,6 +7,29 @@ try:
 except ImportError as err:
     print("ERROR: {0}\n\t Ocean Optics devices will not be available.".format(err))
 
+# The wavelength axis of each spectrometer, by serial number, and the part of it within the useful range. The calibration
+# does not change while the program runs, so it is only read once even if the spectrometer is opened again.
+_wavelengths = {}
+
+
+def wavelength_axis(dev, low=200, high=1100):
+    """ Gets the wavelength axis of a spectrometer, cropped to the useful range, reading it only the first time
+
+    :param dev: The seabreeze spectrometer
+    :param low: The lower end of the useful range (nm). Default=200
+    :param high: The upper end of the useful range (nm). Default=1100
+    :return: A tuple with the cropped wavelengths (read only) and the slice of the pixels within the range
+    """
+    key = (dev.serial_number, low, high)
+    if key not in _wavelengths:
+        wl = dev.wavelengths()
+        crop = slice(int(np.argmin(abs(wl - low))), int(np.argmin(abs(wl - high))))
+        wl = np.array(wl[crop], dtype=float)
+        wl.flags.writeable = False
+        _wavelengths[key] = (wl, crop)
+
+    return _wavelengths[key]
+
 # Class definition
 class HR4000:
 
@@ -28,6 +51,9 @@ class HR4000:
         self.correct_dark_counts = True
         self.correct_nonlinearity = True
 
+        # We filter the signal because outside these boundaries it makes no sense
+        self.wl, self.crop = wavelength_axis(self.dev)
+
         self.update_integration_time(self.integration_time)
 
     def update_integration_time(self, new_time):
@@ -44,19 +70,25 @@ class HR4000:
 
         return new_time
 
-    def measure(self):
+    def wavelengths(self):
+        """ The wavelength axis of the spectra, without measuring anything
+
+        :return: the wavelength (in nm), a read only array
+        """
+        return self.wl
+
+    def measure(self, out=None):
         """ Measures the signal from the spectrometer. The signal is provided as a rate: counts/s
 
+        :param out: Array where the signal is written, with the same length as the wavelength axis. Default=None (a new
+        array)
         :return: a tupple with the wavelength (in nm) and the signal (in counts/s)
         """
-        wl = self.dev.wavelengths()
         intensities = self.dev.intensities(correct_dark_counts=self.correct_dark_counts, correct_nonlinearity=self.correct_nonlinearity)
 
-        # We filter the signal because outside this boundaries it makes no sense
-        i = np.argmin(abs(wl-200))
-        k = np.argmin(abs(wl-1100))
+        out = np.multiply(intensities[self.crop], 1000.0/self.integration_time, out=out)
 
-        return wl[i:k], intensities[i:k]*1000.0/self.integration_time
+        return self.wl, out
 
     def close(self):
         """ Closes the conexion to the spectrometer
@@ -1,7 +1,7 @@
 __author__ = 'D. Alonso-Álvarez'
 
 import numpy as np
-import visa
+from Devices.visa_resources import open_resource
 from tkinter import messagebox
 
 
@@ -22,8 +22,7 @@ class Keithley2000:
         if info is not None:
             self.info.update(info)
 
-        rm = visa.ResourceManager()
-        self.serial_comms = rm.open_resource(port)
+        self.serial_comms = open_resource(port)
         self.serial_comms.write("*rst; status:preset; *cls")
         self.meas_mode = ':current:dc'
         self.timeconstant = 300
@@ -1,7 +1,7 @@
 __author__ = 'D. Alonso-Álvarez'
 
 import numpy as np
-import visa
+from Devices.visa_resources import open_resource
 from tkinter import messagebox
 
 
@@ -20,8 +20,7 @@ class Keithley236:
         if info is not None:
             self.info.update(info)
 
-        rm = visa.ResourceManager()
-        self.device = rm.open_resource("{}".format(address))
+        self.device = open_resource("{}".format(address))
 
         # Reset default values
         self.write("J0X")
@@ -1,7 +1,7 @@
 __author__ = 'D. Alonso-Álvarez'
 
 import numpy as np
-import visa
+from Devices.visa_resources import open_resource, read_block
 import time
 from tkinter import messagebox
 
@@ -21,11 +21,19 @@ class Keithley2430:
         if info is not None:
             self.info.update(info)
 
-        rm = visa.ResourceManager()
-        self.device = rm.open_resource("{}".format(address))
+        self.device = open_resource("{}".format(address))
+
+        # Shadow copy of the settings of the instrument, so the commands that do not change anything are not sent, and
+        # the commands waiting to be sent, all together in one message
+        self.state = {}
+        self.pending = []
+        self.commands = 0
+        self.skipped = 0
+        self.transactions = 0
 
         # Reset default values
         self.device.write("*RST")
+        self.invalidate()
 
         # Ask for the name of the device
         print(self.device.query("*IDN?"))
@@ -39,21 +47,123 @@ class Keithley2430:
 
         self.function = None
 
+        # The sweep data is read as a binary block of single precision floats, little endian, or as text if the binary
+        # transfer does not work. The number of points is needed because the SMU does not send the length of the block.
+        self.binary = True
+        self.points = 1
+
+        # The sweep data measured so far, read from the trace buffer while the sweep goes on, and the number of points
+        self.partial = np.zeros((0, 2))
+        self.measured = 0
+
     def query(self, msg):
-        """ Send a message to the instrument and then waits for an answer.
+        """ Send a message to the instrument and then waits for an answer. Any pending command is sent in the same
+        message.
 
         :param msg: command to be executed in the instrument
         :return: the answer to that command
         """
-        return self.device.query(msg)
+        self.commands += 1
+        messages = self.coalesce(self.pending + [msg])
+        self.pending = []
+
+        for message in messages[:-1]:
+            self.send(message)
+
+        self.transactions += 1
+        return self.device.query(messages[-1])
 
     def write(self, msg):
-        """ Send a message to the instrument
+        """ Send a message to the instrument, together with any pending command
 
         :param msg: message to be sent to the instrument
         :return: None
         """
-        self.device.write(msg)
+        self.commands += 1
+        self.pending.append(msg)
+        self.flush()
+
+    def set(self, header, value, cache=True):
+        """ Changes a setting of the instrument. The command is only sent if the setting has a different value in the
+        shadow copy, and it waits in the queue until the next write, query or flush.
+
+        :param header: The header of the command, eg. ':SOUR:FUNC'
+        :param value: The new value
+        :param cache: If False, the command is always sent, for settings the instrument might change by itself.
+        Default=True
+        :return: None
+        """
+        self.commands += 1
+        value = str(value)
+
+        if cache and self.state.get(header) == value:
+            self.skipped += 1
+            return
+
+        if cache:
+            self.state[header] = value
+        self.pending.append('{0} {1}'.format(header, value))
+
+    def flush(self):
+        """ Sends the pending commands, joined in as few messages as possible
+
+        :return: None
+        """
+        messages = self.coalesce(self.pending)
+        self.pending = []
+
+        for message in messages:
+            self.send(message)
+
+    def send(self, message):
+        """ Writes a message in the instrument. If it fails, the shadow copy can not be trusted anymore.
+
+        :param message: The message
+        :return: None
+        """
+        self.transactions += 1
+        try:
+            self.device.write(message)
+        except Exception:
+            self.invalidate()
+            raise
+
+    @staticmethod
+    def coalesce(commands, max_length=200):
+        """ Joins several commands in messages separated by ';'. All the commands start from the root, so they are
+        independent of each other. The messages are kept short enough for the input buffer of the instrument.
+
+        :param commands: The list of commands
+        :param max_length: The maximum length of a message. Default=200
+        :return: A list with the messages
+        """
+        messages = []
+        for command in commands:
+            if len(messages) > 0 and len(messages[-1]) + len(command) < max_length:
+                messages[-1] += ';' + command
+            else:
+                messages.append(command)
+
+        return messages
+
+    def invalidate(self):
+        """ Forgets the shadow copy of the settings, so all of them are sent again. It must be used if the instrument
+        is reset or changed by other means, eg. from the front panel.
+
+        :return: None
+        """
+        self.state = {}
+
+    def report(self):
+        """ Gets the number of commands requested, those skipped because they did not change anything and the
+        transactions with the instrument, since the last report.
+
+        :return: A tuple with the three numbers
+        """
+        counts = (self.commands, self.skipped, self.transactions)
+        self.commands, self.skipped, self.transactions = 0, 0, 0
+
+        return counts
 
     def close(self):
         """ Closes the connection with the instrument
@@ -80,18 +190,18 @@ class Keithley2430:
             raise ValueError('ERROR: bad values for source and/or function')
 
         # We set the source and the function
-        self.write(':SOUR:FUNC {0}'.format(source))
-        self.write(':SOUR:{0}:MODE {1}'.format(source, function))
+        self.set(':SOUR:FUNC', source)
+        self.set(':SOUR:{0}:MODE'.format(source), function)
 
         self.source = source
         self.function = function
 
         if self.function == 'FIX':
             # This command ensures that the source is on after the measurement
-            self.write(':SOUR:CLE:AUTO OFF')
+            self.set(':SOUR:CLE:AUTO', 'OFF')
         else:
             # But in sweep mode we want it to get on and off automatically
-            self.write(':SOUR:CLE:AUTO ON')
+            self.set(':SOUR:CLE:AUTO', 'ON')
 
         if self.source == 'VOLT':
             self.sense = 'CURR'
@@ -101,12 +211,21 @@ class Keithley2430:
             self.sense_range = self.v_range
 
         # We disable concurrent measurements (more than one function simultaneously) and set what we are measuring
-        self.write(':SENS:FUNC:CONC 0')
-        self.write(':SENS:FUNC "{0}:DC"'.format(self.sense))
+        self.set(':SENS:FUNC:CONC', 0)
+        self.set(':SENS:FUNC', '"{0}:DC"'.format(self.sense))
 
         # Select the data to retrieve from the source, voltage and current, otherwise the output will include the
         # resistance (not measured) the time stamp and status information
-        self.write(":FORM:ELEM VOLT, CURR")
+        self.set(":FORM:ELEM", "VOLT, CURR")
+
+        # And how: a binary block is much shorter than the text and needs no parsing. REAL,32 is the most precise binary
+        # format available, which is as much as the SMU gives anyway.
+        if self.binary:
+            self.set(':FORM:DATA', 'REAL,32')
+            self.set(':FORM:BORD', 'SWAP')
+        else:
+            self.set(':FORM:DATA', 'ASC')
+        self.points = 1
 
     def update_compliance(self, compliance, measRange):
         """ Updates the compliance and the measurement range.
@@ -116,16 +235,20 @@ class Keithley2430:
         :return: None
         """
         # We set the compliance
-        self.write(':SENS:{0}:PROT {1}'.format(self.sense, compliance))
+        self.set(':SENS:{0}:PROT'.format(self.sense), compliance)
         self.compliance = compliance
 
         # And the measuring range
         if self.sense_range[measRange] == 'auto':
             self.measRange = 'auto'
-            self.write(':SENS:{0}:RANG:AUTO 1'.format(self.sense))
+            # The auto range changes the range
+            self.state.pop(':SENS:{0}:RANG'.format(self.sense), None)
+            self.set(':SENS:{0}:RANG:AUTO'.format(self.sense), 1)
         else:
             self.measRange = float(self.sense_range[measRange].split(' ')[0])
-            self.write(':SENS:{0}:RANG {1}'.format(self.sense, self.measRange))
+            # Setting a fixed range disables the auto range
+            self.state.pop(':SENS:{0}:RANG:AUTO'.format(self.sense), None)
+            self.set(':SENS:{0}:RANG'.format(self.sense), self.measRange)
 
     def update_integration_time(self, new_time):
         """ Sets the integration time. This source needs as input the integration rate, refered to the line frequency
@@ -137,7 +260,7 @@ class Keithley2430:
         self.itime = float(self.int_time[new_time])
         rate = self.itime * 50 / 1000.
 
-        self.write(':SENS:{0}:NPLC {1}'.format(self.sense, rate))
+        self.set(':SENS:{0}:NPLC'.format(self.sense), rate)
 
     def update_waiting_time(self, new_time):
         """ Sets the delay time between setting a bias and starting a measurement
@@ -146,7 +269,7 @@ class Keithley2430:
         :return: None
         """
         self.delay = new_time
-        self.write('SOUR:DEL {0}'.format(self.delay / 1000.))
+        self.set(':SOUR:DEL', self.delay / 1000.)
 
     def setup_measurement(self, function='dc', source='v', compliance=0.1, measRange=0, delay=0, intTime=0):
         """ Prepares and triggers the IV measurement.
@@ -164,6 +287,7 @@ class Keithley2430:
         self.update_compliance(compliance, measRange)
         self.update_integration_time(intTime)
         self.update_waiting_time(delay)
+        self.flush()
 
     def measure(self, source='v', start=0, stop=1, step=0.05, points=1, compliance=2, measRange=0, delay=0, intTime=0):
         """ Prepares and triggers the IV measurement.
@@ -180,45 +304,56 @@ class Keithley2430:
         :return: The estimated measuring time
         """
 
-        # First we setup the experiment
+        # First we setup the experiment. All the settings are sent together, and only if they have changed.
+        self.report()
         self.setup_measurement('sweep', source, compliance, measRange, delay, intTime)
 
         # We can set the sweep direction up or down according to the input in start and end voltage.
         # However, the Keithley 2430 needs start to be less than end, and then you tell which direction the sweep goes
         if float(start) > float(stop):
             start, stop = stop, start
-            self.write(':SOUR:SWE:DIR DOW')
+            self.set(':SOUR:SWE:DIR', 'DOW')
         else:
-            self.write(':SOUR:SWE:DIR UP')
+            self.set(':SOUR:SWE:DIR', 'UP')
 
         if source == 'v':
             # For voltage, we always use the BEST fixed range for the bias
-            self.write(':SOUR:SWE:RANG BEST')
+            self.set(':SOUR:SWE:RANG', 'BEST')
             # and a linear staircase
-            self.write(':SOUR:SWE:SPAC LIN')
+            self.set(':SOUR:SWE:SPAC', 'LIN')
             # with a fixed step size
             totalPoints = (stop-start)/step + 1
-            self.write(':SOUR:SWE:POIN {0}'.format(totalPoints))
+            self.set(':SOUR:SWE:POIN', totalPoints)
         else:
             # For current, we always use the AUTO fixed range for the bias, as it might cover may orders of magnitude
-            self.write(':SOUR:SWE:RANG AUTO')
+            self.set(':SOUR:SWE:RANG', 'AUTO')
             # and a logarithmic staircase
-            self.write(':SOUR:SWE:SPAC LOG')
+            self.set(':SOUR:SWE:SPAC', 'LOG')
             # with a certain number of points. Here we have to calculate the total number of points, as the input is
             # points per decade
             totalPoints = int(np.log10(float(stop)/max(1e-9, float(start))) * int(self.log_points[points]) )+1
-            self.write(':SOUR:SWE:POIN {0}'.format(totalPoints))
+            self.set(':SOUR:SWE:POIN', totalPoints)
             pass
 
         # Set start...
-        self.write(':SOUR:{0}:START {1}'.format(self.source, start))
+        self.set(':SOUR:{0}:START'.format(self.source), start)
         # ... and stop
-        self.write(':SOUR:{0}:STOP {1}'.format(self.source, stop))
+        self.set(':SOUR:{0}:STOP'.format(self.source), stop)
 
         # Trigger count needs to equal the number of points in the sweep. This command queries the SMU to read the
         # number of points for the configured sweep and set them back to the source. Why we need this???
-        trigger_count = self.query(":SOUR:SWE:POIN?")
-        self.write(":TRIG:COUN " + trigger_count)
+        trigger_count = self.query(":SOUR:SWE:POIN?").strip()
+        self.set(":TRIG:COUN", trigger_count)
+        self.points = int(trigger_count)
+
+        # The readings are also stored in the trace buffer as they are taken, so they can be read during the sweep
+        self.set(':TRAC:FEED', 'SENS')
+        self.set(':TRAC:POIN', trigger_count)
+        self.partial = np.zeros((self.points, 2))
+        self.measured = 0
+
+        # The end of the sweep sets the Operation Complete bit (after *OPC), which is summarised in the status byte
+        self.set('*ESE', 1)
 
         # We estimate the runing time of the sweep, set the timeout time accordingly and return the control to the IV module.
         # This will wait in a "safe way" during the measurement, avoiding freezing the program
@@ -229,9 +364,14 @@ class Keithley2430:
         self.device.timeout = None
         print("Waiting for Keithley.\nEstimated measurement time = {:.2f} s".format(measTime/1000.))
 
-        # Initiates the measurement. Since the source is configured to automatically turn on and off,
-        # we don't need to worry about it
-        self.write(":INIT")
+        # Initiates the measurement, after clearing the status and the trace buffer and enabling it, which only lasts
+        # until it is full. Since the source is configured to automatically turn on and off, we don't need to worry
+        # about it
+        self.write("*CLS;:TRAC:CLE;:TRAC:FEED:CONT NEXT;:INIT;*OPC")
+
+        commands, skipped, transactions = self.report()
+        print("Sweep configured with {0} transactions instead of {1} ({2} settings unchanged)".format(transactions,
+                                                                                                   commands, skipped))
 
         return measTime
 
@@ -248,15 +388,92 @@ class Keithley2430:
             print('DC measurement not setup correctly. Call self.setup_experiment before setting the bias')
             return
 
-        # The range of the bias. We always use AUTO for the bias in the one-shot mode
-        self.write(':SOUR:{0}:RANG:AUTO 1'.format(self.source))
+        # The range of the bias. We always use AUTO for the bias in the one-shot mode. The sweeps change the range and the
+        # level of the source, so they are always sent.
+        self.set(':SOUR:{0}:RANG:AUTO'.format(self.source), 1, cache=False)
 
         # We set the bias
-        self.write(':SOUR:{0}:LEV {1}'.format(self.source, biasValue))
+        self.set(':SOUR:{0}:LEV'.format(self.source), biasValue, cache=False)
+        self.flush()
 
         # And wait a bit
         time.sleep(self.delay)
 
+    def get_partial_data(self):
+        """ Gets the points of the sweep measured so far, reading the trace buffer while the sweep goes on. The buffer
+        is only read again if there are new points, and only the new points are converted.
+
+        :return: a tuple with the voltage and current measured so far and if the sweep is finished
+        """
+        count = int(float(self.query(':TRAC:POIN:ACT?')))
+
+        if count > self.measured:
+            # The SMU only gives the whole buffer and more points might be stored while it is read, so it is read as
+            # text, whose length is not fixed. The format change goes in the same message as the query. The values of
+            # the points we already have are skipped without converting them.
+            self.set(':FORM:DATA', 'ASC')
+            text = self.query(':TRAC:DATA?').split(",", 2 * self.measured)[-1]
+            data = np.array(text.split(","), dtype=np.float64).reshape((-1, 2))[:self.points - self.measured]
+
+            self.partial[self.measured:self.measured + len(data)] = data
+            self.measured += len(data)
+
+        return self.partial[:self.measured, 0], self.partial[:self.measured, 1], self.measured >= self.points
+
+    def is_finished(self):
+        """ Checks if the sweep is finished, with the Event Summary Bit of the status byte
+
+        :return: True if the sweep is finished
+        """
+        return int(float(self.query('*STB?'))) & 32 > 0
+
+    def wait_for_completion(self, timeout=None, stop=None, interval=0.1):
+        """ Waits until the sweep is finished, asking the SMU regularly. It must not be called from the graphical
+        interface.
+
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait until it is finished)
+        :param stop: A threading.Event that, if set, interrupts the wait. Default=None
+        :param interval: Time (s) between checks. Default=0.1
+        :return: True if the sweep is finished, False if the wait timed out or was interrupted
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not self.is_finished():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+            if stop is None:
+                time.sleep(interval)
+            elif stop.wait(interval):
+                return False
+
+        return True
+
+    def read_data(self, command, points):
+        """ Sends a query for data and reads the answer, as a binary block or, if that fails, as text.
+
+        :param command: The query, eg. ':FETC?'
+        :param points: The number of points expected
+        :return: an array with two columns: voltage and current
+        """
+        data = None
+        if self.binary:
+            try:
+                self.set(':FORM:DATA', 'REAL,32')
+                self.write(command)
+                data = read_block(self.device, '<f4', count=2 * points)
+            except Exception as err:
+                # Something went wrong with the binary block. We forget about it and go back to text.
+                print('WARNING: Binary readout of the Keithley 2430 failed ({0}). Using ASCII instead.'.format(err))
+                self.device.clear()
+                self.binary = False
+                self.set(':FORM:DATA', 'ASC')
+
+        if data is None:
+            data = self.query(command).split(",")
+
+        return np.array(data, dtype=np.float64).reshape((-1, 2))
+
     def get_data(self):
         """ We get the data fromt he SMU. The order is always voltage-current. The data is a string separated by commas.
         We convert the data to an array and re-shape it in two columns. Depending of being a sweep or a single meas, we just
@@ -265,11 +482,9 @@ class Keithley2430:
         :return: the measured data, a tuple with two vectors: voltage and current
         """
         if self.function == 'FIX':
-            data = self.query(':READ?').split(",")
+            data = self.read_data(':READ?', 1)
         else:
-            data = self.query(":FETC?").split(",")
-
-        data = np.array(data, dtype=np.float32).reshape((-1, 2))
+            data = self.read_data(':FETC?', self.points)
 
         return data[:, 0], data[:, 1]
 
@@ -2,7 +2,7 @@ __author__ = 'A. M. Telford & D. Alonso-Álvarez'
 
 import numpy as np
 from tkinter import messagebox
-import visa
+from Devices.visa_resources import open_resource
 
 
 class KeysightE4990A:
@@ -25,8 +25,7 @@ class KeysightE4990A:
             self.info.update(info)
 
         # Opening the device is essential.
-        self.rm = visa.ResourceManager()
-        self.device = self.rm.open_resource("{}".format(address))
+        self.device = open_resource("{}".format(address))
         self.device.timeout = 180000 ## 180 s default timeout (e.g. for OPC?)
         
         ## Dictionary for GUI-to-machine commands translation
@@ -68,7 +67,6 @@ class KeysightE4990A:
         :return: None
         """
         self.device.close()
-        self.rm.close()
 
     def setup_measurement(self, plot_format, options):
         """ Prepares the measurement by setting up the scan parameters.
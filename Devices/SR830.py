@@ -1,8 +1,7 @@
 # Libraries
 import serial
-import time
 import numpy as np
-import visa
+from Devices.transport import open_transport, run
 from tkinter import messagebox
 
 debug = False
@@ -17,36 +16,29 @@ class SR830:
         if info is not None:
             self.info.update(info)
 
+        # The answers of the lockin end with a carriage return, both through the serial port and GPIB
         if ':' not in port:
-            self.serial_comms = serial.Serial(
-                port=port,
-                baudrate=9600,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_TWO,
-                bytesize=serial.EIGHTBITS,
-                timeout = 100,
-                rtscts = True,
-                dsrdtr = True,
-                interCharTimeout = 2*0.001*50,
-                writeTimeout = 100*0.001)
-
-            self.write = self.write_serial
-            self.read = self.read_serial
-            self.query = self.query_serial
-
+            self.transport = open_transport(port, read_termination='\r', write_termination='\r', timeout=5,
+                                            baudrate=9600,
+                                            parity=serial.PARITY_NONE,
+                                            stopbits=serial.STOPBITS_TWO,
+                                            bytesize=serial.EIGHTBITS,
+                                            rtscts=True,
+                                            dsrdtr=True,
+                                            write_timeout=100*0.001)
         else:
-            rm = visa.ResourceManager()
-            self.serial_comms = rm.open_resource(port, read_termination='\r')
-            self.serial_comms.timeout = 5000
-
-            self.write = self.write_visa
-            self.read = self.read_visa
-            self.query = self.query_visa
+            self.transport = open_transport(port, read_termination='\r', write_termination='\r', timeout=5)
 
         self.build_timeconstants()
         self.timeconstant = self.get_time_constant()
         self.min_wavelength = 0.05
 
+        # Sample rates of the internal buffers (62.5 mHz to 512 Hz) and their size, in points
+        self.sample_rates = 0.0625 * 2. ** np.arange(14)
+        self.buffer_size = 16383
+        self.sample_rate = None
+        self.buffer_read = 0
+
     def build_timeconstants(self):
         self.timeconstants = []
         for p in range(-5,5):
@@ -55,42 +47,101 @@ class SR830:
 
         self.timeconstants = np.array(self.timeconstants)
 
-    def write_serial(self, command):
+    def write(self, command):
 
         if debug:
             print('to device: %s' % command)
 
-        self.serial_comms.write(bytes(command+'\r', 'UTF-8'))
+        run(self.transport.write(command))
 
-    def read_serial(self, bytes_to_read=1024):
-        global debug
-        rawread = self.serial_comms.read(bytes_to_read).decode('utf-8')
+    def read(self, timeout=None):
+        rawread = run(self.transport.read(timeout))
 
         if debug:
             print('from lockin: %s' % rawread)
 
         return rawread.strip()
 
-    def query_serial(self, command, bytes_to_read=1024, wait=None):
-        self.write_serial(command)
-        if wait is not None:
-            time.sleep(wait)
-        rawread = self.read_serial(bytes_to_read)
-        return rawread
+    def query(self, command, timeout=None):
+        return run(self.query_async(command, timeout))
+
+    async def query_async(self, command, timeout=None):
+        """ Sends a command to the lockin and reads the answer, without blocking the other devices
+
+        :param command: The command
+        :param timeout: Timeout, in seconds. Default=None (5 s)
+        :return: The answer
+        """
+        if debug:
+            print('to device: %s' % command)
 
-    def write_visa(self, command):
-        self.serial_comms.write(command)
+        rawread = await self.transport.query(command, timeout)
 
-    def read_visa(self, command):
-        rawread = self.serial_comms.read()
-        return rawread
+        if debug:
+            print('from lockin: %s' % rawread)
 
-    def query_visa(self, command):
-        rawread = self.serial_comms.query(command)
-        return rawread
+        return rawread.strip()
 
     def measure(self):
-        return tuple(self.query("snap?10,11").split(","))
+        return run(self.measure_async())
+
+    async def measure_async(self):
+        """ Reads the amplitude and phase of the signal (R and theta)
+
+        :return: A tuple with both values
+        """
+        return tuple((await self.query_async("snap?10,11")).split(","))
+
+    def start_buffer(self, rate=512.):
+        """ Starts storing the values of CH1 and CH2 (the same ones given by measure) in the internal buffers of the
+        lockin, at a fixed sample rate. The samples are then timed by the lockin, not by the computer.
+
+        :param rate: The sample rate (Hz). The closest one available is used. Default=512
+        :return: The actual sample rate
+        """
+        idx = int(np.argmin(abs(self.sample_rates - rate)))
+        self.sample_rate = self.sample_rates[idx]
+        self.buffer_read = 0
+
+        # One shot mode, so the buffers stop when they are full rather than overwriting the oldest points
+        self.write('SRAT {0};SEND 0;REST;STRT'.format(idx))
+
+        return self.sample_rate
+
+    def stop_buffer(self):
+        """ Stops storing data in the internal buffers
+
+        :return: None
+        """
+        self.write('PAUS')
+        self.sample_rate = None
+
+    def read_buffer(self):
+        return run(self.read_buffer_async())
+
+    async def read_buffer_async(self):
+        """ Reads the points stored in the internal buffers since the last read, as binary data (TRCB?). When the
+        buffers are half full, they are started again, which leaves a gap of a few samples.
+
+        :return: An array with two columns, CH1 and CH2, and one row per point
+        """
+        stored = int(await self.query_async('SPTS?'))
+        count = stored - self.buffer_read
+        if count <= 0:
+            return np.zeros((0, 2))
+
+        data = np.zeros((count, 2))
+        for channel in (1, 2):
+            raw = await self.transport.query_bytes('TRCB?{0},{1},{2}'.format(channel, self.buffer_read, count),
+                                                   4 * count)
+            data[:, channel - 1] = np.frombuffer(raw, dtype='<f4')
+
+        self.buffer_read = stored
+        if stored >= self.buffer_size // 2:
+            await self.transport.write('REST;STRT')
+            self.buffer_read = 0
+
+        return data
 
     def update_integration_time(self, new_time):
         """ Updates the integration time in the lockin based on the selection in the program
@@ -109,8 +160,15 @@ class SR830:
         raw = self.query("OFLT?")
         return self.timeconstants[int(raw)]
 
+    def get_slope(self):
+        """ Reads the slope of the low pass filter
+
+        :return: The slope (dB/oct): 6, 12, 18 or 24
+        """
+        return 6 * (int(self.query("OFSL?")) + 1)
+
     def close(self):
-        self.serial_comms.close()
+        self.transport.close()
 
     def interface(self, master):
         messagebox.showinfo(message='No specific configuration available for {0}'.format(self.info['Name']),
@@ -10,8 +10,9 @@ so it understands the commands sent by this script. This way of communicating wi
 coding things directly into the Arduino, but it is much more flexible as it is only limited by what you can do in Python.
 """
 
-import serial
 import time
+import asyncio
+from Devices.transport import open_transport, run
 
 class Arduino(object):
 
@@ -23,8 +24,12 @@ class Arduino(object):
         if info is not None:
             self.info.update(info)
 
+        self.port = port
         self.baudrate = 115200
-        self.serial = serial.Serial(port, self.baudrate)
+
+        # Opening the port resets the board, so the first request can take a couple of seconds
+        self.transport = open_transport(port, read_termination='\n', write_termination='', timeout=10,
+                                        baudrate=self.baudrate)
 
         self.digital_output = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
         self.analog_input = [0, 1, 2, 3, 4, 5]
@@ -37,7 +42,7 @@ class Arduino(object):
         print('Arduino loaded!!')
         
     def __str__(self):
-        return "Arduino is on port %s at %d baudrate" %(self.serial.port, self.serial.baudrate)
+        return "Arduino is on port %s at %d baudrate" %(self.port, self.baudrate)
 
     def output(self, pinArray):
         self.__sendData(len(pinArray))
@@ -95,17 +100,44 @@ class Arduino(object):
         self.setLow(pin)
         return True
 
-    def __sendData(self, serial_data):
-        while(self.__getData()[0] != "w"):
+    async def pulse_async(self, pin, length=50):
+        """ Same as pulse, but other devices can be used during the pulse
+
+        :param pin: pin number
+        :param length: duration of the pulse in ms
+        :return:
+        """
+        await self.send_data('1')
+        await self.send_data(pin)
+        await asyncio.sleep(length/1000)
+        await self.send_data('0')
+        await self.send_data(pin)
+        return True
+
+    async def send_data(self, serial_data):
+        """ Sends a number to the board, once it asks for it with a 'w'
+
+        :param serial_data: The number
+        :return: None
+        """
+        while (await self.get_data())[:1] != "w":
             pass
-        serial_data = str(serial_data).encode('utf-8')
-        self.serial.write(serial_data)
+        await self.transport.write(str(serial_data))
 
-    def __getData(self):
-        input_string = self.serial.readline()
-        input_string = input_string.decode('utf-8')
+    async def get_data(self):
+        """ Reads the next line sent by the board
+
+        :return: The line
+        """
+        input_string = await self.transport.read()
         return input_string.strip()
 
+    def __sendData(self, serial_data):
+        run(self.send_data(serial_data))
+
+    def __getData(self):
+        return run(self.get_data())
+
     def __formatPinState(self, pinValue):
         if pinValue == '1':
             return True
@@ -113,7 +145,7 @@ class Arduino(object):
             return False
 
     def close(self):
-        self.serial.close()
+        self.transport.close()
         return True
 
 class New(Arduino):
@@ -3,38 +3,32 @@ __author__ = 'D. Alonso-Álvarez'
 import configparser
 import serial
 import os
+import time
 import importlib
 import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 from tkinter import ttk
 
-from Devices.serial_ports import serial_ports
-from Devices.visa_ports import visa_ports
+from Devices.port_scanner import PortScanner
+from Devices import visa_resources
+from Devices.instrumentation import IOStats, Instrumented
 
 import tools
 
 
-# We try to import visa and use it for something. If it does not work, then we print a warning indicating that visa devices
-# will not be available
-try:
-    import visa
-    rm = visa.ResourceManager()
-    is_visa = True
-except OSError as err:
-    print("WARNING: {0}\t VISA devices (eg. GPIB) will not be available.\n".format(err))
-    is_visa = False
-
-
 class Devman(tk.Toplevel):
     """ Class that gives access to all configured devices. It is defined as a Top Level window
     """
 
-    def __init__(self, splash):
+    def __init__(self, splash, idle_timeout=300):
         """ Constructor of the device manager class
 
         :param splash: The parent object, in this case, the Mordor splash window.
+        :param idle_timeout: Time (s) a device is kept open after it has been released by all experiments. Default=300
         """
 
         self.splash = splash
@@ -53,8 +47,20 @@ class Devman(tk.Toplevel):
         self.device_types = list(set([self.current_config[dev]['Type'] for dev in self.current_config.sections()]))
         self.device_conexions = ['Dummy', 'Serial', 'GPIB', 'Auto USB']
 
-        # List of devices in use
-        self.used_devices = []
+        # Pool of open devices. Devices are kept open for a while after they have been released, so they can be used
+        # again without initialising them. Only the dummy devices are shared by several experiments at the same time
+        self.pool = {}
+        self.idle_timeout = idle_timeout
+
+        # The available ports are discovered in the background
+        self.scanner = PortScanner()
+        self.ports_version = -1
+        self.probe_thread = None
+        self.probe_result = None
+
+        # Statistics of the time spent talking to the devices, if they are instrumented
+        self.io_stats = IOStats()
+        self.io_window = None
 
         # And now, we create the actual window
         self.selector_window()
@@ -88,21 +94,33 @@ class Devman(tk.Toplevel):
             print(err)
             print('ERROR: The current configuration could not be saved in your home folder.')
 
+    @property
+    def used_devices(self):
+        """ Names of the devices being used by any experiment """
+        return [dev_name for dev_name in self.pool if self.pool[dev_name]['leases'] > 0]
+
     def open_device(self, dev_name):
-        """ Opens an instance of the device class corresponding to the device dev_name, as long as the device is not
-        already opened. The actual opening takes place in the device module.
+        """ Gives access to the device dev_name. If the device is still open from a previous use, the same object is
+        returned. Otherwise, an instance of the device class is created. The actual opening takes place in the device
+        module. Real devices are not thread safe, so they can only be used by one experiment at a time; only the dummy
+        devices are shared.
+
+        The device is timed if 'Time device I/O' is selected when it is opened, even if it was already in the pool.
 
         :param dev_name: The name of the device
-        :return: A new object of the corresponding device
+        :return: The object of the corresponding device, or None if it could not be opened or is in use
         """
 
         device_info = self.current_config[dev_name]
 
-        if device_info['Conexion'] is not 'Dummy':
-            if dev_name in self.used_devices:
-                messagebox.showinfo(message='Device {} is being used by other experiment.'.format(dev_name),
-                                    detail='Close that device and try again.', title='Device ocupied!!')
-                return None
+        if device_info['Conexion'] != 'Dummy' and dev_name in self.used_devices:
+            messagebox.showinfo(message='Device {} is being used by other experiment.'.format(dev_name),
+                                detail='Close that device and try again.', title='Device ocupied!!')
+            return None
+
+        if dev_name in self.pool:
+            self.pool[dev_name]['leases'] += 1
+            return self.lease(self.pool[dev_name]['device'])
 
         dev2open = '.' + device_info['Module']
         port = device_info['Port']
@@ -110,21 +128,78 @@ class Devman(tk.Toplevel):
         try:
             dev = importlib.import_module(dev2open, package='Devices')
             new = dev.New(port, dev_name, device_info)
-            self.used_devices.append(dev_name)
-            return new
+
+            self.pool[dev_name] = {'device': new, 'leases': 1, 'released': None}
+            return self.lease(new)
         except (OSError, ImportError) as err:
             print("ERROR: {0}\tDevice {1} could not be open.\n".format(err, device_info['Module']))
             return None
 
+    def lease(self, device):
+        """ Gives the device to an experiment, wrapped in a proxy that times its I/O if 'Time device I/O' is selected.
+        The pool keeps the device itself, so the choice is made again every time it is opened.
+
+        :param device: The device, as kept in the pool
+        :return: The device or its Instrumented proxy
+        """
+        if self.instrument_var.get():
+            return Instrumented(device, self.io_stats)
+
+        return device
+
     def close_device(self, device):
-        """ Closes the device, as long as it was opened.
+        """ Releases the device. Once no experiment is using it, it is closed after self.idle_timeout seconds, unless it
+        is used again before that.
 
         :return: None
         """
+        dev_name = device.info['Name']
+
+        if dev_name in self.pool and self.pool[dev_name]['leases'] > 0:
+            self.pool[dev_name]['leases'] -= 1
+
+            if self.pool[dev_name]['leases'] == 0:
+                self.pool[dev_name]['released'] = time.monotonic()
+                if self.idle_timeout > 0:
+                    self.after(int(self.idle_timeout * 1000), self.close_idle, dev_name)
+                else:
+                    self.release(dev_name)
+
+    def close_idle(self, dev_name):
+        """ Closes the device if it has not been used during the last self.idle_timeout seconds.
+
+        :param dev_name: The name of the device
+        :return: None
+        """
+        if dev_name not in self.pool or self.pool[dev_name]['leases'] > 0:
+            return
+
+        # The device might have been used and released again since this was scheduled
+        if time.monotonic() - self.pool[dev_name]['released'] >= self.idle_timeout - 0.1:
+            self.release(dev_name)
 
-        if device.info['Name'] in self.used_devices:
-            self.used_devices.remove(device.info['Name'])
+    def release(self, dev_name):
+        """ Closes the device and removes it from the pool, even if it is in use.
+
+        :param dev_name: The name of the device
+        :return: None
+        """
+        if dev_name not in self.pool:
+            return
+
+        device = self.pool.pop(dev_name)['device']
+        try:
             device.close()
+        except Exception as err:
+            print('ERROR: {0}\tDevice {1} could not be closed properly.'.format(err, dev_name))
+
+    def close_all(self):
+        """ Closes all the open devices. It should only be used when quitting the program.
+
+        :return: None
+        """
+        for dev_name in list(self.pool.keys()):
+            self.release(dev_name)
 
     def check(self, port, dev_name):
         """ Used for checking that the device is in the selected port.
@@ -151,11 +226,6 @@ class Devman(tk.Toplevel):
                 else:
                     return -1
             except:
-                try:
-                    self.used_devices.remove(dev_name)
-                except:
-                    pass
-
                 return -1
 
         # 'Serial' devices need to be checked by asking a question to the port and checking if the answer is correct.
@@ -178,9 +248,9 @@ class Devman(tk.Toplevel):
         # We are using a VISA connection that have to be checked on its own, as long as VISA is working
         # VISA devices need to be checked by asking a question to the port and checking if the answer is correct,
         # similar to serial ports.
-        elif (device_info['Conexion']  == 'GPIB') and is_visa:
+        elif (device_info['Conexion']  == 'GPIB') and visa_resources.is_available():
             try:
-                device = rm.open_resource(port)
+                device = visa_resources.open_resource(port)
                 answer = device.query(device_info['Question/SN'])
 
                 if device_info['Answer'] in answer:
@@ -197,24 +267,164 @@ class Devman(tk.Toplevel):
         else:
             return -1
 
-    def scan_ports(self):
-        """ Finds all active serial and visa ports and returns a list with all of them
+    def probe_all(self, timeout=0.5):
+        """ Finds the port of all the Serial and GPIB devices at once. All the ports are probed in parallel in the
+        background, asking each port the questions of all the devices. The ports where the expected answer is found are
+        saved in the configuration. Open devices and their ports are not probed.
 
-        :return: The list of available ports
+        :param timeout: Time (s) to wait for the answer to each question. Default=0.5
+        :return: None
         """
-        serialp = serial_ports()
+        if self.probe_thread is not None and self.probe_thread.is_alive():
+            return
 
-        if is_visa:
-            visap = visa_ports()
-        else:
-            visap = []
+        devices = [dev for dev in self.current_config.sections()
+                   if self.current_config[dev]['Conexion'] in ['Serial', 'GPIB'] and dev not in self.pool]
+        busy = [self.current_config[dev]['Port'] for dev in self.pool if dev in self.current_config]
+
+        questions = {'Serial': set(), 'GPIB': set()}
+        for dev in devices:
+            questions[self.current_config[dev]['Conexion']].add(self.current_config[dev]['Question/SN'])
+
+        def probe():
+            self.scanner.scan()
+            tasks = [(port, 'Serial') for port in self.scanner.serial if port not in busy and questions['Serial']]
+            tasks += [(port, 'GPIB') for port in self.scanner.visa if port not in busy and questions['GPIB']]
+
+            answers = {}
+            if len(tasks) > 0:
+                with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+                    futures = [pool.submit(self.identify_port, port, conexion, questions[conexion], timeout)
+                               for port, conexion in tasks]
+                    for (port, conexion), f in zip(tasks, futures):
+                        answers[port] = f.result()
+
+            self.probe_result = (devices, answers)
+
+        self.probe_result = None
+        self.probe_button['state'] = 'disabled'
+        self.info_lbl['text'] = 'Probing all ports...'
+
+        self.probe_thread = threading.Thread(target=probe, daemon=True)
+        self.probe_thread.start()
+        self.after(100, self.finish_probe_all)
+
+    def identify_port(self, port, conexion, questions, timeout):
+        """ Asks a number of questions to the device connected to a port. It is used by probe_all in the background.
+
+        :param port: The port
+        :param conexion: The type of conexion, 'Serial' or 'GPIB'
+        :param questions: The questions to ask
+        :param timeout: Time (s) to wait for each answer
+        :return: A dictionary with the answer to each question. Empty if the port could not be open
+        """
+        answers = {}
+        try:
+            if conexion == 'Serial':
+                device = serial.Serial(port, timeout=timeout)
+                try:
+                    for question in questions:
+                        device.reset_input_buffer()
+                        device.write(bytes(question + '\r', 'UTF-8'))
+                        answers[question] = device.readline(50).decode('utf-8', errors='ignore').strip()
+                finally:
+                    device.close()
+            else:
+                device = visa_resources.open_resource(port, open_timeout=int(timeout * 1000))
+                device.timeout = int(timeout * 1000)
+                try:
+                    for question in questions:
+                        try:
+                            answers[question] = device.query(question)
+                        except Exception:
+                            answers[question] = ''
+                finally:
+                    device.close()
+        except Exception:
+            pass
+
+        return answers
+
+    def finish_probe_all(self):
+        """ Once all ports have been probed, assigns to each device the port where its answer was found and saves the
+        new configuration.
+
+        :return: None
+        """
+        if self.probe_thread.is_alive():
+            self.after(100, self.finish_probe_all)
+            return
+
+        self.probe_button['state'] = 'enabled'
+        if self.probe_result is None:
+            self.info_lbl['text'] = 'ERROR: The ports could not be probed.'
+            return
+
+        devices, answers = self.probe_result
+
+        # The ports where the answer of each device was found, and the devices found in each port
+        matches = {}
+        claims = {}
+        for dev in devices:
+            device_info = self.current_config[dev]
+            matches[dev] = []
+            for port in sorted(answers):
+                answer = answers[port].get(device_info['Question/SN'], '')
+                if answer != '' and device_info['Answer'] in answer:
+                    matches[dev].append(port)
+                    claims.setdefault(port, []).append(dev)
+
+        # A port is given to one device only. If the answer of several devices is found in the same port, we can not
+        # tell which one is there, so none of them gets it
+        found = []
+        ambiguous = []
+        assigned = set()
+        for dev in devices:
+            ports = [port for port in matches[dev] if port not in assigned]
+            unique = [port for port in ports if len(claims[port]) == 1]
+
+            if len(unique) > 0:
+                self.current_config[dev]['Port'] = unique[0]
+                assigned.add(unique[0])
+                found.append(dev)
+            elif len(ports) > 0:
+                ambiguous.append('{0} ({1})'.format(dev, ', '.join(ports)))
+
+        if len(found) > 0:
+            self.save_last_working_config()
 
-        if 'None' not in (serialp + visap):
-            serialp.append('None')
+        self.port_entry['values'] = self.scanner.ports
+        self.update_dev_selected()
+        self.info_lbl['text'] = 'Found {0} of {1} devices: {2}'.format(len(found), len(devices), ', '.join(found))
+        if len(ambiguous) > 0:
+            self.info_lbl['text'] += '\nNot assigned, as other devices answer the same: {0}'.format(', '.join(ambiguous))
 
-        self.port_entry['values'] = serialp + visap
+    def scan_ports(self, force=True):
+        """ Finds all active serial and visa ports. The scan runs in the background and the list of ports is updated
+        once it is finished. Meanwhile, the last known ports are used.
 
-        return serialp + visap
+        :param force: Scan the ports even if the last known ports are still valid. Default=True
+        :return: The list of last known ports
+        """
+        if self.scanner.refresh(force) or self.scanner.is_scanning():
+            self.info_lbl['text'] = 'Scanning ports...'
+            self.after(100, self.update_ports)
+
+        return self.scanner.ports
+
+    def update_ports(self):
+        """ Updates the list of ports shown once the background scan is finished
+
+        :return: None
+        """
+        if self.scanner.is_scanning():
+            self.after(100, self.update_ports)
+            return
+
+        if self.scanner.version != self.ports_version:
+            self.ports_version = self.scanner.version
+            self.port_entry['values'] = self.scanner.ports
+            self.info_lbl['text'] = ''
 
     def selector_window(self):
         """ Creates the front end of the hardware selector window.
@@ -295,7 +505,7 @@ class Devman(tk.Toplevel):
 
         self.port_entry = ttk.Combobox(info_frame, width=18, textvariable=self.port_var)
         self.port_entry.grid(column=3, row=6, sticky=tk.NSEW)
-        self.port_entry['values'] = self.scan_ports()
+        self.port_entry['values'] = self.scan_ports(force=False)
 
         # The choosing buttom, port scan button and the information ribbon
         scan_ports_button = ttk.Button(info_frame, text='Scan ports', width=10, command=self.scan_ports)
@@ -303,6 +513,18 @@ class Devman(tk.Toplevel):
         scan_ports_button.grid(column=2, row=7, sticky=tk.NSEW)
         check_button.grid(column=3, row=7, sticky=tk.NSEW)
 
+        # Timing of the communication with the devices. It only applies to devices opened after enabling it
+        self.instrument_var = tk.BooleanVar()
+        self.instrument_var.set(False)
+        ttk.Checkbutton(info_frame, text='Time device I/O', variable=self.instrument_var)\
+            .grid(column=2, row=8, sticky=(tk.W, tk.S))
+        ttk.Button(info_frame, text='I/O stats', width=10, command=self.show_io_stats)\
+            .grid(column=3, row=8, sticky=tk.NSEW)
+
+        # Finds the port of all the devices at once
+        self.probe_button = ttk.Button(info_frame, text='Probe all', width=10, command=self.probe_all)
+        self.probe_button.grid(column=2, row=9, columnspan=2, sticky=tk.NSEW)
+
     def add(self):
         """ Adds a new device to the configure hardware list using some default values. The new device will not be saved
         in the configuration file until it has been check it works (pressing the check buttom).
@@ -437,6 +659,10 @@ class Devman(tk.Toplevel):
         if dev_name != dev_selected:
             self.rename_hw(dev_selected, dev_name)
 
+        # If the device is open but idle, we close it so it is opened again with the new configuration
+        if dev_name in self.pool and self.pool[dev_name]['leases'] == 0:
+            self.release(dev_name)
+
         port = self.port_var.get()
         out = self.check(port, dev_name)
 
@@ -454,6 +680,57 @@ class Devman(tk.Toplevel):
         else:
             self.info_lbl['text'] = 'ERROR: This is not the port or the device is not listening.'
 
+    def show_io_stats(self):
+        """ Shows a window with the statistics of the time spent talking to the instrumented devices, per device and
+        per method.
+
+        :return: None
+        """
+        if self.io_window is None:
+            self.io_window = tk.Toplevel(self)
+            self.io_window.title('Device I/O statistics')
+            self.io_window.protocol('WM_DELETE_WINDOW', self.io_window.withdraw)
+
+            frame = ttk.Frame(self.io_window, padding=(15, 15, 15, 15))
+            frame.grid(sticky=tk.NSEW)
+
+            self.io_text = tk.Text(frame, width=100, height=20, wrap=tk.NONE)
+            self.io_text.grid(column=0, row=0, columnspan=3, sticky=tk.NSEW)
+
+            ttk.Button(frame, text='Refresh', command=self.update_io_stats).grid(column=0, row=1, sticky=tk.EW)
+            ttk.Button(frame, text='Reset', command=self.reset_io_stats).grid(column=1, row=1, sticky=tk.EW)
+            ttk.Button(frame, text='Save...', command=self.save_io_stats).grid(column=2, row=1, sticky=tk.EW)
+
+        self.update_io_stats()
+        self.io_window.deiconify()
+        self.io_window.lift(self)
+
+    def update_io_stats(self):
+        """ Updates the statistics shown in the I/O statistics window
+
+        :return: None
+        """
+        self.io_text.delete('1.0', tk.END)
+        self.io_text.insert(tk.END, self.io_stats.table().expandtabs(16))
+
+    def reset_io_stats(self):
+        """ Removes all the statistics collected so far
+
+        :return: None
+        """
+        self.io_stats.reset()
+        self.update_io_stats()
+
+    def save_io_stats(self):
+        """ Saves the statistics in a file, so different setups can be compared
+
+        :return: None
+        """
+        filename = filedialog.asksaveasfilename(defaultextension='txt', parent=self.io_window)
+
+        if filename != '':
+            self.io_stats.dump(filename, comment='Devices in use: ' + ', '.join(self.used_devices))
+
     def get_devices(self, filter):
 
         filtered_devices = [dev for dev in self.current_config.sections() if self.current_config[dev]['Type'] in filter]
@@ -472,6 +749,7 @@ class Devman(tk.Toplevel):
 
         :return: None
         """
+        self.scan_ports(force=False)
         self.update()
         self.deiconify()
         tools.center(self)
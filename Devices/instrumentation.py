@@ -0,0 +1,182 @@
+""" This module includes the tools needed to measure how long the communication with the devices takes, so slow scans
+can be traced back to the device (or the method) responsible.
+"""
+
+import time
+import functools
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# The methods of the devices that are timed by default. They are the ones talking to the hardware in most drivers.
+timed_methods = ['query', 'write', 'read', 'measure', 'move', 'get_data', 'collect_data', 'set_bias', 'trigger',
+                 'setup_measurement', 'update_integration_time', 'operate_on', 'operate_off', 'getTemp', 'getSP',
+                 'setSP', 'pulse']
+
+
+class Histogram(object):
+    """ Histogram of durations with logarithmically spaced bins, from 1 us to 1000 s. It uses a fixed amount of memory
+    regardless of the number of values added and gives the percentiles with a resolution of about 10%.
+    """
+
+    edges = np.logspace(-6, 3, 9 * 25 + 1)
+
+    def __init__(self):
+        """ Constructor of the Histogram class
+        """
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, value):
+        """ Adds a new value to the histogram
+
+        :param value: The duration, in seconds
+        :return: None
+        """
+        self.counts[np.searchsorted(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """ Gets a percentile of the durations. The upper edge of the bin containing the percentile is returned.
+
+        :param p: The percentile, between 0 and 100
+        :return: The duration, in seconds, or NaN if there are no values
+        """
+        if self.count == 0:
+            return np.nan
+
+        i = np.searchsorted(np.cumsum(self.counts), np.ceil(self.count * p / 100.))
+        if i >= len(self.edges):
+            return self.max
+
+        return min(self.edges[i], self.max)
+
+    def mean(self):
+        """ Gets the mean duration
+
+        :return: The mean, in seconds, or NaN if there are no values
+        """
+        return self.total / self.count if self.count > 0 else np.nan
+
+
+class IOStats(object):
+    """ Collection of histograms with the duration of the calls to the devices, per device and per method. It can be
+    shared by several devices and used from several threads.
+    """
+
+    header = 'Device\tMethod\tCount\tMean (ms)\tp50 (ms)\tp95 (ms)\tp99 (ms)\tMax (ms)'
+
+    def __init__(self):
+        """ Constructor of the IOStats class
+        """
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def add(self, device, method, value):
+        """ Adds a new duration to the histogram of the device and method
+
+        :param device: The name of the device
+        :param method: The name of the method
+        :param value: The duration, in seconds
+        :return: None
+        """
+        with self.lock:
+            if (device, method) not in self.histograms:
+                self.histograms[(device, method)] = Histogram()
+            self.histograms[(device, method)].add(value)
+
+    def reset(self):
+        """ Removes all the data
+
+        :return: None
+        """
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self):
+        """ Gets a summary of the statistics of each device and method
+
+        :return: A list of tuples (device, method, count, mean, p50, p95, p99, max), with the times in seconds, sorted
+        by device and method
+        """
+        with self.lock:
+            summary = []
+            for (device, method), h in sorted(self.histograms.items()):
+                summary.append((device, method, h.count, h.mean(), h.percentile(50), h.percentile(95),
+                                h.percentile(99), h.max))
+
+        return summary
+
+    def table(self):
+        """ Gets the summary of the statistics as a tab separated table, with the times in ms
+
+        :return: A string with the table
+        """
+        lines = [self.header]
+        for device, method, count, *times in self.summary():
+            lines.append('{0}\t{1}\t{2}\t'.format(device, method, count) +
+                         '\t'.join(['{0:.3f}'.format(t * 1000) for t in times]))
+
+        return '\n'.join(lines)
+
+    def dump(self, filename, comment=''):
+        """ Saves the summary of the statistics in a file, so different setups can be compared
+
+        :param filename: The name of the file
+        :param comment: Some text to add at the beginning of the file, describing the setup. Default=''
+        :return: None
+        """
+        with open(filename, 'w') as f:
+            f.write('# I/O statistics saved on {0}\n'.format(datetime.now().isoformat()))
+            if comment != '':
+                f.write('# {0}\n'.format(comment))
+            f.write(self.table() + '\n')
+
+
+class Instrumented(object):
+    """ Proxy of a device that times the calls to the methods talking to the hardware and keeps the durations in an
+    IOStats object. Any other attribute is passed to the device unchanged, so the proxy can be used instead of the
+    device. Calls made by the device to its own methods are not timed separately, but are part of the time of the
+    method that made them.
+    """
+
+    def __init__(self, device, stats, methods=None):
+        """ Constructor of the Instrumented class
+
+        :param device: The device to be timed
+        :param stats: The IOStats object where the durations are kept
+        :param methods: List with the names of the methods to time. Default=None (the ones in timed_methods)
+        """
+        object.__setattr__(self, '_device', device)
+        object.__setattr__(self, '_stats', stats)
+        object.__setattr__(self, '_methods', timed_methods if methods is None else methods)
+
+    def __getattr__(self, name):
+        attr = getattr(self._device, name)
+
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        device = self._device.info['Name']
+        stats = self._stats
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                stats.add(device, name, time.perf_counter() - start)
+
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._device, name, value)
+
+    def __repr__(self):
+        return 'Instrumented({0!r})'.format(self._device)
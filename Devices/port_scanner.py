@@ -0,0 +1,107 @@
+""" This module includes the port discovery service used by the Device Manager. It finds the available serial and VISA
+ports in the background and caches the result, so the hardware window does not need to wait for it.
+"""
+
+import time
+import threading
+
+from Devices.serial_ports import serial_ports, candidate_ports
+from Devices.visa_ports import visa_ports
+
+
+class PortScanner(object):
+    """ Discovers the available serial and VISA ports in a background thread and caches them. The cache expires after
+    some time or as soon as a serial port is plugged or unplugged.
+    """
+
+    def __init__(self, use_visa=True, ttl=60., timeout=2.):
+        """ Constructor of the PortScanner class
+
+        :param use_visa: If VISA ports must be scanned, as long as VISA is available. Default=True
+        :param ttl: Time (s) the list of ports is considered valid. Default=60
+        :param timeout: Maximum time (s) to wait for the serial ports to be probed. Default=2
+        """
+        self.use_visa = use_visa
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self.ports = ['None']
+        self.serial = []
+        self.visa = []
+        self.candidates = None
+        self.time = None
+        self.version = 0
+
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def is_stale(self):
+        """ Checks if the cached list of ports is too old or if the serial ports have changed since it was created.
+
+        :return: True if the ports need to be scanned again
+        """
+        if self.time is None or time.monotonic() - self.time > self.ttl:
+            return True
+
+        try:
+            return set(candidate_ports()) != self.candidates
+        except EnvironmentError:
+            return False
+
+    def is_scanning(self):
+        """ If there is a scan running in the background
+
+        :return: True or False
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def refresh(self, force=False):
+        """ Starts a scan of the ports in the background, unless one is already running or the cached ports are still
+        valid. The result is available in self.ports once the scan is finished, and self.version is increased.
+
+        :param force: Scan the ports even if the cached list is still valid. Default=False
+        :return: True if a new scan has been started
+        """
+        with self.lock:
+            if self.is_scanning() or not (force or self.is_stale()):
+                return False
+
+            self.thread = threading.Thread(target=self.scan, daemon=True)
+            self.thread.start()
+            return True
+
+    def scan(self):
+        """ Scans the serial and VISA ports. This is run in the background by self.refresh, but can also be called
+        directly.
+
+        :return: The list of available ports
+        """
+        try:
+            candidates = set(candidate_ports())
+        except EnvironmentError:
+            candidates = set()
+
+        serialp = serial_ports(timeout=self.timeout)
+
+        # The VISA library is loaded here, in the background, the first time it is needed
+        visap = []
+        if self.use_visa:
+            try:
+                visap = visa_ports()
+            except OSError:
+                pass
+            except Exception as err:
+                print('WARNING: {0}\tVISA ports could not be listed.'.format(err))
+
+        if 'None' not in (serialp + visap):
+            serialp.append('None')
+
+        with self.lock:
+            self.serial = [p for p in serialp if p != 'None']
+            self.visa = [p for p in visap if p != 'None']
+            self.ports = serialp + visap
+            self.candidates = candidates
+            self.time = time.monotonic()
+            self.version += 1
+
+        return self.ports
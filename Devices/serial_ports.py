@@ -1,39 +1,100 @@
 __author__ = 'D. Alonso-Álvarez'
 
+import os
 import sys
 import glob
+import time
 import serial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
+# The instrument simulators leave here links to their pseudo-terminals, so they are found as any other serial port
+simulators_folder = os.path.join(os.path.expanduser('~'), '.Mordor', 'simulators')
 
-def serial_ports():
-    """Lists the available serial ports
+
+def candidate_ports():
+    """Lists the ports that might be serial ports in this platform, without checking them
 
     :raises EnvironmentError:
         On unsupported or unknown platforms
     :returns:
-        A list of available serial ports
+        A list of port names
     """
     if sys.platform.startswith('win'):
         ports = ['COM' + str(i + 1) for i in range(256)]
 
     elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
         # this is to exclude your current terminal "/dev/tty"
-        ports = glob.glob('/dev/tty[A-Za-z]*')
+        ports = glob.glob('/dev/tty[A-Za-z]*') + glob.glob(os.path.join(simulators_folder, '*'))
 
     elif sys.platform.startswith('darwin'):
-        ports = glob.glob('/dev/tty.*')
+        ports = glob.glob('/dev/tty.*') + glob.glob(os.path.join(simulators_folder, '*'))
 
     else:
         raise EnvironmentError('Unsupported platform')
 
+    return ports
+
+
+def probe_port(port):
+    """Checks if a serial port is available by opening and closing it
+
+    :param port: The name of the port
+    :returns:
+        True if the port can be opened
+    """
+    try:
+        s = serial.Serial(port)
+        s.close()
+        return True
+    except (OSError, serial.SerialException):
+        return False
+
+
+def serial_ports(timeout=2., workers=32):
+    """Lists the available serial ports. The ports are probed concurrently and those that do not answer within the
+    timeout, counted from the moment each one starts being probed, are ignored. The ports still queued are only given up
+    if all the workers are blocked by ports that hang.
+
+    :param timeout: Maximum time (s) to wait for each port to be probed
+    :param workers: Number of ports probed at the same time
+    :raises EnvironmentError:
+        On unsupported or unknown platforms
+    :returns:
+        A list of available serial ports
+    """
+    ports = candidate_ports()
+
     result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
+    if len(ports) > 0:
+        workers = min(workers, len(ports))
+        started = {}
+
+        def probe(port):
+            started[port] = time.monotonic()
+            return probe_port(port)
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(probe, port) for port in ports]
+
+        pending = set(futures)
+        hung = 0
+        while len(pending) > 0 and hung < workers:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            late = set([f for port, f in zip(ports, futures)
+                        if f in pending and port in started and now - started[port] > timeout])
+            pending -= late
+            hung += len(late)
+
+        # We don't wait for the ports that hang when opened, and those that have not been probed are not probed anymore.
+        # Those still queued are cancelled one by one, as shutdown can not do it before Python 3.9
+        for f in pending:
+            f.cancel()
+        pool.shutdown(wait=False)
+
+        result = [port for port, f in zip(ports, futures)
+                  if f.done() and not f.cancelled() and f.exception() is None and f.result()]
 
     if len(result)== 0:
         result.append('None')
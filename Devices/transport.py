@@ -0,0 +1,460 @@
+""" This module includes the transports used by the drivers to talk to the devices: serial ports, VISA resources and TCP
+sockets. They all read whole messages, ending with a termination, and each request can have its own timeout.
+
+The transports are asynchronous and run in an event loop shared by all the devices, in a background thread, so
+requests to different devices can be done concurrently, eg. reading the lock-in while the monochromator moves. Every
+coroutine can also be run synchronously with 'run', which is what the drivers do in their usual (blocking) methods.
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Devices.visa_resources import open_resource
+
+_loop = None
+_lock = threading.Lock()
+
+
+def event_loop():
+    """ Gets the event loop shared by all the transports, starting it in a background thread the first time it is
+    requested.
+
+    :return: The event loop
+    """
+    global _loop
+
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='Transports', daemon=True).start()
+
+        return _loop
+
+
+def run(coroutine):
+    """ Runs a coroutine in the event loop of the transports and waits for its result. It must not be called from a
+    coroutine running in that loop.
+
+    :param coroutine: The coroutine, eg. transport.query('*IDN?')
+    :return: The result of the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, event_loop()).result()
+
+
+def gather(*coroutines):
+    """ Runs several coroutines concurrently, eg. requests to different devices, and waits for all of them.
+
+    :param coroutines: The coroutines
+    :return: A list with the results, in the same order as the coroutines
+    """
+    async def all_of_them():
+        return await asyncio.gather(*coroutines)
+
+    return run(all_of_them())
+
+
+def open_transport(port, **kwargs):
+    """ Opens the transport to a device, according to its port. Addresses like 'tcp://192.168.1.10:5025' are TCP
+    sockets, any other address with ':' is a VISA resource (eg. 'GPIB::10') and the rest are serial ports (eg. 'COM4').
+
+    :param port: The port of the device
+    :param kwargs: The options of the transport. Those not used by the transport are passed to the serial port or the
+    VISA resource
+    :return: The transport
+    """
+    if port.lower().startswith('tcp://'):
+        host, tcp_port = port[6:].rsplit(':', 1)
+        return TcpTransport(host, int(tcp_port), **kwargs)
+    elif ':' in port:
+        return VisaTransport(port, **kwargs)
+    else:
+        return SerialTransport(port, **kwargs)
+
+
+class Transport(object):
+    """ Base class of the transports. The subclasses only need to send and receive bytes, while this class splits the
+    data in messages. Requests to the same device are done one at a time, even if they come from different threads.
+
+    After a timeout, the answer might still arrive later, so it is waited for and discarded before the next request.
+    Otherwise, each answer would be taken as the answer of the following request.
+    """
+
+    drain_time = 1.     # Maximum time (s) waiting for a late answer before the next request, after a timeout
+
+    def __init__(self, read_termination='\n', write_termination='\n', timeout=5., encoding='utf-8'):
+        """ Constructor of the Transport class
+
+        :param read_termination: The end of the messages sent by the device. Default='\n'
+        :param write_termination: The end of the messages sent to the device. Default='\n'
+        :param timeout: Default timeout of the requests, in seconds. None waits forever. Default=5
+        :param encoding: The encoding of the messages. Default='utf-8'
+        """
+        self.read_termination = read_termination
+        self.write_termination = write_termination
+        self.timeout = timeout
+        self.encoding = encoding
+
+        self.buffer = b''
+        self.late = None
+        self._lock = None
+
+    @property
+    def lock(self):
+        """ The lock that keeps the requests to the device one at a time. It is created in the event loop, the first
+        time it is needed. """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def deadline(self, timeout):
+        """ The time at which a request must be finished
+
+        :param timeout: The timeout of the request, in seconds. None uses the default timeout of the transport
+        :return: The deadline, as given by time.monotonic, or None if there is no limit
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    @staticmethod
+    def remaining(deadline):
+        """ The time left before a deadline
+
+        :param deadline: The deadline, as given by time.monotonic, or None
+        :raises TimeoutError: If the deadline has passed
+        :return: The time left, in seconds, or None if there is no limit
+        """
+        if deadline is None:
+            return None
+
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError
+        return left
+
+    async def send(self, data, deadline):
+        """ Sends the data to the device. To be implemented by the subclasses.
+
+        :param data: The data, as bytes
+        :param deadline: The deadline of the request
+        :return: None
+        """
+        raise NotImplementedError
+
+    async def receive(self, deadline):
+        """ Receives the data available from the device, waiting for it if necessary. To be implemented by the
+        subclasses.
+
+        :param deadline: The deadline of the request
+        :return: The data, as bytes. It might be empty if there was no data for some time
+        """
+        raise NotImplementedError
+
+    async def _write(self, message, deadline):
+        if self.late is not None:
+            await self._drain()
+        await self.send((message + self.write_termination).encode(self.encoding), deadline)
+
+    async def _drain(self):
+        """ Waits for the answer that did not arrive in time, for self.drain_time at most, and discards it together with
+        any other data received but not read.
+
+        :return: None
+        """
+        def complete():
+            if isinstance(self.late, int):
+                return len(self.buffer) >= self.late
+            return self.late in self.buffer
+
+        deadline = time.monotonic() + self.drain_time
+        try:
+            while not complete():
+                self.remaining(deadline)
+                self.buffer += await self.receive(deadline)
+        except TimeoutError:
+            pass
+
+        self.late = None
+        self.discard()
+
+    async def _read(self, deadline, termination=None):
+        termination = (self.read_termination if termination is None else termination).encode(self.encoding)
+
+        # If the answer does not arrive in time, it is the termination that tells when it has finally arrived
+        self.late = termination
+        while termination not in self.buffer:
+            self.remaining(deadline)
+            self.buffer += await self.receive(deadline)
+        self.late = None
+
+        message, self.buffer = self.buffer.split(termination, 1)
+        return message.decode(self.encoding)
+
+    async def _read_bytes(self, count, deadline):
+        self.late = count
+        while len(self.buffer) < count:
+            self.remaining(deadline)
+            self.buffer += await self.receive(deadline)
+        self.late = None
+
+        data, self.buffer = self.buffer[:count], self.buffer[count:]
+        return data
+
+    async def write(self, message, timeout=None):
+        """ Sends a message to the device, adding the write termination
+
+        :param message: The message
+        :param timeout: Timeout, in seconds. Default=None (the default timeout of the transport)
+        :raises TimeoutError: If the message could not be sent in time
+        :return: None
+        """
+        async with self.lock:
+            await self._write(message, self.deadline(timeout))
+
+    async def read(self, timeout=None, termination=None):
+        """ Reads the next message sent by the device
+
+        :param timeout: Timeout, in seconds. Default=None (the default timeout of the transport)
+        :param termination: The end of the message. Default=None (the read termination of the transport)
+        :raises TimeoutError: If the whole message did not arrive in time
+        :return: The message, without the termination
+        """
+        async with self.lock:
+            try:
+                return await self._read(self.deadline(timeout), termination)
+            except TimeoutError:
+                raise TimeoutError('No answer from {0} in time'.format(self))
+
+    async def read_bytes(self, count, timeout=None):
+        """ Reads a number of bytes, regardless of any termination. To be used with binary data.
+
+        :param count: The number of bytes
+        :param timeout: Timeout, in seconds. Default=None (the default timeout of the transport)
+        :raises TimeoutError: If the bytes did not arrive in time
+        :return: The data, as bytes
+        """
+        async with self.lock:
+            try:
+                return await self._read_bytes(count, self.deadline(timeout))
+            except TimeoutError:
+                raise TimeoutError('{0} did not send {1} bytes in time'.format(self, count))
+
+    async def query(self, message, timeout=None, until=None):
+        """ Sends a message to the device and reads the answer. No other request to the device can be done in between.
+
+        :param message: The message
+        :param timeout: Timeout of the whole request, in seconds. Default=None (the default timeout of the transport)
+        :param until: If given, function that gets each line of the answer and tells if it is the last one, for answers
+        with several lines. Default=None (the answer has one line)
+        :raises TimeoutError: If the answer did not arrive in time
+        :return: The answer or, if 'until' is given, a list with the lines of the answer
+        """
+        async with self.lock:
+            deadline = self.deadline(timeout)
+            try:
+                await self._write(message, deadline)
+                if until is None:
+                    return await self._read(deadline)
+
+                lines = [await self._read(deadline)]
+                while not until(lines[-1]):
+                    lines.append(await self._read(deadline))
+                return lines
+            except TimeoutError:
+                raise TimeoutError('No answer from {0} to {1!r} in time'.format(self, message))
+
+    async def query_bytes(self, message, count, timeout=None):
+        """ Sends a message to the device and reads an answer with a number of bytes, regardless of any termination. To
+        be used with binary data. No other request to the device can be done in between.
+
+        :param message: The message
+        :param count: The number of bytes of the answer
+        :param timeout: Timeout of the whole request, in seconds. Default=None (the default timeout of the transport)
+        :raises TimeoutError: If the answer did not arrive in time
+        :return: The answer, as bytes
+        """
+        async with self.lock:
+            deadline = self.deadline(timeout)
+            try:
+                await self._write(message, deadline)
+                return await self._read_bytes(count, deadline)
+            except TimeoutError:
+                raise TimeoutError('{0} did not send {1} bytes in time after {2!r}'.format(self, count, message))
+
+    def discard(self):
+        """ Drops the data received but not read
+
+        :return: None
+        """
+        self.buffer = b''
+
+    def close(self):
+        """ Closes the connection with the device
+
+        :return: None
+        """
+        pass
+
+
+class SerialTransport(Transport):
+    """ Transport through a serial port. The blocking calls to the port are done in a thread of its own.
+    """
+
+    poll = 0.05     # Maximum time (s) a read of the port waits for data, so the timeouts are checked regularly
+
+    def __init__(self, port, read_termination='\n', write_termination='\n', timeout=5., encoding='utf-8', **kwargs):
+        """ Constructor of the SerialTransport class
+
+        :param port: The serial port, eg. 'COM4' or '/dev/ttyUSB0'
+        :param kwargs: The settings of the port (baudrate, parity...). The rest of the arguments are those of Transport
+        """
+        import serial
+
+        Transport.__init__(self, read_termination, write_termination, timeout, encoding)
+
+        kwargs['timeout'] = self.poll
+        self.serial = serial.Serial(port=port, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __str__(self):
+        return 'serial port {0}'.format(self.serial.port)
+
+    async def send(self, data, deadline):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.serial.write, data)
+
+    async def receive(self, deadline):
+        def read():
+            return self.serial.read(max(1, self.serial.in_waiting))
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, read)
+
+    def discard(self):
+        Transport.discard(self)
+        self.serial.reset_input_buffer()
+
+    def close(self):
+        self.executor.shutdown()
+        self.serial.close()
+
+
+class VisaTransport(Transport):
+    """ Transport through a VISA resource (GPIB, USB, TCPIP...). VISA already splits the data in messages, so the read
+    termination is set in the resource. The blocking calls are done in a thread of its own.
+    """
+
+    def __init__(self, address, read_termination='\n', write_termination='\n', timeout=5., encoding='utf-8', **kwargs):
+        """ Constructor of the VisaTransport class
+
+        :param address: The address of the resource, eg. 'GPIB::10'
+        :param kwargs: Other options of the resource. The rest of the arguments are those of Transport
+        """
+        Transport.__init__(self, read_termination, write_termination, timeout, encoding)
+
+        self.resource = open_resource(address, read_termination=read_termination,
+                                      write_termination=write_termination, encoding=encoding, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __str__(self):
+        return self.resource.resource_name
+
+    async def call(self, deadline, method, *args, **kwargs):
+        """ Calls a method of the resource in its thread, with the time left before the deadline as VISA timeout
+
+        :param deadline: The deadline of the request
+        :param method: The name of the method
+        :return: What the method returns
+        """
+        def call():
+            left = self.remaining(deadline)
+            self.resource.timeout = None if left is None else max(int(left * 1000), 1)
+            return getattr(self.resource, method)(*args, **kwargs)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except TimeoutError:
+            raise
+        except Exception as err:
+            # Each VISA library has its own errors, but timeouts are always reported the same way
+            if 'timeout' in str(err).lower():
+                raise TimeoutError
+            raise
+
+    async def _write(self, message, deadline):
+        if self.late is not None:
+            await self._drain()
+        await self.call(deadline, 'write', message)
+
+    async def _drain(self):
+        # The device clear done by discard already drops the answer the device was preparing
+        self.late = None
+        self.discard()
+
+    async def _read(self, deadline, termination=None):
+        if termination is None or termination == self.read_termination:
+            try:
+                return await self.call(deadline, 'read')
+            except TimeoutError:
+                self.late = self.read_termination
+                raise
+
+        return await Transport._read(self, deadline, termination)
+
+    async def receive(self, deadline):
+        return await self.call(deadline, 'read_raw')
+
+    async def _read_bytes(self, count, deadline):
+        try:
+            return await self.call(deadline, 'read_bytes', count)
+        except TimeoutError:
+            self.late = count
+            raise
+
+    def discard(self):
+        Transport.discard(self)
+        self.resource.clear()
+
+    def close(self):
+        self.executor.shutdown()
+        self.resource.close()
+
+
+class TcpTransport(Transport):
+    """ Transport through a TCP socket, eg. the raw socket of an instrument in port 5025.
+    """
+
+    def __init__(self, host, port, read_termination='\n', write_termination='\n', timeout=5., encoding='utf-8'):
+        """ Constructor of the TcpTransport class
+
+        :param host: The name or IP address of the device
+        :param port: The TCP port
+        The rest of the arguments are those of Transport
+        """
+        Transport.__init__(self, read_termination, write_termination, timeout, encoding)
+
+        self.host = host
+        self.port = port
+        self.reader, self.writer = run(asyncio.wait_for(asyncio.open_connection(host, port), self.timeout))
+
+    def __str__(self):
+        return 'tcp://{0}:{1}'.format(self.host, self.port)
+
+    async def send(self, data, deadline):
+        self.writer.write(data)
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.remaining(deadline))
+        except asyncio.TimeoutError:
+            raise TimeoutError
+
+    async def receive(self, deadline):
+        try:
+            data = await asyncio.wait_for(self.reader.read(4096), self.remaining(deadline))
+        except asyncio.TimeoutError:
+            raise TimeoutError
+
+        if data == b'':
+            raise ConnectionResetError('{0} has closed the connection'.format(self))
+        return data
+
+    def close(self):
+        event_loop().call_soon_threadsafe(self.writer.close)
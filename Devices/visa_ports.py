@@ -1,10 +1,16 @@
 __author__ = 'D. Alonso-Álvarez'
 
-import visa
+from Devices.visa_resources import get_resource_manager
 
-def visa_ports():
+def visa_ports(rm=None):
+    """ Lists the available VISA resources
+
+    :param rm: The VISA resource manager to use. Default=None (the shared one)
+    :return: A list with the available resources
+    """
+    if rm is None:
+        rm = get_resource_manager()
 
-    rm = visa.ResourceManager()
     port_list = [p for p in rm.list_resources()]
 
     if port_list == ['']:
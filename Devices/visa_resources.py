@@ -0,0 +1,103 @@
+""" This module gives access to the VISA resource manager shared by all the devices and port scans. The manager is only
+created the first time it is needed, so programs that do not use VISA devices do not pay for loading the VISA library.
+"""
+
+import threading
+
+import numpy as np
+
+_rm = None
+_error = None
+_lock = threading.Lock()
+
+
+def get_resource_manager():
+    """ Gets the VISA resource manager shared by the whole program, creating it the first time it is requested. If VISA
+    is not available, the error is remembered and raised again without trying to load the library every time.
+
+    :raises OSError: If VISA is not available
+    :return: The VISA resource manager
+    """
+    global _rm, _error
+
+    with _lock:
+        if _rm is None and _error is None:
+            try:
+                try:
+                    import visa
+                except ImportError:
+                    # Recent versions of PyVISA can only be imported with this name
+                    import pyvisa as visa
+                _rm = visa.ResourceManager()
+            except Exception as err:
+                _error = err
+                print("WARNING: {0}\t VISA devices (eg. GPIB) will not be available.\n".format(err))
+
+        if _rm is None:
+            raise OSError('VISA is not available: {0}'.format(_error))
+
+        return _rm
+
+
+def is_available():
+    """ Checks if VISA is available, creating the resource manager if necessary.
+
+    :return: True if VISA devices can be used
+    """
+    try:
+        get_resource_manager()
+        return True
+    except OSError:
+        return False
+
+
+def open_resource(address, **kwargs):
+    """ Opens a VISA resource using the shared resource manager. Devices must close the resource, not the manager.
+
+    :param address: The address of the resource, eg. 'GPIB::20'
+    :param kwargs: Any other option accepted by the open_resource method of the resource manager
+    :raises OSError: If VISA is not available
+    :return: The resource
+    """
+    # Raw sockets, like those of the simulators, have no end of message, so the answers must end with a termination
+    if address.upper().endswith('::SOCKET'):
+        kwargs.setdefault('read_termination', '\n')
+        kwargs.setdefault('write_termination', '\n')
+
+    return get_resource_manager().open_resource(address, **kwargs)
+
+
+def read_block(resource, dtype, count=None):
+    """ Reads the answer of an instrument sent as an IEEE 488.2 binary block, straight into an array. The block is
+    '#', the number of digits of the length, the length in bytes and the data. If the number of digits is 0, the length
+    is not given and the data ends with the message.
+
+    :param resource: The VISA resource, once the query has been written
+    :param dtype: The data type of the values, including the byte order, eg. '<f4'
+    :param count: The number of values. Only needed if the instrument does not send the length. Default=None
+    :raises ValueError: If the answer is not a binary block, or its length is unknown
+    :return: A numpy array with the values
+    """
+    dtype = np.dtype(dtype)
+
+    # The block can be preceded by some white space
+    header = resource.read_bytes(1)
+    while header.isspace():
+        header = resource.read_bytes(1)
+    if header != b'#':
+        raise ValueError('The answer is not a binary block: {0!r}'.format(header))
+
+    digits = int(resource.read_bytes(1))
+    if digits > 0:
+        length = int(resource.read_bytes(digits))
+    elif count is not None:
+        length = count * dtype.itemsize
+    else:
+        raise ValueError('The length of the binary block is unknown')
+
+    data = np.frombuffer(resource.read_bytes(length), dtype=dtype)
+
+    # The termination of the message follows the block
+    resource.read()
+
+    return data
@@ -1,5 +1,24 @@
-from .spectroscopy import Spectroscopy
-from .iv import IV
-from .temperature import Temperature
-from .flash import Flash
-from .cv import CV
+""" The experiments are imported only when they are requested, eg. 'from Experiments import IV', so the program can
+start without loading all of them and their dependencies.
+"""
+
+import importlib
+
+_experiments = {'Spectroscopy': '.spectroscopy',
+                'IV': '.iv',
+                'Temperature': '.temperature',
+                'Flash': '.flash',
+                'CV': '.cv'}
+
+__all__ = list(_experiments)
+
+
+def __getattr__(name):
+    if name in _experiments:
+        return getattr(importlib.import_module(_experiments[name], __name__), name)
+
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,447 @@
+""" This module includes the acquisition engine used by the experiments to run the measurements in a worker thread, so
+slow devices do not freeze the graphical interface.
+"""
+
+import time
+import queue
+import inspect
+import threading
+import traceback
+from collections import deque
+
+import numpy as np
+
+
+class Acquisition(object):
+    """ Runs the loop of a measurement in a worker thread. In each step, the worker calls a function that talks to the
+    devices and pushes the result into a thread-safe buffer. The graphical interface drains the buffer at its own
+    refresh rate, calling another function with the new data. Devices must only be used from the step function while
+    the acquisition is running.
+
+    Stop and pause are controlled with events, so they can be requested at any time from the graphical interface.
+    """
+
+    def __init__(self, window, step, on_data, on_finish=None, points=None, refresh=50, maxlen=10000, period=None):
+        """ Constructor of the Acquisition class
+
+        :param window: A tkinter widget, used to schedule the draining of the buffer in the graphical interface
+        :param step: Function called in the worker as step(i), where i is the number of the step. It returns the data of
+        that step. It can use self.wait to wait between steps
+        :param on_data: Function called in the graphical interface as on_data(data), where data is a list with the data
+        pushed into the buffer since the last call
+        :param on_finish: Function called in the graphical interface once the worker is finished and all the data has
+        been processed. Default=None
+        :param points: Number of steps of the measurement. Default=None (runs until it is stopped)
+        :param refresh: Time (ms) between drains of the buffer. Default=50
+        :param maxlen: Maximum size of the buffer of measurements that run until they are stopped. If the interface can
+        not keep up, the oldest data is lost and counted in self.dropped. Measurements with a number of steps keep all
+        their data. Default=10000
+        :param period: Time (s) between steps. If given, the step function can use self.wait_next to pace the
+        measurement with a DeadlineScheduler. Default=None
+        """
+        self.window = window
+        self.step = step
+        self.on_data = on_data
+        self.on_finish = on_finish
+        self.points = points
+        self.refresh = refresh
+
+        self.buffer = deque(maxlen=maxlen if points is None else None)
+        self.dropped = 0
+        self.reported = 0
+        self.stopped = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.finished = threading.Event()
+        self.error = None
+        self.closed = False
+
+        self.scheduler = None if period is None else DeadlineScheduler(period)
+        self.worker = None
+
+    def start(self):
+        """ Starts the worker and the draining of the buffer
+
+        :return: None
+        """
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+        self.window.after(self.refresh, self.poll)
+
+    def run(self):
+        """ The loop of the measurement, executed in the worker thread
+
+        :return: None
+        """
+        i = 0
+        try:
+            while not self.stopped.is_set() and (self.points is None or i < self.points):
+                # If paused, we wait until it is resumed or stopped
+                if not self.running.is_set():
+                    while not self.running.wait(0.1):
+                        if self.stopped.is_set():
+                            return
+
+                    # After a pause, the next step starts immediately rather than trying to catch up
+                    if self.scheduler is not None:
+                        self.scheduler.deadline = None
+
+                self.push(self.step(i))
+                i += 1
+
+        except Exception as err:
+            self.error = err
+            traceback.print_exc()
+
+        finally:
+            self.finished.set()
+
+    def poll(self):
+        """ Drains the buffer in the graphical interface, calling on_data with the new data, and schedules the next
+        drain. When the worker is finished and the buffer empty, on_finish is called. If on_data fails, the error is
+        reported and the measurement is stopped, but it is still finished with on_finish.
+
+        :return: None
+        """
+        if self.closed:
+            return
+
+        # We check if it is finished before draining, so no data is left behind
+        finished = self.finished.is_set()
+
+        data = []
+        while len(self.buffer) > 0:
+            data.append(self.buffer.popleft())
+
+        if self.dropped > self.reported:
+            print('WARNING: {0} points were lost, as the interface could not keep up'.format(self.dropped - self.reported))
+            self.reported = self.dropped
+
+        if len(data) > 0:
+            try:
+                self.on_data(data)
+            except Exception as err:
+                traceback.print_exc()
+                if self.error is None:
+                    self.error = err
+                self.stop()
+
+        if finished:
+            if self.error is not None:
+                print('ERROR: The measurement was interrupted: {0}'.format(self.error))
+
+            if self.scheduler is not None and len(self.scheduler.times) > 1:
+                print(self.scheduler.report())
+
+            if self.on_finish is not None:
+                try:
+                    self.on_finish()
+                except Exception:
+                    print('ERROR: The measurement could not be finished properly')
+                    traceback.print_exc()
+        else:
+            self.window.after(self.refresh, self.poll)
+
+    def push(self, data):
+        """ Pushes data into the buffer from the step function, for steps that produce their data in several pieces, eg.
+        a sweep read while it goes on. The data returned by the step is pushed as usual. If the buffer is full, the
+        oldest data is lost.
+
+        :param data: The data
+        :return: None
+        """
+        if not self.stopped.is_set():
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(data)
+
+    def wait(self, seconds):
+        """ Waits for some time in the worker. The wait is interrupted if the acquisition is stopped.
+
+        :param seconds: The waiting time, in seconds
+        :return: True if the acquisition was stopped while waiting
+        """
+        return self.stopped.wait(max(seconds, 0))
+
+    def wait_next(self):
+        """ Waits in the worker until the deadline of the next step, as given by the scheduler. The wait is interrupted
+        if the acquisition is stopped.
+
+        :return: True if the acquisition was stopped while waiting
+        """
+        return self.scheduler.wait(self.stopped)
+
+    def stop(self):
+        """ Requests the worker to stop after the current step
+
+        :return: None
+        """
+        self.stopped.set()
+        self.running.set()
+
+    def pause(self):
+        """ Requests the worker to pause after the current step
+
+        :return: None
+        """
+        self.running.clear()
+
+    def resume(self):
+        """ Resumes a paused acquisition
+
+        :return: None
+        """
+        self.running.set()
+
+    def close(self, timeout=5):
+        """ Stops the worker and waits for it to finish, so the devices can be closed safely. Data not yet drained is
+        discarded and on_finish is not called.
+
+        :param timeout: Maximum waiting time, in seconds. Default=5
+        :return: None
+        """
+        self.closed = True
+        self.stop()
+        if self.worker is not None:
+            self.worker.join(timeout)
+
+    @property
+    def paused(self):
+        """ If the acquisition is paused """
+        return not self.running.is_set()
+
+    def is_alive(self):
+        """ If the worker is still running
+
+        :return: True or False
+        """
+        return not self.finished.is_set()
+
+
+class SpectrometerStream(object):
+    """ Keeps a spectrometer integrating back to back in a producer thread, so the detector is not idle while the data
+    is processed and plotted. Each spectrum is written in one of a pair of buffers while the other one holds the last
+    complete spectrum, and they are swapped when the new spectrum is finished. Consumers can take the latest spectrum or,
+    if requested, every one of them, from a queue.
+
+    Spectrometers that accept an output array in 'measure' write the spectrum directly in the buffer. The others are
+    measured as usual and the spectrum is copied. The spectrometer must not be used by anyone else while the stream is
+    running.
+    """
+
+    def __init__(self, spectrometer, every=False, maxsize=1000):
+        """ Constructor of the SpectrometerStream class
+
+        :param spectrometer: The spectrometer
+        :param every: If every spectrum must be put in the queue, for consumers that can not miss any. Default=False
+        :param maxsize: Maximum size of the queue. If the consumer can not keep up, the new spectra are dropped.
+        Default=1000
+        """
+        self.spectrometer = spectrometer
+        self.every = every
+
+        try:
+            self.direct = 'out' in inspect.signature(spectrometer.measure).parameters
+        except (TypeError, ValueError):
+            self.direct = False
+
+        # Without the wavelength axis, the size of the buffers is only known after the first spectrum
+        self.buffers = None
+        if hasattr(spectrometer, 'wavelengths'):
+            size = len(spectrometer.wavelengths())
+            self.buffers = [np.zeros(size), np.zeros(size)]
+
+        self.front = 0
+        self.count = 0
+        self.dropped = 0
+        self.frames = queue.Queue(maxsize)
+
+        self.ready = threading.Condition()
+        self.stopped = threading.Event()
+        self.error = None
+        self.producer = None
+
+    def start(self):
+        """ Starts the producer
+
+        :return: None
+        """
+        self.stopped.clear()
+        self.producer = threading.Thread(target=self.run, daemon=True)
+        self.producer.start()
+
+    def run(self):
+        """ The loop of the producer: measures into the back buffer and then swaps the buffers
+
+        :return: None
+        """
+        try:
+            while not self.stopped.is_set():
+                back = 1 - self.front
+                if self.direct and self.buffers is not None:
+                    self.spectrometer.measure(out=self.buffers[back])
+                else:
+                    signal = self.spectrometer.measure()[1]
+                    if self.buffers is None:
+                        self.buffers = [np.zeros(len(signal)), np.zeros(len(signal))]
+                    self.buffers[back][:] = signal
+
+                with self.ready:
+                    self.front = back
+                    self.count += 1
+                    self.ready.notify_all()
+
+                if self.every:
+                    try:
+                        self.frames.put_nowait(self.buffers[back].copy())
+                    except queue.Full:
+                        self.dropped += 1
+
+        except Exception as err:
+            self.error = err
+            traceback.print_exc()
+
+        finally:
+            self.stopped.set()
+            with self.ready:
+                self.ready.notify_all()
+
+    def latest(self, after=0, timeout=None):
+        """ Gets the latest complete spectrum, waiting for one newer than a given one if necessary
+
+        :param after: The number of the last spectrum the consumer has got. Default=0 (any spectrum)
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait until there is one)
+        :return: A tuple with the number of the spectrum and a copy of it, or (after, None) if there was no new spectrum
+        """
+        with self.ready:
+            self.ready.wait_for(lambda: self.count > after or self.stopped.is_set(), timeout)
+            if self.count <= after:
+                return after, None
+
+            return self.count, self.buffers[self.front].copy()
+
+    def get(self, timeout=None):
+        """ Gets the next spectrum of the queue, if the stream was created with every=True
+
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait until there is one)
+        :return: The spectrum, or None if there was none before the timeout
+        """
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout=5):
+        """ Stops the producer once the spectrum being measured is finished, and waits for it. It can be called again,
+        eg. after requesting the stop with no waiting time. The dropped spectra are reported once the producer is gone.
+
+        :param timeout: Maximum waiting time, in seconds. Default=5
+        :return: None
+        """
+        self.stopped.set()
+        if self.producer is None:
+            return
+
+        self.producer.join(timeout)
+        if self.producer.is_alive():
+            return
+
+        self.producer = None
+        if self.dropped > 0:
+            print('WARNING: {0} spectra were dropped because they could not be processed in time'.format(self.dropped))
+
+
+class DeadlineScheduler(object):
+    """ Paces a loop at a fixed period. Each step has an absolute deadline on a monotonic clock, so the time spent doing
+    the work of the step (moving, measuring, plotting...) is subtracted from the waiting time and the period does not
+    drift. If a step is late by more than a whole period, the following deadlines are shifted rather than trying to
+    catch up with a burst of steps. The latency of each step with respect to its deadline is recorded, as well as its
+    time.
+    """
+
+    def __init__(self, period, history=10000):
+        """ Constructor of the DeadlineScheduler class
+
+        :param period: The requested time (s) between steps
+        :param history: Number of steps used for the statistics. Default=10000
+        """
+        self.period = period
+        self.deadline = None
+        self.missed = 0
+
+        self.latencies = deque(maxlen=history)
+        self.times = deque(maxlen=history)
+
+    def reset(self):
+        """ Resets the deadlines and the statistics. The next step will start immediately.
+
+        :return: None
+        """
+        self.deadline = None
+        self.missed = 0
+        self.latencies.clear()
+        self.times.clear()
+
+    def wait(self, event=None):
+        """ Waits until the deadline of the next step. The first step starts immediately.
+
+        :param event: A threading.Event that, if set, interrupts the wait. Default=None
+        :return: True if the wait was interrupted by the event
+        """
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        else:
+            self.deadline += self.period
+
+        remaining = self.deadline - now
+        interrupted = False
+        if remaining > 0:
+            if event is None:
+                time.sleep(remaining)
+            else:
+                interrupted = event.wait(remaining)
+
+        now = time.monotonic()
+        latency = now - self.deadline
+        if latency > self.period:
+            self.missed += 1
+            self.deadline = now
+
+        self.latencies.append(latency)
+        self.times.append(now)
+
+        return interrupted
+
+    def rate(self):
+        """ The sample rate achieved so far
+
+        :return: The rate in Hz, or NaN if there are not enough steps
+        """
+        if len(self.times) < 2 or self.times[-1] == self.times[0]:
+            return np.nan
+
+        return (len(self.times) - 1) / (self.times[-1] - self.times[0])
+
+    def jitter(self):
+        """ The jitter of the period, calculated as the standard deviation of the time between steps
+
+        :return: The jitter in seconds, or NaN if there are not enough steps
+        """
+        if len(self.times) < 3:
+            return np.nan
+
+        return np.std(np.diff(self.times))
+
+    def report(self):
+        """ Summary of the timing statistics
+
+        :return: A string with the requested and achieved rates, latency, jitter and missed deadlines
+        """
+        latencies = np.array(self.latencies) * 1000
+        requested = 1. / self.period if self.period > 0 else np.inf
+
+        return ('Sample rate: {0:.3f} Hz (requested {1:.3f} Hz). Latency: mean {2:.1f} ms, max {3:.1f} ms. '
+                'Jitter: {4:.1f} ms. Missed deadlines: {5}'.format(self.rate(), requested, np.mean(latencies),
+                                                                    np.max(latencies), self.jitter() * 1000,
+                                                                    self.missed))
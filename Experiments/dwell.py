@@ -0,0 +1,185 @@
+""" This module includes the planner of the dwell time in lock-in scans, the time waited after each move of the
+monochromator before measuring. Rather than a fixed time, it is the time the low pass filter of the lock-in needs to
+settle, given its time constant and slope, the accuracy requested and the change of the signal expected in the step.
+"""
+
+import math
+import time
+
+
+def settling_time(time_constant, slope=12, accuracy=0.01):
+    """ Time needed by the output of a lock-in to settle after a step in its input. The low pass filter is made of
+    slope/6 identical RC stages, whose step response is found by bisection.
+
+    :param time_constant: The time constant of the lock-in (s)
+    :param slope: The slope of the filter (dB/oct): 6, 12, 18 or 24. Default=12
+    :param accuracy: The error allowed, relative to the size of the step. Default=0.01
+    :return: The settling time (s)
+    """
+    if accuracy >= 1:
+        return 0.
+
+    stages = max(int(round(slope / 6.)), 1)
+
+    def error(x):
+        return math.exp(-x) * sum([x ** k / math.factorial(k) for k in range(stages)])
+
+    low, high = 0., 1.
+    while error(high) > accuracy:
+        low, high = high, 2 * high
+
+    while high - low > 1e-6 * high:
+        middle = 0.5 * (low + high)
+        if error(middle) > accuracy:
+            low = middle
+        else:
+            high = middle
+
+    return high * time_constant
+
+
+class DwellPlanner(object):
+    """ Plans the dwell time of each point of a lock-in scan. By default, the dwell is the time the lock-in needs to
+    settle after a full scale step, as nothing is known about the next point of the spectrum.
+
+    If the convergence is checked, the change of the signal in the next step is estimated from the last one, with some
+    margin, so the dwell is shorter where the spectrum is flat. A change larger than expected, eg. at the edge of a
+    peak, is caught when measuring: we wait what that change needs and measure again. Then, we keep measuring one time
+    constant later until two readings agree within the accuracy.
+
+    The time spent is compared with the fixed dwell it replaces, to report the time saved.
+    """
+
+    margin = 2.         # Factor applied to the last change of the signal to estimate the next one
+    max_checks = 10     # Maximum number of extra readings when checking the convergence
+
+    def __init__(self, time_constant, slope=12, accuracy=0.01, check=False, fixed=None):
+        """ Constructor of the DwellPlanner class
+
+        :param time_constant: The time constant of the lock-in (s)
+        :param slope: The slope of the filter (dB/oct). Default=12
+        :param accuracy: The error allowed in each point, relative to the signal. Default=0.01
+        :param check: If the convergence must be confirmed with extra readings. Default=False
+        :param fixed: The fixed dwell time (s) used otherwise, for the report. Default=None
+        """
+        self.time_constant = time_constant
+        self.slope = slope
+        self.accuracy = accuracy
+        self.check = check
+        self.fixed = fixed
+
+        self.reset()
+
+    @classmethod
+    def from_lockin(cls, lockin, integration_time, **kwargs):
+        """ Creates the planner for a lock-in, with its actual time constant and slope if it can give them
+
+        :param lockin: The lock-in
+        :param integration_time: The integration time selected (ms), used if the lock-in does not give its time constant
+        :param kwargs: The other arguments of the planner
+        :return: The planner
+        """
+        get_time_constant = getattr(lockin, 'get_time_constant', None)
+        time_constant = get_time_constant() if callable(get_time_constant) else integration_time / 1000.
+
+        get_slope = getattr(lockin, 'get_slope', None)
+        slope = get_slope() if callable(get_slope) else 6
+
+        return cls(time_constant, slope, **kwargs)
+
+    def reset(self):
+        """ Forgets the signal and the statistics, for a new scan. The first point settles completely.
+
+        :return: None
+        """
+        self.last = None
+        self.change = 1.
+        self.points = 0
+        self.checks = 0
+        self.spent = 0.
+
+    def dwell(self, change=None):
+        """ The dwell time for the next point. Without the convergence check, it is the settling time for a full scale
+        step, and with it at least one time constant.
+
+        :param change: The change of the signal relative to its value. Default=None (estimated from the last step)
+        :return: The time (s)
+        """
+        if not self.check:
+            return settling_time(self.time_constant, self.slope, self.accuracy)
+
+        change = self.margin * self.change if change is None else change
+        accuracy = self.accuracy / max(change, 1e-12)
+        return max(settling_time(self.time_constant, self.slope, accuracy), self.time_constant)
+
+    def relative_change(self, reading):
+        """ The change of the signal since the last point, relative to its value
+
+        :param reading: A reading of the lock-in. The first value is the signal
+        :return: The change, at most 1
+        """
+        value = float(reading[0])
+        if self.last is None or value == 0:
+            return 1.
+
+        return min(abs(value - self.last) / abs(value), 1.)
+
+    def measure(self, measure, wait):
+        """ Waits for the lock-in to settle after a move and measures
+
+        :param measure: Function that gets a reading from the lock-in. The first value is the signal
+        :param wait: Function that waits some seconds and returns True if the wait was interrupted, eg.
+        Acquisition.wait
+        :return: The reading
+        """
+        start = time.monotonic()
+
+        dwell = self.dwell()
+        wait(dwell)
+        reading = measure()
+
+        if self.check:
+            # If the signal has changed more than expected, the dwell was too short for that change, so we wait what it
+            # needs and measure again
+            change = self.relative_change(reading)
+            if change > self.margin * self.change:
+                extra = self.dwell(change) - dwell
+                if extra > 0 and not wait(extra):
+                    reading = measure()
+                    self.checks += 1
+
+            for _ in range(self.max_checks):
+                if wait(self.time_constant):
+                    break
+
+                previous, reading = reading, measure()
+                self.checks += 1
+                if abs(float(reading[0]) - float(previous[0])) <= self.accuracy * abs(float(reading[0])):
+                    break
+
+        if self.last is not None:
+            self.change = self.relative_change(reading)
+        self.last = float(reading[0])
+
+        self.points += 1
+        self.spent += time.monotonic() - start
+
+        return reading
+
+    def report(self):
+        """ Summary of the dwell times of the scan
+
+        :return: A string with the mean dwell time and the time saved compared with the fixed dwell
+        """
+        if self.points == 0:
+            return 'Dwell: no points measured'
+
+        mean = self.spent / self.points * 1000
+        text = 'Dwell: {0:.1f} ms per point on average ({1} extra readings)'.format(mean, self.checks)
+
+        if self.fixed is not None:
+            saved = self.fixed * self.points - self.spent
+            text += ', instead of {0:.1f} ms. Time saved: {1:.1f} s in {2} points'.format(self.fixed * 1000, saved,
+                                                                                          self.points)
+
+        return text
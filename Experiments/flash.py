@@ -18,6 +18,9 @@ import os
 
 import numpy as np
 
+import plot_utils as pu
+from Experiments.acquisition import Acquisition
+
 # Class definition
 class Flash(object):
     """ Some text
@@ -31,12 +34,16 @@ class Flash(object):
         self.create_interface()
 
         self.all_data = []
+        self.acquisition = None
         self.save = Save(self.window)
 
         # We load the dummy devices by default
         self.fill_devices()
 
     def _quit(self):
+        if self.acquisition is not None:
+            self.acquisition.close()
+
         self.dm.close_device(self.adquisition)
         self.dm.close_device(self.trigger)
         self.window.destroy()
@@ -93,9 +100,13 @@ class Flash(object):
         self.oscilloscope_trigger_box['values'] = self.adquisition.available_channels
         self.oscilloscope_trigger_box.current(3)
 
-    def run(self, current_shot=1, single=False):
+    def run(self, single=False):
+
+        # Both buttons start a new acquisition, so they do nothing until the one running is finished
+        if self.acquisition is not None and self.acquisition.is_alive():
+            return
 
-        if (current_shot == 1) and (not single):
+        if not single:
             self.clear_plot()
 
         # First we collect all the input settings from the front end
@@ -116,50 +127,89 @@ class Flash(object):
         tmax = samples * time_per_sample        # We recalculate tmax so it is a multiple of the number of points
         times = np.linspace(0, tmax, samples)  # µs
 
+        # The settings are read here, as the front end can not be used from the acquisition worker
+        self.settings = {'ref_res': ref_res, 'ref_Isc': ref_Isc, 'sig_res': sig_res, 'ref_chan': ref_chan,
+                         'I_chan': I_chan, 'V_chan': V_chan, 'trig_chan': trig_chan, 'delay': delay, 'rate': rate,
+                         'samples': samples, 'times': times, 'wait': self.wait_var.get(), 'single': single}
+
+        shots = 1 if single else self.shots_var.get()
+        self.acquisition = Acquisition(self.window, self.shoot, self.update_shots, self.finish_run, points=shots)
+        self.acquisition.start()
+
+    def shoot(self, i):
+        """ Fires the flash and collects the data from the oscilloscope. It runs in the acquisition worker.
+
+        :param i: The index of the shot
+        :return: The raw data of the oscilloscope
+        """
+        if i > 0:
+            self.acquisition.wait(self.settings['wait'])
+
         # Next we update the configuration of the oscilloscope
-        self.adquisition.set_sampling_rate(rate)
-        self.adquisition.set_number_samples(samples)
+        self.adquisition.set_sampling_rate(self.settings['rate'])
+        self.adquisition.set_number_samples(self.settings['samples'])
         self.adquisition.set_meas_ready()
 
         # Everithing is ready, so we trigger the measurement, adding some delay between the trigger of the adquisition and the flash
         self.adquisition.trigger()
-        time.sleep(delay)
-        self.trigger.pulse(trig_chan, 200)        
-        self.record = self.adquisition.collect_data()
+        time.sleep(self.settings['delay'])
+        self.trigger.pulse(self.settings['trig_chan'], 200)
+        return self.adquisition.collect_data()
+
+    def update_shots(self, data):
+        """ Converts the raw data of the new shots and updates the plot
 
-        # Add the time to the experimental data
-        self.record = np.hstack((times[:, None], self.record))
+        :param data: A list with the raw data of the new shots
+        :return: None
+        """
+        times = self.settings['times']
+        ref_chan = self.settings['ref_chan']
+        I_chan = self.settings['I_chan']
+        V_chan = self.settings['V_chan']
 
-        # Convert the voltage across the resistor of the reference into concentration
-        self.record[:, ref_chan] = -1000*self.record[:, ref_chan]/(ref_res*ref_Isc)
-        # Convert the voltage across the signal resistor into current in mA
-        self.record[:, I_chan] = 1000*self.record[:, I_chan]/sig_res
-        # Convert the voltage to possitive
-        self.record[:, V_chan] = -self.record[:, V_chan]
+        for raw in data:
+            # Add the time to the experimental data
+            self.record = np.hstack((times[:, None], raw))
 
-        self.all_data.append(self.record)
-        self.update_plot(times, self.record[:, I_chan], self.record[:, V_chan], self.record[:, ref_chan])
+            # Convert the voltage across the resistor of the reference into concentration
+            self.record[:, ref_chan] = -1000*self.record[:, ref_chan]/(self.settings['ref_res']*self.settings['ref_Isc'])
+            # Convert the voltage across the signal resistor into current in mA
+            self.record[:, I_chan] = 1000*self.record[:, I_chan]/self.settings['sig_res']
+            # Convert the voltage to possitive
+            self.record[:, V_chan] = -self.record[:, V_chan]
 
-        if current_shot < self.shots_var.get():
-            self.splash.splashroot.after(self.wait_var.get()*1000, self.run, current_shot+1)
+            self.all_data.append(self.record)
+            self.update_plot(times, self.record[:, I_chan], self.record[:, V_chan], self.record[:, ref_chan])
 
-        else:
-            print('Finish!!')
+    def finish_run(self):
+        """ Once all shots are done, it averages them, if not in single shot, and offers to save the data
 
-            # If not in single shot, we average all the data and offer to save it
-            if not single:
-                self.record = np.zeros_like(self.record)
-                for record in self.all_data:
-                    self.record = self.record + record
+        :return: None
+        """
+        print('Finish!!')
 
-                self.record = self.record / len(self.all_data)
-                self.update_plot(times, self.record[:, I_chan], self.record[:, V_chan], self.record[:, ref_chan])
+        if len(self.all_data) == 0:
+            return
 
-                self.update_IV()
-                self.save_data()
+        times = self.settings['times']
+        ref_chan = self.settings['ref_chan']
+        I_chan = self.settings['I_chan']
+        V_chan = self.settings['V_chan']
 
-            else:
-                self.update_IV()
+        # If not in single shot, we average all the data and offer to save it
+        if not self.settings['single']:
+            self.record = np.zeros_like(self.record)
+            for record in self.all_data:
+                self.record = self.record + record
+
+            self.record = self.record / len(self.all_data)
+            self.update_plot(times, self.record[:, I_chan], self.record[:, V_chan], self.record[:, ref_chan])
+
+            self.update_IV()
+            self.save_data()
+
+        else:
+            self.update_IV()
 
 
     def update_IV(self, *args):
@@ -383,7 +433,7 @@ class Flash(object):
         ttk.Entry(master=run_frame, width=10, textvariable=self.time_var).grid(column=1, row=3, sticky=tk.EW)
         ttk.Entry(master=run_frame, width=10, textvariable=self.trig_delay_var).grid(column=1, row=4, sticky=tk.EW)
 
-        ttk.Button(master=run_frame, width=10, text="Single shot", command=lambda: self.run(self.shots_var.get(), True))\
+        ttk.Button(master=run_frame, width=10, text="Single shot", command=lambda: self.run(single=True))\
             .grid(column=0, row=5, sticky=tk.EW)
         ttk.Button(master=run_frame, width=10, text="Run all", command=lambda: self.run())\
             .grid(column=1, row=5, sticky=tk.EW)
@@ -432,14 +482,15 @@ class Flash(object):
 
     def update_plot(self, times, Ch2, Ch3, Ch4):
 
-        self.Ch2.plot(times, Ch2)
-        self.Ch3.plot(times, Ch3)
-        self.Ch4.plot(times, Ch4)
+        # Long records are decimated before plotting them, keeping the full resolution data for zooming in
+        pu.plot(self.Ch2, times, Ch2)
+        pu.plot(self.Ch3, times, Ch3)
+        pu.plot(self.Ch4, times, Ch4)
 
-        self.Ch4.set_xlim([0, max(times)])
-        self.Ch4.set_ylim([min(Ch4), max(Ch4)])
-        self.Ch2.set_ylim([min(Ch2), max(Ch2)])
-        self.Ch3.set_ylim([min(Ch3), max(Ch3)])
+        self.Ch4.set_xlim([0, np.max(times)])
+        self.Ch4.set_ylim([np.min(Ch4), np.max(Ch4)])
+        self.Ch2.set_ylim([np.min(Ch2), np.max(Ch2)])
+        self.Ch3.set_ylim([np.min(Ch3), np.max(Ch3)])
 
         self.canvas.draw()
 
@@ -5,11 +5,14 @@ from tkinter import ttk
 
 import numpy as np
 from Experiments.batch_control import Batch
+from Experiments.acquisition import Acquisition
 
 
 class IV:
     """ Base class for IV experiments """
 
+    stream_period = 0.25    # Time (s) between reads of the points measured so far. None waits for the whole sweep
+
     def __init__(self, master, devman, in_batch=False):
 
         self.master = master
@@ -41,6 +44,8 @@ class IV:
         """ Safe closing of the devices. The devices must be closed by the Device Manager, not directly,
         so they are registered as "free".
         """
+        if self.acquisition is not None:
+            self.acquisition.close()
 
         if self.smu is not None:
             self.dm.close_device(self.smu)
@@ -51,6 +56,8 @@ class IV:
 
         # Data variables
         self.record = None
+        self.measured = None
+        self.acquisition = None
 
         # Hardware variables
         self.smu = None
@@ -297,7 +304,7 @@ class IV:
     def prepare_scan(self):
         """ Any scan is divided in three stages:
         1) Prepare the conditions of the scan (this function), getting starting point, integration time and creating all relevant variables.
-        2) Runing the scan, performed by a recursive function "get_next_datapoint"
+        2) Runing the scan, performed in a worker thread by "get_data"
         3) Finish the scan, where we update some variables and save the data.
 
         :return: None
@@ -335,26 +342,79 @@ class IV:
         self.record[:, 0] = np.linspace(0, 1, points+1)
         self.record[:, 1] = np.ones_like(self.record[:, 1])
         self.record[:, 2] = np.ones_like(self.record[:, 1])
+        self.measured = None
 
         self.master.prepare_meas(self.record)
         self.start_scan()
 
     def start_scan(self):
 
-        measTime = self.smu.measure(**self.options)
-        self.master.window.after(int(measTime), self.get_data)
+        self.acquisition = Acquisition(self.master.window, self.get_data, self.update_data, self.finish_scan, points=1)
+        self.acquisition.start()
+
+    def get_data(self, i):
+        """ Triggers the sweep and gets the data once it is finished. It runs in the acquisition worker. If the SMU can
+        give the points measured so far, they are plotted as they arrive and the sweep finishes as soon as the SMU has
+        all of them. Otherwise, we wait until the SMU tells the sweep is finished or, if it can not, the measuring time
+        it has estimated.
 
-    def get_data(self):
+        :param i: The index of the sweep, always 0
+        :return: A tuple with the voltage, the current and the number of points of the sweep
+        """
+        measTime = self.smu.measure(**self.options)
 
-        data0, data1 = self.smu.get_data()
+        if self.stream_period is None or not hasattr(self.smu, 'get_partial_data'):
+            if hasattr(self.smu, 'wait_for_completion'):
+                self.smu.wait_for_completion(stop=self.acquisition.stopped)
+            else:
+                self.acquisition.wait(measTime / 1000.)
+            voltage, current = self.smu.get_data()
+            return voltage, current, len(voltage)
+
+        measured = 0
+        while True:
+            voltage, current, finished = self.smu.get_partial_data()
+            if finished:
+                # The whole sweep is read again at the end, in binary if the SMU can, so no reading is lost to the text
+                voltage, current = self.smu.get_data()
+                return voltage, current, len(voltage)
+
+            if len(voltage) > measured:
+                measured = len(voltage)
+                self.acquisition.push((voltage, current, self.smu.points))
+
+            if self.acquisition.wait(self.stream_period):
+                return voltage, current, len(voltage)
+
+    def update_data(self, data):
+        """ Fills the record with the data of the sweep and updates the plot. The record has the length of the whole
+        sweep from the first points, with NaN in those not measured yet, so only the new points are written in the
+        journal. It is allocated again only if the sweep ends with a different number of points, eg. if it is stopped.
+
+        :param data: A list with tuples of voltage, current and number of points of the sweep, with the whole sweep or
+        the points measured so far
+        :return: None
+        """
+        voltage, current, total = data[-1]
+        count = len(voltage)
+
+        if self.measured is None or len(self.record) != max(total, count):
+            self.record = np.full((max(total, count), 3), np.nan)
+            self.measured = 0
+            new = None
+        elif count == total:
+            # The whole sweep, read at the end, replaces the points read while it went on
+            self.measured = 0
+            new = None
+        else:
+            new = slice(self.measured, count)
 
-        self.record = np.zeros((len(data0), 3))
-        self.record[:, 0] = data0
-        self.record[:, 1] = abs(data1)
-        self.record[:, 2] = data1
+        self.record[self.measured:count, 0] = voltage[self.measured:]
+        self.record[self.measured:count, 1] = abs(current[self.measured:])
+        self.record[self.measured:count, 2] = current[self.measured:]
+        self.measured = count
 
-        self.master.update_plot(self.record)
-        self.finish_scan()
+        self.master.update_plot(self.record, new=new)
 
     def finish_scan(self):
         """ Finish the scan, updating some global variables, saving the data in the temp file and offering to save the
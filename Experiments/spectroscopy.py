@@ -7,11 +7,15 @@ from tkinter import messagebox
 from tkinter import ttk
 
 from Experiments.batch_control import Batch
+from Experiments.acquisition import Acquisition, SpectrometerStream
+from Experiments.dwell import DwellPlanner
 
 
 class Spectroscopy:
     """ Base class for spectroscopy experiments """
 
+    buffer_period = 0.2     # Time (s) between reads of the internal buffer of the lock-in, in live mode
+
     def __init__(self, master, devman):
 
         self.master = master
@@ -42,6 +46,9 @@ class Spectroscopy:
         """ Safe closing of the devices. The devices must be closed by the Device Manager, not directly,
         so they are registered as "free".
         """
+        if self.acquisition is not None:
+            self.acquisition.close()
+        self.stop_stream()
 
         if self.monochromator is not None:
             self.dm.close_device(self.monochromator)
@@ -55,6 +62,10 @@ class Spectroscopy:
         # Data variables
         self.record = None
         self.background = None
+        self.acquisition = None
+        self.buffered = False
+        self.planner = None
+        self.stream = None
 
         # Hardware variables
         self.monochromator = None
@@ -106,6 +117,10 @@ class Spectroscopy:
                                               command=self.update_waiting_time)
         self.waiting_time_entry = ttk.Entry(master=set_frame, width=10)
         self.waiting_time_entry.insert(0, '100')
+        self.dwell_var = tk.IntVar(value=0)
+        self.check_var = tk.IntVar(value=0)
+        dwell_check = ttk.Checkbutton(master=set_frame, text='Wait for settling', variable=self.dwell_var)
+        check_check = ttk.Checkbutton(master=set_frame, text='Check settling', variable=self.check_var)
 
         set_frame.grid(column=0, row=1, sticky=(tk.EW))
         self.GoTo_button.grid(column=0, row=0, sticky=(tk.EW))
@@ -114,6 +129,8 @@ class Spectroscopy:
         self.integration_time_entry.grid(column=1, row=2, sticky=(tk.EW))
         self.waiting_time_button.grid(column=0, row=3, sticky=(tk.EW))
         self.waiting_time_entry.grid(column=1, row=3, sticky=(tk.EW))
+        dwell_check.grid(column=0, row=4, sticky=(tk.EW))
+        check_check.grid(column=1, row=4, sticky=(tk.EW))
 
         # Live adquisition widgets
         live_frame = ttk.Labelframe(self.spectroscopy_frame, text='Live:', padding=(0, 5, 0, 15))
@@ -263,9 +280,7 @@ class Spectroscopy:
         elif self.dm.current_config[dev_name]['Type'] == 'Spectrometer':
             self.move = self.null
             self.prepare_scan = self.prepare_scan_spectrometer
-            self.get_next_datapoint = self.mode_spectrometer
             self.start_live = self.prepare_live_spectrometer
-            self.live = self.live_spectrometer
             self.background_frame.grid(column=0, row=4, sticky=(tk.NSEW))
             self.window_live_lbl.grid_forget()
             self.window_live_entry.grid_forget()
@@ -277,9 +292,7 @@ class Spectroscopy:
         elif self.dm.current_config[dev_name]['Type'] in ['Lock-In', 'Multimeter']:
             self.move = self.monochromator.move
             self.prepare_scan = self.prepare_scan_lockin
-            self.get_next_datapoint = self.mode_lockin
             self.start_live = self.prepare_live_lockin
-            self.live = self.live_lockin
             self.background_frame.grid_forget()
             self.window_live_lbl.grid(column=0, row=0, sticky=(tk.EW))
             self.window_live_entry.grid(column=1, row=0, columnspan=2, sticky=(tk.EW))
@@ -313,27 +326,26 @@ class Spectroscopy:
         if self.stop:
             self.prepare_scan()
         else:
+            # The scan is finished once the acquisition worker has stopped
             self.stop = True
-            self.finish_scan()
+            self.acquisition.stop()
 
     def pause_scan(self):
         """ Pauses an scan or resumes the adquisition
 
         :return: None
         """
-        self.stop = not self.stop
-
-        if self.stop:
-            self.pause_button['text'] = 'Resume'
-        else:
+        if self.acquisition.paused:
+            self.acquisition.resume()
             self.pause_button['text'] = 'Pause'
-
-        self.get_next_datapoint()
+        else:
+            self.acquisition.pause()
+            self.pause_button['text'] = 'Resume'
 
     def prepare_scan_lockin(self):
         """ Any scan is divided in three stages:
         1) Prepare the conditions of the scan (this function), getting starting point, integration time and creating all relevant variables.
-        2) Runing the scan, performed by a recursive function  "mode_spectrometer" or "mode_lockin"
+        2) Runing the scan, performed in a worker thread by "mode_spectrometer" or "mode_lockin"
         3) Finish the scan, where we update some variables and save the data.
 
         :return: None
@@ -367,33 +379,58 @@ class Spectroscopy:
 
         self.scan_running()
 
-        self.mode_lockin()
+        # The dwell time after each move is either fixed or planned from the settling of the lock-in
+        period = (self.integration_time + self.waiting_time) / 1000.
+        if self.dwell_var.get():
+            self.planner = DwellPlanner.from_lockin(self.adquisition, self.integration_time,
+                                                    check=bool(self.check_var.get()), fixed=period)
+            period = None
+        else:
+            self.planner = None
 
-    def mode_lockin(self):
-        """ Gets the next data point in a scan. This function depends on the adquisition device
+        self.acquisition = Acquisition(self.master.window, self.mode_lockin, self.update_lockin, self.finish_scan,
+                                       points=self.num, period=period)
+        self.acquisition.start()
 
-        :return: None
+    def mode_lockin(self, i):
+        """ Gets the next data point in a scan. This function depends on the adquisition device and runs in the
+        acquisition worker.
+
+        :param i: The index of the data point
+        :return: A tuple with the index and the measured data
         """
+        if self.planner is None:
+            # The points start at a fixed period, so the time spent moving and measuring is part of it
+            self.acquisition.wait_next()
+
+        if i > 0:
+            self.move(self.record[i, 0], speed='Fast')
+
+        if self.planner is not None:
+            return i, self.planner.measure(self.adquisition.measure, self.acquisition.wait)
 
-        if not self.stop:
-            data = self.adquisition.measure()
-            self.record[self.i, 1] = data[0]
-            self.record[self.i, 2] = data[1]
+        # However long the move was, the lock-in needs the waiting time to settle
+        self.acquisition.wait(self.waiting_time / 1000.)
 
-            self.master.update_plot(self.record)
+        return i, self.adquisition.measure()
 
-            if self.i < self.num - 1:
-                self.i += 1
-                self.move(self.record[self.i, 0], speed='Fast')
-                self.master.window.after(int(self.integration_time + self.waiting_time), self.mode_lockin)
+    def update_lockin(self, data):
+        """ Adds the new data points to the record and updates the plot.
 
-            else:
-                self.finish_scan()
+        :param data: A list of tuples with the index and the measured data of each new point
+        :return: None
+        """
+        for i, point in data:
+            self.record[i, 1] = point[0]
+            self.record[i, 2] = point[1]
+
+        self.i = data[-1][0]
+        self.master.update_plot(self.record, new=slice(data[0][0], self.i + 1))
 
     def prepare_scan_spectrometer(self):
         """ Any scan is divided in three stages:
         1) Prepare the conditions of the scan (this function), getting starting point, integration time and creating all relevant variables.
-        2) Runing the scan, performed by a recursive function "mode_spectrometer" or "mode_lockin"
+        2) Runing the scan, performed in a worker thread by "mode_spectrometer" or "mode_lockin"
         3) Finish the scan, where we update some variables and save the data.
 
         :return: None
@@ -421,7 +458,10 @@ class Spectroscopy:
         # Get the scan conditions
         self.start_wl = max(float(self.Start_entry.get()), 300)
         self.stop_wl = max(min(float(self.Stop_entry.get()), 2000), self.start_wl + 1)
-        wl = self.adquisition.measure()[0]
+        if hasattr(self.adquisition, 'wavelengths'):
+            wl = self.adquisition.wavelengths()
+        else:
+            wl = self.adquisition.measure()[0]
         self.idx = np.where((self.start_wl <= wl) & (wl <= self.stop_wl))
         self.size = len(self.idx[0])
 
@@ -436,27 +476,44 @@ class Spectroscopy:
 
         self.scan_running()
 
-        self.mode_spectrometer()
+        # The spectrometer measures back to back in its own thread, and every spectrum is averaged
+        self.stream = SpectrometerStream(self.adquisition, every=True)
+        self.stream.start()
 
-    def mode_spectrometer(self):
-        """ Gets the whole spectrum at once recorded by the spectrometer in the range selected
+        self.acquisition = Acquisition(self.master.window, self.mode_spectrometer, self.update_spectrometer,
+                                       self.finish_scan, points=self.num)
+        self.acquisition.start()
 
+    def mode_spectrometer(self, i):
+        """ Gets the next spectrum recorded by the spectrometer. It runs in the acquisition worker.
+
+        :param i: The index of the spectrum
+        :return: The measured intensity
+        """
+        while True:
+            spectrum = self.stream.get(timeout=0.1)
+            if spectrum is not None and i == self.num - 1:
+                # That is the last spectrum of the scan, so the spectrometer can stop integrating. We don't wait for it
+                # here: the stream is stopped again, waiting, when the scan is finished
+                self.stream.stop(timeout=0)
+            if spectrum is not None or self.acquisition.stopped.is_set():
+                return spectrum
+
+            if self.stream.stopped.is_set():
+                raise RuntimeError('The spectrometer has stopped: {0}'.format(self.stream.error))
+
+    def update_spectrometer(self, data):
+        """ Averages the new spectra, in the range selected, with the previous ones and updates the plot.
+
+        :param data: A list with the new spectra
         :return: None
         """
-
-        if not self.stop:
-            data = self.adquisition.measure()
-            intensity = data[1][self.idx] - self.background[self.idx]
+        for spectrum in data:
+            intensity = spectrum[self.idx] - self.background[self.idx]
             self.record[:, 1] = (intensity + self.i * self.record[:, 1]) / (self.i + 1.)
+            self.i = self.i + 1
 
-            self.master.update_plot(self.record)
-
-            if self.i < self.num - 1:
-                self.i = self.i + 1
-                self.master.window.after(int(self.integration_time / self.num), self.mode_spectrometer)
-
-            else:
-                self.finish_scan()
+        self.master.update_plot(self.record)
 
     def finish_scan(self):
         """ Finish the scan, updating some global variables, saving the data in the temp file and offering to save the
@@ -465,6 +522,12 @@ class Spectroscopy:
         :return: None
         """
 
+        self.stop_stream()
+
+        if self.planner is not None:
+            print(self.planner.report())
+            self.planner = None
+
         if self.batch.ready:
             self.master.finish_meas(self.record, finish=False)
             self.batch.batch_wrapup(self.record)
@@ -551,19 +614,19 @@ class Spectroscopy:
             self.background_button['state'] = 'enabled'
             self.clear_background_button['state'] = 'enabled'
             self.stop = True
-            self.finish_live()
+
+            # The live recording is finished once the acquisition worker has stopped
+            self.acquisition.stop()
 
     def pause_live(self):
         """ Pauses a live recording or resumes the adquisition
         """
-        self.stop = not self.stop
-
-        if self.stop:
-            self.pause_live_button['text'] = 'Resume'
-        else:
+        if self.acquisition.paused:
+            self.acquisition.resume()
             self.pause_live_button['text'] = 'Pause'
-
-        self.live()
+        else:
+            self.acquisition.pause()
+            self.pause_live_button['text'] = 'Resume'
 
     def prepare_live_lockin(self):
         """ Prepares the lock-in live adquisition and prepare some variables
@@ -578,22 +641,49 @@ class Spectroscopy:
 
         # Removes all plots, but not the data, and change the horizontal axis conditions
         self.master.clear_plot(xtitle='Time', ticks='off')
-        self.master.prepare_meas(self.live_data)
+        self.master.prepare_meas(self.live_data, journal=False)
+
+        # If the lock-in has internal buffers, it takes the samples by itself, one per integration time, and we just
+        # read them from time to time
+        self.buffered = hasattr(self.adquisition, 'start_buffer')
+        if self.buffered:
+            period = max(self.integration_time / 1000., self.buffer_period)
+            self.adquisition.start_buffer(1000. / self.integration_time)
+        else:
+            period = self.integration_time / 1000.
 
-        self.live_lockin()
+        self.acquisition = Acquisition(self.master.window, self.live_lockin, self.update_live_lockin, self.finish_live,
+                                       period=period)
+        self.acquisition.start()
 
-    def live_lockin(self):
-        """ Runs the live lock-in adquisition
+    def live_lockin(self, i):
+        """ Runs the live lock-in adquisition. It runs in the acquisition worker.
+
+        :param i: The index of the data point
+        :return: The measured data, one point or, if the lock-in is buffered, all the points stored since the last read
         """
-        if not self.stop:
-            self.live_data[:-1, 1] = self.live_data[1:, 1]
-            self.live_data[:-1, 2] = self.live_data[1:, 2]
+        self.acquisition.wait_next()
+
+        if self.buffered:
+            return self.adquisition.read_buffer()
+
+        return self.adquisition.measure()
 
-            self.live_data[-1, 1], self.live_data[-1, 2] = self.adquisition.measure()
+    def update_live_lockin(self, data):
+        """ Adds the new data points at the end of the live window and updates the plot.
+
+        :param data: A list with the measured data of each step, one point or several of them
+        :return: None
+        """
+        data = np.concatenate([np.reshape(np.asarray(d, dtype=float), (-1, 2)) for d in data])
+        n = min(len(data), self.window_points)
+        if n == 0:
+            return
 
-            self.master.update_plot(self.live_data)
+        self.live_data[:-n, 1:] = self.live_data[n:, 1:]
+        self.live_data[-n:, 1:] = data[-n:]
 
-            self.master.window.after(self.integration_time, self.live_lockin)
+        self.master.update_plot(self.live_data)
 
     def prepare_live_spectrometer(self):
         """ Prepares the spectrometer live adquisition and prepare some variables
@@ -612,26 +702,61 @@ class Spectroscopy:
 
         # Removes all plots, but not the data, and change the horizontal axis conditions
         self.master.clear_plot(xtitle='Wavelength (nm)', ticks='on')
-        self.master.prepare_meas(self.live_data)
+        self.master.prepare_meas(self.live_data, journal=False)
 
-        self.live_spectrometer()
+        # The spectrometer measures back to back in its own thread, and we just plot the latest spectrum
+        self.stream = SpectrometerStream(self.adquisition)
+        self.stream.start()
+        self.frame = 0
 
-    def live_spectrometer(self):
-        """ Runs the live spectrometer adquisition
+        self.acquisition = Acquisition(self.master.window, self.live_spectrometer, self.update_live_spectrometer,
+                                       self.finish_live)
+        self.acquisition.start()
+
+    def live_spectrometer(self, i):
+        """ Runs the live spectrometer adquisition. It runs in the acquisition worker.
+
+        :param i: The index of the spectrum
+        :return: The latest intensity measured
         """
-        if not self.stop:
-            data0, data1 = self.adquisition.measure()
-            self.live_data[:, 1] = data1
+        while True:
+            self.frame, spectrum = self.stream.latest(after=self.frame, timeout=0.1)
+            if spectrum is not None or self.acquisition.stopped.is_set():
+                return spectrum
+
+            if self.stream.stopped.is_set():
+                raise RuntimeError('The spectrometer has stopped: {0}'.format(self.stream.error))
 
-            self.master.update_plot(self.live_data)
+    def update_live_spectrometer(self, data):
+        """ Updates the plot with the most recent spectrum
+
+        :param data: A list with the new spectra
+        :return: None
+        """
+        self.live_data[:, 1] = data[-1]
 
-            self.master.window.after(self.integration_time, self.live_spectrometer)
+        self.master.update_plot(self.live_data)
 
     def finish_live(self):
         """ Finish the live adquisition, returning the front end to the scan mode
         """
+        self.stop_stream()
+
+        if self.buffered:
+            self.adquisition.stop_buffer()
+            self.buffered = False
+
         self.master.replot_data(xtitle='Wavelength (nm)', ticks='on')
 
+    def stop_stream(self):
+        """ Stops the spectrometer measuring in the background, if it is
+
+        :return: None
+        """
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+
     def update_integration_time(self):
         """ Updates the integration time
         """
@@ -15,9 +15,12 @@ import tkinter as tk
 import time
 import sys
 import os
+import queue
 
 import numpy as np
 
+from Experiments.acquisition import Acquisition
+
 # Class definition
 class Temperature(object):
     """ Some text
@@ -31,6 +34,8 @@ class Temperature(object):
         self.create_interface()
 
         self.recording = False
+        self.acquisition = None
+        self.requests = queue.Queue()
         self.heater_on = False
         self.ramp = 300
 
@@ -38,6 +43,9 @@ class Temperature(object):
         self.fill_devices()
 
     def _quit(self):
+        if self.acquisition is not None:
+            self.acquisition.close()
+
         self.dm.close_device(self.control)
         self.window.destroy()
         self.splash.show(minus_experiment=True)
@@ -46,54 +54,113 @@ class Temperature(object):
 
         if not self.recording:
             self.recording = True
-            self.record()
+
+            if self.temperature_array[0] == 0:
+                self.update_refresh_time()
+
+            # The controller can not be changed while the worker is using it
+            self.control_box['state'] = 'disabled'
+
+            self.acquisition = Acquisition(self.window, self.record, self.update_record, self.finish_recording,
+                                           period=self.refresh_time / 1000.)
+            self.acquisition.start()
         else:
             self.recording = False
+            self.acquisition.stop()
+
+    def finish_recording(self):
+        """ Once the worker has stopped, runs any request left and lets the controller be changed again
+
+        :return: None
+        """
+        self.run_requests()
+        self.control_box['state'] = 'readonly'
+
+    def request(self, func, *args):
+        """ Runs a function that talks to the controller. While recording, the controller is only used by the
+        acquisition worker, so the function is queued and run by the worker before its next reading.
+
+        :param func: The function, eg. self.control.setHeater
+        :param args: The arguments of the function
+        :return: None
+        """
+        if self.acquisition is not None and self.acquisition.is_alive():
+            self.requests.put((func, args))
+        else:
+            func(*args)
+
+    def run_requests(self):
+        """ Runs the requests queued for the controller
+
+        :return: None
+        """
+        while True:
+            try:
+                func, args = self.requests.get_nowait()
+            except queue.Empty:
+                return
+
+            func(*args)
 
     def enable_heater(self):
 
         if not self.heater_on:
             self.heater_on = True
             self.heater_var.set('Disable heater')
-            self.control.setHeater('ON')
+            self.request(self.control.setHeater, 'ON')
         else:
             self.heater_on = False
             self.heater_var.set('Enable heater')
-            self.control.setHeater('OFF')
+            self.request(self.control.setHeater, 'OFF')
 
-    def record(self):
+    def record(self, i):
+        """ Reads the temperature and, if we are in a ramp, updates the setpoint. It runs in the acquisition worker.
 
-        # At the begining, we update the first elements of the arrays
-        if self.temperature_array[0] == 0:
-            self.time_array = [datetime.datetime.now()]
-            self.setpoint_array = [self.control.getSP()]
-            self.temperature_array = [self.control.getTemp()]
-            # self.setpoint_var.set(self.control.setPoint)
-            # self.setpoint = self.control.setPoint
-            # self.updateSetpoint()
-            self.update_refresh_time()
-            time.sleep(1)
+        :param i: The index of the reading
+        :return: A tuple with the time, temperature, setpoint, time left in the ramp (None if not in a ramp) and new
+        setpoint
+        """
+        self.acquisition.wait_next()
+        self.run_requests()
 
+        now = datetime.datetime.now()
         newT = self.control.getTemp()
         newSP = self.control.setPoint
-        self.temp_var.set('{0:.2f}'.format(newT))
-
-        self.time_array.append(datetime.datetime.now())
-        self.setpoint_array.append(newSP)
-        self.temperature_array.append(newT)
+        countdown = None
 
         # if we are in a ramp, we update the setpoint
         if abs(self.setpoint-newSP) > 0:
-            delta = self.time_array[-1] - self.time_ini
-            newSP = self.temp_ini + self.ramp*min(delta.seconds, self.time_to_SP)
-            self.countdown_var.set('{0:.2f}'.format(self.time_to_SP-delta.seconds))
-            self.control.setSP(newSP)
-            self.current_setpoint_var.set('{0:.2f}'.format(self.control.setPoint))
+            delta = now - self.time_ini
+            countdown = self.time_to_SP-delta.seconds
+            self.control.setSP(self.temp_ini + self.ramp*min(delta.seconds, self.time_to_SP))
 
-        self.update_plot(self.time_array, self.setpoint_array, self.temperature_array)
+        return now, newT, newSP, countdown, self.control.setPoint
 
-        if self.recording:
-            self.window.after(self.refresh_time, self.record)
+    def update_record(self, data):
+        """ Adds the new readings to the record and updates the plot
+
+        :param data: A list with the new readings
+        :return: None
+        """
+        for now, newT, newSP, countdown, current_SP in data:
+            # At the begining, we update the first elements of the arrays
+            if self.temperature_array[0] == 0:
+                self.time_array = []
+                self.setpoint_array = []
+                self.temperature_array = []
+
+            self.time_array.append(now)
+            self.setpoint_array.append(newSP)
+            self.temperature_array.append(newT)
+
+            self.temp_var.set('{0:.2f}'.format(newT))
+            if countdown is not None:
+                self.countdown_var.set('{0:.2f}'.format(countdown))
+                self.current_setpoint_var.set('{0:.2f}'.format(current_SP))
+
+        # We need at least two points to set the limits of the plot
+        if len(self.time_array) > 1:
+            self.update_plot(self.time_array, self.setpoint_array, self.temperature_array)
 
     def update_plot(self, x, y1, y2):
 
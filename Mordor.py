@@ -3,15 +3,10 @@ __version__= '2.0_beta_4'
 __email__ = 'd.alonso-alvarez@imperial.ac.uk'
 __contributors__ = ['Markus Furher', 'Ture Hinrichsen', 'Jose Videira', 'Tomos Thomas', 'Thomas Wilson', 'Andrew M. Telford']
 
-import matplotlib
-matplotlib.use('TkAgg')
-
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
-from matplotlib import gridspec
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 import os
+import importlib
 from datetime import datetime
 
 import tkinter as tk
@@ -21,9 +16,20 @@ from tkinter import font
 
 import plot_utils as pu
 import tools
-from Experiments import Spectroscopy, IV, Temperature, Flash, CV
+from journal import Journal, JournalIndex
+from data_store import MeasurementStore
 from Devices import device_manager
 
+def load_matplotlib():
+    """ Imports matplotlib with the TkAgg backend. This is slow, so it is not done until a plot is needed or the splash
+    window is already shown.
+
+    :return: None
+    """
+    import matplotlib
+    matplotlib.use('TkAgg')
+
+
 class Mordor(object):
     """ This class is the core of Mordor. It controls the ploting and saving of the data in the different experiments
     as well as ensuring that there is a safe *close* and *opening* of the program
@@ -62,15 +68,17 @@ class Mordor(object):
         Only the data associated with this type of experiment (iv, spectroscopy, etc) are deleted.
         """
         q_exit = True
-        if len(self.all_data_names) > 0:
+        if len(self.all_data) > 0:
             q_exit = messagebox.askyesno(message='Do you really want to leave Mordor?\nAll your unsaved efforts will be lost!!', icon='question', title='Exit?')
 
         if q_exit:
 
-            for f in os.listdir(self.tempdata):
-                name = f.split('.')[0]
-                if self.experiment.id in name:
-                    os.remove(os.path.join(self.tempdata, f))
+            # The data might be memory mapped, so we release it before removing the files
+            self.all_data.clear()
+            self.selected_meas = None
+            self.clear_plot()
+
+            self.remove_tempdata()
 
             self.experiment.quit()
             self.window.destroy()
@@ -83,6 +91,7 @@ class Mordor(object):
         # Define the home folders of the application
         self.home = os.path.join(os.path.expanduser("~"), '.Mordor', '')
         self.tempdata = os.path.join(self.home, 'tempdata', '')
+        self.index = JournalIndex(self.tempdata)
         self.savedir = os.path.expanduser("~")
 
         # Add internal folders to path
@@ -90,10 +99,15 @@ class Mordor(object):
         experiments = os.path.join(sys.path[0], 'Experiments')
         sys.path.append([devices, experiments])
 
-        # Data variables
-        self.all_data = []
-        self.all_data_names = []
+        # Data variables. Only the most recent measurements are kept in memory, the rest stay in the tempdata folder
+        self.all_data = MeasurementStore(self.index, on_evict=self.on_evict)
         self.selected_meas = None
+        self.journal = None
+
+        # The lines of the plots of each measurement, by name, and those of the measurement running. Live modes and
+        # clearing the plots leave measurements without lines
+        self.plot_lines = {}
+        self.meas_lines = None
 
     def check_home(self):
         """ Check the application home folder, creating it if doesn't exist and checking if there is data from a previous session.
@@ -109,32 +123,45 @@ class Mordor(object):
             q_recover = messagebox.askyesno(message='Last session was not closed properly.', detail=' Do you want to recover the data?', icon='question', title='Recover?')
 
             if q_recover:
-                # We load the data
+                # We load the data. Only the index is read: the data is memory mapped and read when it is used
                 try:
-                    for f in os.listdir(self.tempdata):
-                        name = f.split('.')[0]
-                        if self.experiment.id in name:
-                            self.all_data_names.append(f.split('.')[0])
-                            data = np.loadtxt(os.path.join(self.tempdata, f))
-                            self.all_data.append(data)
-
-                    for name in self.all_data_names:
+                    self.index.scan(self.experiment.id)
+
+                    for name, entry in self.index.entries(self.experiment.id):
+                        # Measurements that were interrupted are recovered up to the last point measured
+                        if entry['Partial']:
+                            name = name + ' (partial)'
+
+                        self.all_data.add(name, entry)
+
+                    for name in self.all_data.names:
                         self.data_list.insert(tk.END, name)
 
-                    if len(self.all_data_names) > 0:
+                    if len(self.all_data) > 0:
                         self.replot_data()
 
                 except Exception as err:
                     print('ERROR: The backup data could not be restored.')
 
             else:
-                for f in os.listdir(self.tempdata):
-                    name = f.split('.')[0]
-                    if self.experiment.id in name:
-                        os.remove(os.path.join(self.tempdata, f))
+                self.remove_tempdata()
         else:
             pass
 
+    def remove_tempdata(self):
+        """ Removes the data associated with this type of experiment from the tempdata folder and the index.
+
+        :return: None
+        """
+        names = []
+        for f in os.listdir(self.tempdata):
+            name = f.split('.')[0]
+            if self.experiment.id in name:
+                os.remove(os.path.join(self.tempdata, f))
+                names.append(name)
+
+        self.index.remove(names)
+
     def create_menu_bar(self):
         """ Creates the menu bar and the elements within
         """
@@ -193,6 +220,11 @@ class Mordor(object):
     def create_plot_area(self, plot_format):
         """ Creates the plotting area. Its look and feel depends on the experiment.
         """
+        load_matplotlib()
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
+        from matplotlib import gridspec
+        import matplotlib.pyplot as plt
+
         ratios = plot_format['ratios']
 
         self.fig = plt.figure(figsize=(9, 8), dpi=72)
@@ -217,6 +249,9 @@ class Mordor(object):
         self.canvas.get_tk_widget().pack()
         self.canvas.show()
 
+        # The blitter takes care of redrawing only the traces that are being measured
+        self.blitter = pu.Blitter(self.canvas)
+
         toolbar = NavigationToolbar2TkAgg(self.canvas, self.plot_frame)
         toolbar.update()
         self.canvas._tkcanvas.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
@@ -255,6 +290,10 @@ class Mordor(object):
         clear_sel_button.grid(column=0, row=2, sticky=(tk.EW, tk.S))
         clear_button.grid(column=0, row=3, sticky=(tk.EW, tk.S))
 
+        self.memory_var = tk.StringVar()
+        ttk.Label(master=plot_manage_frame, textvariable=self.memory_var).grid(column=0, row=4, sticky=(tk.EW, tk.S))
+        self.update_memory()
+
 
     def clearAxis(self):
         """ Delete any previous measurements from the plots and variables. The data is not removed from the temp folder.
@@ -263,6 +302,7 @@ class Mordor(object):
         """
 
         # Removes all previous plots
+        self.blitter.release()
         n = len(self.Ch1.lines)
         for i in range(n):
             self.Ch1.lines.remove(self.Ch1.lines[0])
@@ -270,26 +310,44 @@ class Mordor(object):
 
         self.canvas.draw()
 
-        self.all_data = []
-        self.all_data_names = []
+        self.all_data.clear()
+        self.plot_lines.clear()
         self.selected_meas = None
+        self.update_memory()
 
         if n > 0:
             self.data_list.delete(0, last=tk.END)
             
 
-    def prepare_meas(self, initial_data):
+    def prepare_meas(self, initial_data, journal=True):
+        """ Prepares the plots for a new measurement and, if requested, opens a journal to keep the data in the disk while
+        the measurement is running.
+
+        :param initial_data: The initial record array of the measurement
+        :param journal: If the data must be journaled. Live modes, which are not saved, should not use it. Default=True
+        :return: None
+        """
+        # A measurement that was never finished keeps its partial journal in the tempdata folder
+        self.journal = None
+        if journal:
+            self.journal = Journal(self.tempdata, self.new_meas_name(), initial_data.shape, index=self.index,
+                                   experiment=self.experiment.id)
 
         # Set the color of any previous plot to black
         n = len(self.Ch1.lines)
         for i in range(n):
-            plt.setp(self.Ch1.lines[i], color='k')
-            plt.setp(self.Ch2.lines[i], color='k')
+            self.Ch1.lines[i].set(color='k')
+            self.Ch2.lines[i].set(color='k')
         
-        self.Ch1.plot(initial_data[:, 0], initial_data[:, 1]+1, 'r')
-        self.Ch2.plot(initial_data[:, 0], initial_data[:, 2]+1, 'r')
+        pu.plot(self.Ch1, initial_data[:, 0], initial_data[:, 1]+1, 'r')
+        pu.plot(self.Ch2, initial_data[:, 0], initial_data[:, 2]+1, 'r')
         # We are reading both channels simultaneously            
 
+        # Only the new traces will be redrawn during the measurement
+        self.meas_lines = (self.Ch1.lines[-1], self.Ch2.lines[-1])
+        self.blitter.reset_counter()
+        self.blitter.animate(self.meas_lines)
+
 
     def finish_meas(self, data, finish):
         """ Finish the measurement, updating some global variables, saving the data in the temp file and offering
@@ -297,23 +355,75 @@ class Mordor(object):
         """
         print('Finish!\n\a')        # Adds a 'beep' to the end of the meas
 
-        self.all_data.append(data)
-        self.all_data_names.append(self.experiment.id + '_' + datetime.now().strftime('%Y-%m-%d %H-%M-%S'))
-        self.selected_meas = self.all_data[-1]
+        if self.blitter.frames > 0:
+            print('Plot refresh rate: {0:.1f} fps ({1} frames, {2} full redraws)'.format(self.blitter.fps(),
+                                                                                       self.blitter.frames,
+                                                                                       self.blitter.full_redraws))
+
+        # The finished traces become part of the static background
+        self.blitter.animate()
+
+        # The journal becomes the temp file of the finished measurement
+        if self.journal is None:
+            self.journal = Journal(self.tempdata, self.new_meas_name(), data.shape, index=self.index,
+                                   experiment=self.experiment.id)
+        self.journal.close(data)
+
+        if self.meas_lines is not None:
+            self.plot_lines[self.journal.name] = self.meas_lines
+            self.meas_lines = None
 
-        np.savetxt(self.tempdata + self.all_data_names[-1] + '.txt', self.selected_meas)
-        self.data_list.insert(tk.END, self.all_data_names[-1])
+        self.all_data.add(self.journal.name, self.journal.entry(), data)
+        self.selected_meas = data
+        self.journal = None
+
+        self.data_list.insert(tk.END, self.all_data.names[-1])
+        self.update_memory()
 
         if finish:
             self.save_scan()
 
-    def update_plot(self, data):
-        """ Updates the plots with new data """
+    def new_meas_name(self):
+        """ Creates a unique name for a new measurement, based on the experiment id and the current time
+
+        :return: The name of the measurement
+        """
+        name = self.experiment.id + '_' + datetime.now().strftime('%Y-%m-%d %H-%M-%S')
 
-        pu.update(self.Ch1, data[:, 1], data[:, 0])
-        pu.update(self.Ch2, data[:, 2], data[:, 0])
+        # Several measurements can be started within the same second in batch mode
+        existing = [f.split('.')[0] for f in os.listdir(self.tempdata)]
+        unique = name
+        i = 1
+        while unique in existing:
+            unique = '{0}_{1}'.format(name, i)
+            i += 1
 
-        self.canvas.draw()
+        return unique
+
+    def update_plot(self, data, new=None):
+        """ Saves the new data in the journal of the measurement, if any, and updates the plots. Only the active traces are
+        redrawn, unless the limits of the axes change, in which case the whole canvas needs to be redrawn.
+
+        :param data: The data to plot. Column 0 is the x-data and columns 1 and 2 the y-data of Ch1 and Ch2
+        :param new: Index or slice of the rows that have changed since the last update. Default=None (all rows)
+        :return: None
+        """
+        if self.journal is not None:
+            self.journal.write(data, new)
+
+        bounds = self.get_bounds()
+
+        pu.update(self.Ch1, data[:, 1], data[:, 0], new=new)
+        pu.update(self.Ch2, data[:, 2], data[:, 0], new=new)
+
+        self.blitter.update(full=(self.get_bounds() != bounds))
+
+    def get_bounds(self):
+        """ Gets the current limits of the axes of both plots
+
+        :return: A tuple with the x and y bounds of Ch1 and Ch2
+        """
+        return self.Ch1.get_xbound(), self.Ch1.get_ybound(), self.Ch2.get_xbound(), self.Ch2.get_ybound()
         
     def update_plot_axis(self, plot_format): ## When Y labels are changed
         pu.update_labels(self.Ch1, plot_format['xlabel'], plot_format['Ch1_ylabel'])
@@ -328,16 +438,23 @@ class Mordor(object):
     def clear_plot(self, xtitle='X axis', ticks='on'):
         """ Removes all data from the plots, but it is not deleted from the memory, so it can be recovered """
 
+        self.blitter.release()
         pu.clear(self.Ch1, xtitle=xtitle, xticks=ticks)
         pu.clear(self.Ch2, xtitle=xtitle, xticks=ticks)
+        self.plot_lines.clear()
+        self.meas_lines = None
 
     def replot_data(self, xtitle='X axis', ticks='on'):
         """ Re-plots all data from the memory """
 
         self.clear_plot(xtitle=xtitle, ticks=ticks)
 
-        pu.plot_all(self.Ch1, self.all_data, idx=(0, 1), color='k')
-        pu.plot_all(self.Ch2, self.all_data, idx=(0, 2), color='k')
+        # The measurements that are not in memory are plotted directly from the disk
+        data = self.all_data.arrays()
+        pu.plot_all(self.Ch1, data, idx=(0, 1), color='k')
+        pu.plot_all(self.Ch2, data, idx=(0, 2), color='k')
+        for name, line1, line2 in zip(self.all_data.names, self.Ch1.lines, self.Ch2.lines):
+            self.plot_lines[name] = (line1, line2)
 
         self.data_list.selection_clear(0, 'end')
         self.data_list.selection_set('end')
@@ -362,14 +479,19 @@ class Mordor(object):
         j = int(self.data_list.curselection()[0])
         self.selected_meas = self.all_data[j]
 
+        # The selected measurement is kept in memory while it is selected
+        self.all_data.unpin()
+        self.all_data.pin(j)
+        self.update_memory()
+
         # Set the color of any previous plot to black
         n = len(self.Ch1.lines)
         for i in range(n):
-            plt.setp(self.Ch1.lines[i], color='k')
-            plt.setp(self.Ch2.lines[i], color='k')
+            self.Ch1.lines[i].set(color='k')
+            self.Ch2.lines[i].set(color='k')
 
-        plt.setp(self.Ch1.lines[j], color='r', zorder=1000)
-        plt.setp(self.Ch2.lines[j], color='r', zorder=1000)
+        for line in self.visible_lines(j):
+            line.set(color='r', zorder=1000)
 
         self.canvas.draw()
 
@@ -377,14 +499,47 @@ class Mordor(object):
         j = int(self.data_list.curselection()[0])        
         if j != None:
             # Removes selected plot
-            self.Ch1.lines.remove(self.Ch1.lines[j])
-            self.Ch2.lines.remove(self.Ch2.lines[j])
+            self.blitter.release()
+            for line in self.visible_lines(j):
+                line.remove()
             self.canvas.draw()
 
-            del self.all_data[j]
-            del self.all_data_names[j]
+            self.plot_lines.pop(self.all_data.names[j], None)
+            self.all_data.remove(j)
             self.selected_meas = None
             self.data_list.delete(j)
+            self.update_memory()
+
+    def on_evict(self, i, data):
+        """ Called when a measurement is evicted from memory. The plots of the measurement are pointed to the data in the
+        disk, so the memory can be released.
+
+        :param i: The position of the measurement
+        :param data: The data of the measurement, memory mapped from the disk
+        :return: None
+        """
+        for line, idx in zip(self.visible_lines(i), (1, 2)):
+            pu.get_decimator(line.axes).set_source(line, data[:, 0], data[:, idx])
+
+    def visible_lines(self, i):
+        """ Gets the lines of the plots of a measurement, if they are still in the plots
+
+        :param i: The position of the measurement
+        :return: A list with the lines in Ch1 and Ch2, or an empty list if the measurement is not plotted
+        """
+        lines = self.plot_lines.get(self.all_data.names[i], ())
+        if len(lines) == 2 and lines[0] in self.Ch1.lines and lines[1] in self.Ch2.lines:
+            return list(lines)
+
+        return []
+
+    def update_memory(self):
+        """ Updates the label showing the memory used by the measurements
+
+        :return: None
+        """
+        self.memory_var.set('In memory: {0}/{1} ({2:.1f} MB)'.format(self.all_data.in_memory(), len(self.all_data),
+                                                                     self.all_data.nbytes / 1e6))
             
 class Save(object):
     """ Class for saving data in a formatted way
@@ -492,9 +647,16 @@ class Splash:
     a consisten access to the hardware. It is also a nice splash screen :) .
     """
 
-    def __init__(self):
-        """ Constructor of the class.
+    # Modules imported in the background once the splash is shown, so the experiments open quickly when selected
+    preload_modules = ['matplotlib.pyplot', 'Experiments.spectroscopy', 'Experiments.iv', 'Experiments.cv',
+                       'Experiments.temperature', 'Experiments.flash']
+
+    def __init__(self, mainloop=True, preload=True):
+        """ Constructor of the class. The experiments are imported only when they are selected, so the splash is shown
+        as soon as possible.
 
+        :param mainloop: If the main loop must be started. Default=True
+        :param preload: If the experiments must be imported once the splash is shown. Default=True
         :return: None
         """
 
@@ -550,9 +712,32 @@ class Splash:
         photoHelp = tk.PhotoImage(file=os.path.join('Graphics', 'help.gif'))
         tk.Button(smallbuttons, image=photoHelp, command=self.open_documentation, width=24, height=24, ).grid(column=1, row=0, sticky=tk.SE)
 
-        # Finally, we center the window and initiate the main loop.
+        # Finally, we center the window, schedule the import of the experiments and initiate the main loop.
         tools.center(self.splashroot)
-        self.splashroot.mainloop()
+        self.pending = list(self.preload_modules) if preload else []
+        self.splashroot.after(200, self.preload)
+
+        if mainloop:
+            self.splashroot.mainloop()
+
+    def preload(self):
+        """ Imports the next pending module, and schedules the following one. Modules are imported one at a time, so
+        the splash keeps responding between them.
+
+        :return: None
+        """
+        if len(self.pending) == 0:
+            return
+
+        module = self.pending.pop(0)
+        try:
+            if module.startswith('matplotlib'):
+                load_matplotlib()
+            importlib.import_module(module)
+        except Exception as err:
+            print('WARNING: {0}\t{1} could not be preloaded.'.format(err, module))
+
+        self.splashroot.after(10, self.preload)
 
     def check_home(self):
         """ Check the application home folder, creating it if doesn't exist and checking if there is data from a previous session.
@@ -588,6 +773,7 @@ class Splash:
         if self.experiments < 1:
                 # for i in range(len(self.runing)):
                 #     self.runing[i].destroy()
+                self.devman.close_all()         # closes any device kept open
                 self.devman.destroy()           # stops the device manager
                 self.splashroot.destroy()       # destroys the main window
                 self.splashroot.quit()          # quits the program
@@ -627,6 +813,8 @@ class Splash:
 
         :return: None
         """
+        from Experiments import IV
+
         self.hide()
         self.runing.append(Mordor(self, IV, self.devman, self.experiments))
         self.experiments = self.experiments + 1
@@ -637,6 +825,8 @@ class Splash:
 
         :return: None
         """
+        from Experiments import Spectroscopy
+
         self.hide()
         self.runing.append(Mordor(self, Spectroscopy, self.devman, self.experiments))
         self.experiments = self.experiments + 1
@@ -647,6 +837,8 @@ class Splash:
 
         :return: None
         """
+        from Experiments import Temperature
+
         self.hide()
         self.runing.append(Temperature(self, self.devman, self.experiments))
         self.experiments = self.experiments + 1
@@ -656,6 +848,8 @@ class Splash:
 
         :return: None
         """
+        from Experiments import Flash
+
         self.hide()
         self.runing.append(Flash(self, self.devman, self.experiments, Save))
         self.experiments = self.experiments + 1
@@ -665,6 +859,8 @@ class Splash:
 
         :return: None
         """
+        from Experiments import CV
+
         self.hide()
         self.runing.append(Mordor(self, CV, self.devman, self.experiments))
         self.experiments = self.experiments + 1
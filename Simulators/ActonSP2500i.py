@@ -0,0 +1,110 @@
+""" Simulator of the Acton SP2500i monochromator. The motor moves at the scan speed set, or at 20000 nm/min with GOTO.
+"""
+
+import re
+import time
+
+from Simulators.simulator import Simulator
+
+
+class ActonSP2500i(Simulator):
+    """ Acton SP2500i monochromator. The answers end with 'ok', as the real one does.
+    """
+
+    name = 'Acton SP2500i'
+    terminator = '\r\n'
+
+    gratings = ['300 g/mm BLZ=  500NM', '1200 g/mm BLZ=  750NM', '150 g/mm BLZ= 1250NM']
+    fast_speed = 20000.     # Speed of GOTO (nm/min)
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the ActonSP2500i class. It accepts the same arguments as Simulator.
+        """
+        Simulator.__init__(self, *args, **kwargs)
+
+        self.wl = 500.
+        self.target = 500.
+        self.speed = 100.
+        self.origin = 500.
+        self.move_speed = 100.
+        self.departure = 0.
+        self.arrival = 0.
+        self.grating = 0
+        self.mirror = 0
+
+    def position(self):
+        """ The current wavelength, taking into account the movement of the motor
+
+        :return: The wavelength (nm)
+        """
+        now = time.monotonic()
+        if now >= self.arrival:
+            self.wl = self.target
+        else:
+            self.wl = self.origin + (now - self.departure) * self.move_speed / 60 * (1 if self.target > self.origin
+                                                                                      else -1)
+
+        return self.wl
+
+    def goto(self, target, speed):
+        """ Starts moving the motor to a target wavelength
+
+        :param target: The target wavelength (nm)
+        :param speed: The speed (nm/min)
+        :return: None
+        """
+        self.origin = self.position()
+        self.target = target
+        self.move_speed = speed
+        self.departure = time.monotonic()
+        self.arrival = self.departure + abs(target - self.origin) / speed * 60
+
+    def handle(self, message):
+        """ Processes a command
+
+        :param message: The command, eg. '?NM' or '500.000 >NM'
+        :return: The answer
+        """
+        match = re.match(r'^([-+0-9.]+)\s+(\S+)$', message)
+        value, command = (float(match.group(1)), match.group(2).upper()) if match else (None, message.upper())
+
+        if command == 'GOTO':
+            # The real monochromator does not answer until the movement is finished
+            self.goto(value, self.fast_speed)
+            self.wait(self.arrival - time.monotonic())
+            return 'ok'
+        elif command == '>NM':
+            self.goto(value, self.speed)
+            return 'ok'
+        elif command == 'NM/MIN':
+            self.speed = value
+            return 'ok'
+        elif command == 'GRATING':
+            self.grating = int(value) - 1
+            return 'ok'
+        elif command == 'MODEL':
+            return 'SP-2-500i  ok'
+        elif command == '?NM':
+            return '{0:.3f} nm  ok'.format(self.position())
+        elif command == '?NM/MIN':
+            return '{0:.3f} nm/min  ok'.format(self.speed)
+        elif command == '?GRATING':
+            return '{0}  ok'.format(self.grating + 1)
+        elif command == '?GRATINGS':
+            lines = ['{0}{1}  {2}'.format('\x1a' if i == self.grating else ' ', i + 1, g)
+                     for i, g in enumerate(self.gratings)]
+            return self.terminator.join(lines + ['ok'])
+        elif command == 'MONO-?DONE':
+            return '{0:d}  ok'.format(self.position() == self.target)
+        elif command == '?MIR':
+            return '{0:d}  ok'.format(self.mirror)
+        elif command in ['FRONT', 'SIDE']:
+            self.mirror = ['FRONT', 'SIDE'].index(command)
+            return 'ok'
+        else:
+            return 'ok'
+
+
+class New(ActonSP2500i):
+    """ Standarised name for the ActonSP2500i simulator class"""
+    pass
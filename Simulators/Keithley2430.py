@@ -0,0 +1,230 @@
+""" Simulator of the Keithley 2430 Source Measure Unit. The device under test is a solar cell, modelled as an
+illuminated diode with some series and shunt resistance.
+"""
+
+import time
+
+import numpy as np
+
+from Simulators.simulator import ScpiSimulator
+
+
+class Keithley2430(ScpiSimulator):
+    """ Keithley 2430 Source Measure Unit, with a solar cell connected
+    """
+
+    name = 'Keithley 2430'
+    idn = 'KEITHLEY INSTRUMENTS INC.,MODEL 2430,1234567,C33 (SIM)'
+    default_port = 5025
+
+    # Parameters of the solar cell
+    isc = 0.03      # Short circuit current (A)
+    i0 = 1e-12      # Saturation current (A)
+    n = 1.2         # Ideality factor
+    rs = 1.         # Series resistance (Ohm)
+    rsh = 1e4       # Shunt resistance (Ohm)
+    vt = 0.02585    # Thermal voltage (V)
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the Keithley2430 class. It accepts the same arguments as ScpiSimulator.
+        """
+        ScpiSimulator.__init__(self, *args, **kwargs)
+
+        self.commands.update({'INIT': self.initiate,
+                              'OUTP': self.output,
+                              'TRAC:CLE': lambda args: self.clear_trace()})
+        self.queries.update({'READ?': self.read,
+                             'FETC?': self.fetch,
+                             'TRAC:POIN:ACT?': lambda args: '{0:d}'.format(self.stored()),
+                             'TRAC:DATA?': lambda args: self.format(self.trace[:self.stored()]),
+                             'SOUR:SWE:POIN?': lambda args: '{0:d}'.format(self.sweep_points())})
+
+        self.reset()
+
+    def reset(self):
+        """ Sets the default settings of the instrument
+
+        :return: None
+        """
+        ScpiSimulator.reset(self)
+        self.settings.update({'SOUR:FUNC': 'VOLT', 'SOUR:DEL': '0', 'SOUR:SWE:POIN': '2500', 'SOUR:SWE:DIR': 'UP',
+                              'SOUR:SWE:SPAC': 'LIN', 'FORM:DATA': 'ASC', 'FORM:BORD': 'NORM', 'TRAC:POIN': '100',
+                              'TRAC:FEED': 'SENS', 'TRAC:FEED:CONT': 'NEV'})
+        self.on = False
+        self.data = np.zeros((0, 2))
+        self.ready = 0
+        self.clear_trace()
+
+    def clear_trace(self):
+        """ Clears the trace buffer
+
+        :return: None
+        """
+        self.trace = np.zeros((0, 2))
+        self.trace_times = np.zeros(0)
+
+    def stored(self):
+        """ The number of readings stored in the trace buffer so far. They are stored as the sweep goes on.
+
+        :return: The number of readings
+        """
+        return int(np.searchsorted(self.trace_times, time.monotonic(), side='right'))
+
+    def busy_until(self):
+        """ The time at which the sweep in progress will be finished
+
+        :return: The time, as given by time.monotonic
+        """
+        return self.ready
+
+    def current(self, v):
+        """ Current of the solar cell at a given voltage, solving the diode equation with the series resistance
+
+        :param v: The voltage (V), a number or an array
+        :return: The current (A)
+        """
+        v = np.asarray(v, dtype=float)
+        i = -self.isc + v / self.rsh
+        for _ in range(30):
+            vd = v - i * self.rs
+            f = self.i0 * np.expm1(np.clip(vd / (self.n * self.vt), -50, 50)) - self.isc + vd / self.rsh - i
+            df = -self.rs * (self.i0 / (self.n * self.vt) * np.exp(np.clip(vd / (self.n * self.vt), -50, 50)) +
+                             1. / self.rsh) - 1
+            i = i - f / df
+
+        return i
+
+    def voltage(self, i):
+        """ Voltage of the solar cell at a given current, interpolating the IV curve
+
+        :param i: The current (A), a number or an array
+        :return: The voltage (V)
+        """
+        v = np.linspace(-2, 1, 3001)
+        return np.interp(i, self.current(v), v)
+
+    def bias(self, values):
+        """ Measures the solar cell at some bias, applying the compliance
+
+        :param values: The bias values, voltage or current depending on the source
+        :return: Array with two columns: voltage and current
+        """
+        values = np.asarray(values, dtype=float)
+        sense = 'CURR' if self.settings['SOUR:FUNC'] == 'VOLT' else 'VOLT'
+        compliance = float(self.settings.get('SENS:{0}:PROT'.format(sense), '0.1'))
+
+        if sense == 'CURR':
+            v = values
+            i = np.clip(self.noisy(self.current(v)), -compliance, compliance)
+        else:
+            i = values
+            v = np.clip(self.noisy(self.voltage(i)), -compliance, compliance)
+
+        return np.column_stack((v, i))
+
+    def sweep_points(self):
+        """ The number of points of the sweep
+
+        :return: The number of points
+        """
+        return int(round(float(self.settings['SOUR:SWE:POIN'])))
+
+    def sweep(self):
+        """ The bias values of the sweep, as configured
+
+        :return: Array with the bias
+        """
+        source = self.settings['SOUR:FUNC']
+        start = float(self.settings.get('SOUR:{0}:STAR'.format(source), '0'))
+        stop = float(self.settings.get('SOUR:{0}:STOP'.format(source), '0'))
+        points = self.sweep_points()
+
+        if self.settings['SOUR:SWE:SPAC'].startswith('LOG'):
+            values = np.logspace(np.log10(max(start, 1e-12)), np.log10(max(stop, 1e-12)), points)
+        else:
+            values = np.linspace(start, stop, points)
+
+        return values[::-1] if self.settings['SOUR:SWE:DIR'].startswith('DOW') else values
+
+    def point_time(self):
+        """ Time taken to measure each point, given by the integration time and the delay
+
+        :return: The time, in seconds
+        """
+        sense = 'CURR' if self.settings['SOUR:FUNC'] == 'VOLT' else 'VOLT'
+        nplc = float(self.settings.get('SENS:{0}:NPLC'.format(sense), '1'))
+        return nplc / 50. + float(self.settings['SOUR:DEL'])
+
+    def initiate(self, args):
+        """ Starts a sweep. The data is ready at the time the real instrument would finish it.
+
+        :param args: Not used
+        :return: None
+        """
+        mode = self.settings.get('SOUR:{0}:MODE'.format(self.settings['SOUR:FUNC']), 'FIX')
+        values = self.sweep() if mode.startswith('SWE') else [self.level()]
+
+        self.data = self.bias(values)
+        now = time.monotonic()
+        self.ready = now + len(self.data) * self.point_time()
+
+        # With the feed control in NEXT, the readings are also stored in the trace buffer until it is full, and then
+        # the feed control goes back to NEVER
+        if self.settings['TRAC:FEED:CONT'].upper().startswith('NEXT'):
+            size = int(float(self.settings['TRAC:POIN']))
+            self.trace = self.data[:size]
+            self.trace_times = now + np.arange(1, len(self.trace) + 1) * self.point_time()
+            self.settings['TRAC:FEED:CONT'] = 'NEV'
+
+    def level(self):
+        """ The bias in DC mode
+
+        :return: The bias
+        """
+        return float(self.settings.get('SOUR:{0}:LEV'.format(self.settings['SOUR:FUNC']), '0'))
+
+    def output(self, args):
+        """ Turns the output on or off
+
+        :param args: 'ON', 'OFF', '1' or '0'
+        :return: None
+        """
+        self.on = args.upper() in ['ON', '1']
+
+    def format(self, data):
+        """ Formats the data as the instrument does, voltage and current of each point separated by commas or, with
+        FORM:DATA REAL,32 or SREAL, as a binary block of single precision floats without length (#0)
+
+        :param data: Array with two columns: voltage and current
+        :return: The formatted data
+        """
+        kind = self.settings['FORM:DATA'].upper()
+        if kind.startswith('REAL') or kind.startswith('SRE'):
+            # SREAL is always little endian, REAL depends on the byte order
+            swapped = kind.startswith('SRE') or self.settings['FORM:BORD'].upper().startswith('SWAP')
+            return b'#0' + np.ravel(data).astype('<f4' if swapped else '>f4').tobytes()
+
+        return ','.join(['{0:+.6E}'.format(x) for x in np.ravel(data)])
+
+    def read(self, args):
+        """ Triggers a measurement at the current bias and returns it
+
+        :param args: Not used
+        :return: The formatted data
+        """
+        self.initiate(args)
+        return self.fetch(args)
+
+    def fetch(self, args):
+        """ Returns the data of the last measurement, waiting until it is finished
+
+        :param args: Not used
+        :return: The formatted data
+        """
+        self.wait(self.ready - time.monotonic())
+        return self.format(self.data)
+
+
+class New(Keithley2430):
+    """ Standarised name for the Keithley2430 simulator class"""
+    pass
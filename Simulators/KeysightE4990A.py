@@ -0,0 +1,169 @@
+""" Simulator of the Keysight E4990A impedance analyser. The device under test is a junction capacitance, which
+depends on the DC bias, in parallel with a leakage resistance and in series with a contact resistance.
+"""
+
+import time
+
+import numpy as np
+
+from Simulators.simulator import ScpiSimulator
+
+
+class KeysightE4990A(ScpiSimulator):
+    """ Keysight E4990A impedance analyser, with a diode connected
+    """
+
+    name = 'Keysight E4990A'
+    idn = 'Keysight Technologies,E4990A,MY54101596,A.02.11 (SIM)'
+    default_port = 5026
+
+    c0 = 1e-9       # Capacitance at zero bias (F)
+    vbi = 0.8       # Built-in voltage (V)
+    rp = 1e6        # Leakage resistance (Ohm)
+    rs = 10.        # Contact resistance (Ohm)
+    point_time = 5e-3   # Time to measure each point of the sweep (s)
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the KeysightE4990A class. It accepts the same arguments as ScpiSimulator.
+        """
+        ScpiSimulator.__init__(self, *args, **kwargs)
+
+        self.commands.update({'TRIG:SEQ:SING': self.trigger,
+                              'ABOR': lambda args: setattr(self, 'ready', 0),
+                              'CALC:PAR:SEL': lambda args: setattr(self, 'selected', 1),
+                              'CALC:PAR2:SEL': lambda args: setattr(self, 'selected', 2),
+                              'CALC:PAR3:SEL': lambda args: setattr(self, 'selected', 3),
+                              'CALC:PAR4:SEL': lambda args: setattr(self, 'selected', 4)})
+        self.queries.update({'*OPC?': self.operation_complete,
+                             'CALC:SEL:DATA:XAX?': self.x_axis,
+                             'CALC:SEL:DATA:FDAT?': self.formatted_data})
+
+        self.reset()
+
+    def reset(self):
+        """ Sets the default settings of the instrument
+
+        :return: None
+        """
+        ScpiSimulator.reset(self)
+        self.settings.update({'SENS:SWE:POIN': '201', 'SENS:SWE:TYPE': 'LIN', 'SENS:FREQ:STAR': '20',
+                              'SENS:FREQ:STOP': '1E6', 'SENS:FREQ:CW': '1E3', 'SOUR:BIAS:VOLT:STAR': '0',
+                              'SOUR:BIAS:VOLT:STOP': '0', 'SOUR:BIAS:VOLT:LEV:IMM:AMPL': '0',
+                              'SOUR:VOLT:LEV:IMM:AMPL': '0.5', 'SENS:SWE:DIR': 'UP'})
+        for i, parameter in enumerate(['Z', 'TZ', 'VAC', 'IAC']):
+            self.settings['CALC:PAR{0}:DEF'.format(i + 1 if i > 0 else '')] = parameter
+
+        self.selected = 1
+        self.ready = 0
+
+    def busy_until(self):
+        """ The time at which the sweep in progress will be finished
+
+        :return: The time, as given by time.monotonic
+        """
+        return self.ready
+
+    def points(self):
+        """ The number of points of the sweep
+
+        :return: The number of points
+        """
+        return int(float(self.settings['SENS:SWE:POIN']))
+
+    def sweep(self):
+        """ The frequency and bias of each point of the sweep, as configured
+
+        :return: A tuple with the x axis of the sweep, the frequency and the bias
+        """
+        n = self.points()
+        kind = self.settings['SENS:SWE:TYPE'].upper()
+
+        if kind.startswith('LBI') or kind.startswith('BIAS'):
+            start = float(self.settings['SOUR:BIAS:VOLT:STAR'])
+            stop = float(self.settings['SOUR:BIAS:VOLT:STOP'])
+            x = np.geomspace(start, stop, n) if kind.startswith('LBI') and start * stop > 0 else np.linspace(start,
+                                                                                                            stop, n)
+            freq = np.full(n, float(self.settings['SENS:FREQ:CW']))
+            bias = x
+        else:
+            start = float(self.settings['SENS:FREQ:STAR'])
+            stop = float(self.settings['SENS:FREQ:STOP'])
+            x = np.geomspace(start, stop, n) if kind.startswith('LOG') else np.linspace(start, stop, n)
+            freq = x
+            bias = np.full(n, float(self.settings['SOUR:BIAS:VOLT:LEV:IMM:AMPL']))
+
+        if self.settings['SENS:SWE:DIR'].upper().startswith('DOWN'):
+            x, freq, bias = x[::-1], freq[::-1], bias[::-1]
+
+        return x, freq, bias
+
+    def trigger(self, args):
+        """ Starts a sweep. The data is ready at the time the real instrument would finish.
+
+        :param args: Not used
+        :return: None
+        """
+        self.ready = time.monotonic() + self.points() * self.point_time
+
+    def operation_complete(self, args):
+        """ Waits until the sweep is finished
+
+        :param args: Not used
+        :return: '1'
+        """
+        self.wait(self.ready - time.monotonic())
+        return '1'
+
+    def parameter(self, name, freq, bias):
+        """ Calculates a parameter of the device under test
+
+        :param name: The name of the parameter, eg. 'CP' or 'Z'
+        :param freq: The frequency (Hz), an array
+        :param bias: The DC bias (V), an array
+        :return: The value of the parameter, an array
+        """
+        w = 2 * np.pi * freq
+        c = self.c0 / np.sqrt(1 - np.minimum(bias, 0.9 * self.vbi) / self.vbi)
+        z = self.rs + self.rp / (1 + 1j * w * self.rp * c)
+        amplitude = float(self.settings['SOUR:VOLT:LEV:IMM:AMPL'])
+
+        values = {'Z': np.abs(z),
+                  'TZ': np.degrees(np.angle(z)),
+                  'R': z.real,
+                  'X': z.imag,
+                  'CS': -1 / (w * z.imag),
+                  'RS': z.real,
+                  'CP': (1 / z).imag / w,
+                  'RP': 1 / (1 / z).real,
+                  'VAC': np.full(len(freq), amplitude),
+                  'IAC': amplitude / np.abs(z),
+                  'VDC': bias,
+                  'IDC': bias / self.rp}
+
+        return self.noisy(values.get(name.upper(), np.zeros(len(freq))))
+
+    def x_axis(self, args):
+        """ The x axis of the sweep
+
+        :param args: Not used
+        :return: The values separated by commas
+        """
+        return ','.join(['{0:+.9E}'.format(x) for x in self.sweep()[0]])
+
+    def formatted_data(self, args):
+        """ The data of the selected trace. Each point has two values, the second of them zero.
+
+        :param args: Not used
+        :return: The values separated by commas
+        """
+        _, freq, bias = self.sweep()
+        key = 'CALC:PAR{0}:DEF'.format(self.selected if self.selected > 1 else '')
+        data = np.zeros((len(freq), 2))
+        data[:, 0] = self.parameter(self.settings.get(key, 'Z'), freq, bias)
+
+        return ','.join(['{0:+.9E}'.format(x) for x in data.ravel()])
+
+
+class New(KeysightE4990A):
+    """ Standarised name for the KeysightE4990A simulator class"""
+    pass
@@ -0,0 +1,165 @@
+""" Simulator of the SR830 lock-in amplifier. The signal is a slowly varying photocurrent, with a phase of 30 deg. The
+internal buffers store CH1 and CH2 (X and Y) at the sample rate given by SRAT.
+"""
+
+import re
+import time
+
+import numpy as np
+
+from Simulators.simulator import Simulator
+
+
+class SR830(Simulator):
+    """ SR830 lock-in amplifier. It can be reached as a serial port or as a VISA resource.
+    """
+
+    name = 'SR830'
+    idn = 'Stanford_Research_Systems,SR830,s/n12345,ver1.07 (SIM)'
+    # The answers end with CR, as configured in the driver
+    terminator = '\r'
+
+    amplitude = 1e-3    # Amplitude of the signal (V)
+    phase = 30.         # Phase of the signal (deg)
+    period = 20.        # Period of the variation of the signal (s)
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the SR830 class. It accepts the same arguments as Simulator.
+        """
+        Simulator.__init__(self, *args, **kwargs)
+
+        self.start = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        """ Sets the default settings of the instrument
+
+        :return: None
+        """
+        # Time constant of 100 ms, slope of 12 dB/oct and buffers at 512 Hz
+        self.settings = {'OFLT': '8', 'OFSL': '1', 'SENS': '26', 'SRAT': '13', 'SEND': '1'}
+        self.buffer_start = None
+        self.buffer_stored = 0
+
+    def signal(self, t=None):
+        """ The signal measured at some time
+
+        :param t: The time, as given by time.monotonic, a number or an array. Default=None (now)
+        :return: A tuple with X and Y
+        """
+        t = (time.monotonic() if t is None else t) - self.start
+        r = self.noisy(self.amplitude * (1.5 + 0.5 * np.sin(2 * np.pi * t / self.period)))
+        theta = np.radians(self.phase)
+
+        return r * np.cos(theta), r * np.sin(theta)
+
+    def outputs(self):
+        """ All the values that can be read, by their index in SNAP?
+
+        :return: A dictionary with the values
+        """
+        x, y = self.signal()
+        r = np.hypot(x, y)
+        theta = np.degrees(np.arctan2(y, x))
+
+        return {1: x, 2: y, 3: r, 4: theta, 5: 0., 6: 0., 7: 0., 8: 0., 9: 1000., 10: x, 11: y}
+
+    def sample_rate(self):
+        """ The sample rate of the buffers
+
+        :return: The rate (Hz)
+        """
+        return 0.0625 * 2 ** min(int(self.settings['SRAT']), 13)
+
+    def stored(self):
+        """ The number of points stored in the buffers so far
+
+        :return: The number of points
+        """
+        if self.buffer_start is None:
+            return self.buffer_stored
+
+        count = int((time.monotonic() - self.buffer_start) * self.sample_rate())
+        # The buffers stop when they are full, as in one shot mode (SEND 0)
+        return min(count, 16383)
+
+    def buffer(self, args):
+        """ Reads points from a buffer
+
+        :param args: The buffer (1 or 2), the first point and the number of points, separated by commas
+        :return: The values of the points
+        """
+        channel, first, count = [int(x) for x in args.split(',')]
+        t = self.buffer_start + (first + np.arange(count)) / self.sample_rate()
+
+        return self.signal(t)[channel - 1]
+
+    def send(self, conn, answer):
+        """ Sends an answer to the driver. Binary answers are sent without terminator, as the instrument does.
+
+        :param conn: The Connection to the driver
+        :param answer: The answer, as a string or bytes
+        :return: None
+        """
+        if isinstance(answer, bytes):
+            self.answers += 1
+            self.bytes_out += len(answer)
+            conn.write(answer)
+        else:
+            Simulator.send(self, conn, answer)
+
+    def handle(self, message):
+        """ Processes a message with one or more commands, separated by ';'
+
+        :param message: The message
+        :return: The answers to the queries, separated by ';', or None if there were no queries
+        """
+        answers = []
+        for command in message.split(';'):
+            match = re.match(r'^\s*(\*?[A-Za-z]+)(\d*)\s*(\?)?\s*(.*?)\s*$', command)
+            if match is None or match.group(1) == '':
+                continue
+
+            name, index, query, args = match.groups()
+            name = name.upper()
+            key = name + index
+
+            if name == '*RST':
+                self.reset()
+            elif name == 'REST':
+                self.buffer_start = None
+                self.buffer_stored = 0
+            elif name == 'STRT':
+                self.buffer_start = time.monotonic() - self.buffer_stored / self.sample_rate()
+            elif name == 'PAUS':
+                self.buffer_stored = self.stored()
+                self.buffer_start = None
+            elif name == 'SPTS':
+                answers.append('{0:d}'.format(self.stored()))
+            elif name == 'TRCA':
+                answers.append(','.join(['{0:.6e}'.format(x) for x in self.buffer(args)]))
+            elif name == 'TRCB':
+                answers.append(np.asarray(self.buffer(args), dtype='<f4').tobytes())
+            elif not query:
+                self.settings[key] = args
+            elif name == '*IDN':
+                answers.append(self.idn)
+            elif name == 'SNAP':
+                values = self.outputs()
+                answers.append(','.join(['{0:.6e}'.format(values[int(i)]) for i in args.split(',')]))
+            elif name == 'OUTP':
+                answers.append('{0:.6e}'.format(self.outputs()[int(args)]))
+            elif name == 'OUTR':
+                answers.append('{0:.6e}'.format(self.outputs()[9 + int(args)]))
+            else:
+                answers.append(self.settings.get(key if args == '' else key + args, '0'))
+
+        if len(answers) == 1:
+            return answers[0]
+
+        return ';'.join(answers) if len(answers) > 0 else None
+
+
+class New(SR830):
+    """ Standarised name for the SR830 simulator class"""
+    pass
@@ -0,0 +1,4 @@
+""" Simulators of the instruments, so the real drivers can be used, benchmarked and profiled without the hardware. Each
+simulator speaks the protocol of the instrument over a pseudo-terminal, seen by the driver as a serial port, or over a
+local socket, seen as a VISA resource. See Simulators/__main__.py for how to launch them.
+"""
@@ -0,0 +1,62 @@
+""" Launches one or more instrument simulators, eg.
+
+    python -m Simulators SR830 ActonSP2500i Keithley2430:5025 --latency 2 --noise 0.01
+
+Each simulator is given as the name of its module, optionally followed by ':' and the TCP port to use. Otherwise, the
+default of the simulator is used: a pseudo-terminal for serial instruments or a TCP port for VISA ones. The port or VISA
+resource to select in the Device Manager is printed for each of them. Press Ctrl+C to stop them and see the traffic.
+"""
+
+import time
+import argparse
+import importlib
+
+from Simulators.ports import PtyPort, TcpPort
+
+
+def launch(spec, latency=0., noise=0., seed=None):
+    """ Creates a simulator and starts serving it
+
+    :param spec: The name of the module of the simulator, optionally followed by ':' and a TCP port or 'pty'
+    :param latency: Time (s) taken by the instrument to process each message. Default=0
+    :param noise: Relative noise added to the measured values. Default=0
+    :param seed: Seed of the random numbers. Default=None
+    :return: A tuple with the simulator and its port
+    """
+    module, _, where = spec.partition(':')
+    simulator = importlib.import_module('Simulators.' + module).New(latency=latency, noise=noise, seed=seed)
+
+    where = where if where != '' else str(simulator.default_port)
+    port = PtyPort(simulator) if where == 'pty' else TcpPort(simulator, int(where))
+    port.start()
+
+    return simulator, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Instrument simulators for Mordor.')
+    parser.add_argument('simulators', nargs='+', help="Simulators to launch, eg. SR830 or Keithley2430:5025")
+    parser.add_argument('--latency', type=float, default=0., help='Time (ms) to process each message. Default: 0')
+    parser.add_argument('--noise', type=float, default=0., help='Relative noise of the measurements. Default: 0')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the random numbers')
+    args = parser.parse_args()
+
+    running = []
+    for spec in args.simulators:
+        simulator, port = launch(spec, args.latency / 1000., args.noise, args.seed)
+        running.append((simulator, port))
+        print('{0} ready at {1}'.format(simulator.name, port.address))
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator, port in running:
+            print(simulator.report())
+            port.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+""" Simulator of an Arduino board running the 'prototype.ino' sketch. Before reading each number, the board sends a
+line with 'w', and the number ends when a non-digit arrives or after 5 ms without data. The sketch starts again every
+time the port is opened, as the real board is reset by the serial port.
+"""
+
+import numpy as np
+
+from Simulators.simulator import Simulator
+
+
+class Arduino(Simulator):
+    """ Arduino board running the 'prototype.ino' sketch
+    """
+
+    name = 'Arduino'
+    terminator = '\r\n'
+    timeout = 0.005     # Time (s) without data that ends a number
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the Arduino class. It accepts the same arguments as Simulator.
+        """
+        Simulator.__init__(self, *args, **kwargs)
+
+        self.digital = np.zeros(14, dtype=int)
+        self.analog = np.zeros(14, dtype=int)
+        self.outputs = []
+        self.buffer = b''
+
+    def receive(self, conn, timeout=None):
+        """ Reads the data sent by the driver into the buffer
+
+        :param conn: The Connection to the driver
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait forever)
+        :raises ConnectionResetError: If the port has been opened again
+        :return: True if there was new data
+        """
+        data = conn.read(timeout=timeout)
+        if data is None:
+            return False
+        elif data == b'':
+            self.buffer = b''
+            raise ConnectionResetError
+
+        self.bytes_in += len(data)
+        self.buffer += data
+        return True
+
+    def read_number(self, conn):
+        """ Asks for a number and reads it, as readData in the sketch does
+
+        :param conn: The Connection to the driver
+        :raises ConnectionResetError: If the port is opened again while waiting
+        :return: The number, 0 if it could not be read
+        """
+        # If the port has just been opened again, the 'w' must not reach the new session
+        while self.receive(conn, timeout=0):
+            pass
+
+        self.send(conn, 'w')
+
+        digits = b''
+        while True:
+            # The buffer may have the digits of the next number, or the end of the current one
+            while len(self.buffer) > 0:
+                c, self.buffer = self.buffer[:1], self.buffer[1:]
+                if c.isdigit() or (c == b'-' and digits == b''):
+                    digits += c
+                elif digits != b'':
+                    return int(digits) if digits != b'-' else 0
+
+            if not self.receive(conn, timeout=None if digits == b'' else self.timeout):
+                return int(digits) if digits not in [b'', b'-'] else 0
+
+    def serve(self, conn):
+        """ Runs the sketch until the connection is closed. It starts again if the port is opened again.
+
+        :param conn: The Connection to the driver
+        :return: None
+        """
+        while True:
+            # Nothing is sent until the driver opens the port
+            if conn.read() != b'':
+                continue
+
+            while True:
+                conn.discard()
+                self.buffer = b''
+                try:
+                    self.run(conn)
+                    break
+                except ConnectionResetError:
+                    continue
+
+    def run(self, conn):
+        """ The setup and loop of the sketch
+
+        :param conn: The Connection to the driver
+        :return: None
+        """
+        self.outputs = [self.read_number(conn) for _ in range(self.read_number(conn))]
+
+        while True:
+            command = self.read_number(conn)
+            self.wait()
+            self.messages += 1
+
+            if command in [0, 1]:
+                self.digital[self.read_number(conn) % 14] = command
+            elif command == 2:
+                self.send(conn, '{0:d}'.format(self.digital[self.read_number(conn) % 14]))
+            elif command == 3:
+                pin = self.read_number(conn) % 14
+                self.analog[pin] = self.read_number(conn)
+            elif command == 4:
+                self.read_number(conn)
+                self.send(conn, '{0:d}'.format(int(np.clip(self.noisy(512.), 0, 1023))))
+            elif command == 98:
+                self.send(conn, 'Arduino')
+
+
+class New(Arduino):
+    """ Standarised name for the Arduino simulator class"""
+    pass
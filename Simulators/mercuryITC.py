@@ -0,0 +1,89 @@
+""" Simulator of the Oxford Instruments Mercury iTC temperature controller. The temperature of the sample approaches
+the set point exponentially while the heater loop is enabled, and relaxes to room temperature otherwise.
+"""
+
+import time
+
+import numpy as np
+
+from Simulators.simulator import Simulator
+
+
+class mercuryITC(Simulator):
+    """ Mercury iTC temperature controller, with a sensor in MB1.T1 and a heater in MB0.H1
+    """
+
+    name = 'Mercury iTC'
+    idn = 'IDN:OXFORD INSTRUMENTS:MERCURY ITC:K0001:2.5.09.000 (SIM)'
+
+    room = 295.     # Room temperature (K)
+    tau = 30.       # Time constant of the temperature (s)
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the mercuryITC class. It accepts the same arguments as Simulator.
+        """
+        Simulator.__init__(self, *args, **kwargs)
+
+        self.temperature = self.room
+        self.setpoint = self.room
+        self.heater = False
+        self.time = time.monotonic()
+
+    def update(self):
+        """ Updates the temperature of the sample, given the time since the last update
+
+        :return: The temperature (K)
+        """
+        now = time.monotonic()
+        target = self.setpoint if self.heater else self.room
+        self.temperature = target + (self.temperature - target) * np.exp(-(now - self.time) / self.tau)
+        self.time = now
+
+        return self.temperature
+
+    def handle(self, message):
+        """ Processes a command
+
+        :param message: The command, eg. 'READ:DEV:MB1.T1:TEMP:SIG:TEMP'
+        :return: The answer
+        """
+        if message.upper() == '*IDN?':
+            return self.idn
+
+        fields = message.split(':')
+        self.update()
+
+        if fields[0] == 'READ':
+            path = ':'.join(fields[1:])
+            if path.endswith('SIG:TEMP'):
+                value = '{0:.4f}K'.format(self.noisy(self.temperature))
+            elif path.endswith('SIG:VOLT'):
+                value = '{0:.4f}mV'.format(self.noisy(self.temperature * 0.35))
+            elif path.endswith('SIG:CURR'):
+                value = '{0:.4f}\xb5A'.format(100.)
+            elif path.endswith('SIG:RES'):
+                value = '{0:.4f}O'.format(self.noisy(self.temperature * 3.5))
+            elif path.endswith('LOOP:TSET'):
+                value = '{0:.4f}K'.format(self.setpoint)
+            else:
+                value = 'N/A'
+            return 'STAT:{0}:{1}'.format(path, value)
+
+        elif fields[0] == 'SET':
+            path, value = ':'.join(fields[1:-1]), fields[-1]
+            try:
+                if path.endswith('LOOP:TSET'):
+                    self.setpoint = float(value)
+                elif path.endswith('LOOP:ENAB'):
+                    self.heater = value == 'ON'
+                status = 'VALID'
+            except ValueError:
+                status = 'INVALID'
+            return 'STAT:SET:{0}:{1}:{2}'.format(path, value, status)
+
+        return 'INVALID'
+
+
+class New(mercuryITC):
+    """ Standarised name for the mercuryITC simulator class"""
+    pass
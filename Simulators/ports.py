@@ -0,0 +1,217 @@
+""" This module includes the ports through which the real drivers reach the simulators: pseudo-terminals, seen by the
+drivers as serial ports, and TCP sockets, seen as VISA resources like 'TCPIP0::127.0.0.1::5025::SOCKET'.
+"""
+
+import os
+import select
+import socket
+import struct
+import threading
+import traceback
+
+from Devices.serial_ports import simulators_folder
+
+
+class Connection(object):
+    """ Byte stream between a simulator and a driver, over a file descriptor
+    """
+
+    def __init__(self, fd, packet=False):
+        """ Constructor of the Connection class
+
+        :param fd: The file descriptor
+        :param packet: If the file descriptor is the master of a pseudo-terminal in packet mode. Default=False
+        """
+        self.fd = fd
+        self.packet = packet
+
+    def read(self, timeout=None):
+        """ Reads the data available, waiting for it if necessary
+
+        :param timeout: Maximum waiting time, in seconds. Default=None (wait forever)
+        :raises EOFError: If the connection has been closed
+        :return: The data, None if there was no data before the timeout or b'' if the driver has opened the port again
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return None
+
+        try:
+            data = os.read(self.fd, 4096)
+        except OSError:
+            raise EOFError
+
+        if len(data) == 0:
+            raise EOFError
+
+        if self.packet:
+            # The first byte is 0 for data, otherwise it tells what the driver has done with the terminal. Opening a
+            # serial port flushes its input.
+            if data[0] != 0:
+                return b'' if data[0] & 1 else None
+            return data[1:]
+
+        return data
+
+    def discard(self):
+        """ Drops the data pending to be read. In packet mode, the driver opening the port again is reported before the
+        data it sent before closing it, which is then discarded with this.
+
+        :return: None
+        """
+        try:
+            while self.read(timeout=0) is not None:
+                pass
+        except EOFError:
+            pass
+
+    def write(self, data):
+        """ Writes all the data
+
+        :param data: The data, as bytes
+        :return: None
+        """
+        while len(data) > 0:
+            data = data[os.write(self.fd, data):]
+
+
+class PtyPort(object):
+    """ Pseudo-terminal connected to a simulator. The driver uses its name, eg. /dev/pts/3, or the link to it, as a
+    serial port.
+    """
+
+    def __init__(self, simulator, link=None):
+        """ Constructor of the PtyPort class
+
+        :param simulator: The simulator
+        :param link: Path of a link to the terminal. Default=None (named after the simulator, in simulators_folder)
+        """
+        import pty
+        import tty
+        import fcntl
+        import termios
+
+        self.simulator = simulator
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+
+        # In packet mode we know when the driver opens the port
+        fcntl.ioctl(self.master, termios.TIOCPKT, struct.pack('i', 1))
+
+        self.name = os.ttyname(self.slave)
+
+        self.link = os.path.join(simulators_folder, simulator.name.replace(' ', '_')) if link is None else link
+        os.makedirs(os.path.dirname(self.link), exist_ok=True)
+        if os.path.lexists(self.link):
+            os.remove(self.link)
+        os.symlink(self.name, self.link)
+
+        self.thread = None
+
+    @property
+    def address(self):
+        """ The port to be used in the Device Manager """
+        return self.link
+
+    def start(self):
+        """ Starts serving the driver in a background thread
+
+        :return: None
+        """
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        """ Serves the driver until the port is closed
+
+        :return: None
+        """
+        try:
+            self.simulator.serve(Connection(self.master, packet=True))
+        except EOFError:
+            pass
+        except Exception:
+            traceback.print_exc()
+
+    def close(self):
+        """ Removes the link and closes the terminal
+
+        :return: None
+        """
+        if os.path.islink(self.link):
+            os.remove(self.link)
+        os.close(self.slave)
+        os.close(self.master)
+
+
+class TcpPort(object):
+    """ TCP socket connected to a simulator. Each client is served in its own thread, but they all share the same
+    simulated instrument.
+    """
+
+    def __init__(self, simulator, port, host='127.0.0.1'):
+        """ Constructor of the TcpPort class
+
+        :param simulator: The simulator
+        :param port: The TCP port, or 0 to use any free port
+        :param host: The interface to listen to. Default='127.0.0.1'
+        """
+        self.simulator = simulator
+        self.host = host
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(5)
+        self.port = self.socket.getsockname()[1]
+
+        self.thread = None
+
+    @property
+    def address(self):
+        """ The VISA resource to be used in the Device Manager """
+        return 'TCPIP0::{0}::{1}::SOCKET'.format(self.host, self.port)
+
+    def start(self):
+        """ Starts accepting clients in a background thread
+
+        :return: None
+        """
+        self.thread = threading.Thread(target=self.accept, daemon=True)
+        self.thread.start()
+
+    def accept(self):
+        """ Accepts clients until the socket is closed
+
+        :return: None
+        """
+        while True:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve, args=(client,), daemon=True).start()
+
+    def serve(self, client):
+        """ Serves a client until it closes the connection
+
+        :param client: The socket of the client
+        :return: None
+        """
+        try:
+            self.simulator.serve(Connection(client.fileno()))
+        except EOFError:
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            client.close()
+
+    def close(self):
+        """ Stops accepting clients
+
+        :return: None
+        """
+        self.socket.close()
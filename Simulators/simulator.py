@@ -0,0 +1,309 @@
+""" This module includes the base classes of the instrument simulators. A simulator receives the messages sent by the
+real driver of the instrument, through a pseudo-terminal or a socket (see Simulators.ports), and answers them as the
+instrument would do, after some configurable latency and with some noise in the measured values.
+"""
+
+import re
+import time
+import threading
+
+import numpy as np
+
+
+class Simulator(object):
+    """ Base class of the simulators of instruments with a text protocol, where the messages are lines ending in CR
+    and/or LF. Simulators implement self.handle, which gets the message and returns the answer, if any.
+    """
+
+    name = 'Simulator'
+    # The characters added to each answer
+    terminator = '\n'
+    # How the simulator is reached by default: 'pty' or the TCP port of a socket
+    default_port = 'pty'
+
+    def __init__(self, latency=0., noise=0., seed=None):
+        """ Constructor of the Simulator class
+
+        :param latency: Time (s) taken by the instrument to process each message. Default=0
+        :param noise: Relative noise (standard deviation) added to the measured values. Default=0
+        :param seed: Seed of the random numbers, so the noise can be reproduced. Default=None
+        """
+        self.latency = latency
+        self.noise = noise
+        self.rng = np.random.RandomState(seed)
+
+        # The instrument is shared by all the connections
+        self.lock = threading.RLock()
+
+        self.messages = 0
+        self.answers = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def handle(self, message):
+        """ Processes a message. To be implemented by each simulator.
+
+        :param message: The message, without the terminator
+        :return: The answer, without the terminator, or None if there is nothing to answer
+        """
+        raise NotImplementedError
+
+    def opened(self):
+        """ Called when the driver opens a serial port, for the instruments that reset themselves when connected.
+
+        :return: None
+        """
+        pass
+
+    def serve(self, conn):
+        """ Answers the messages arriving from a connection, until it is closed
+
+        :param conn: The Connection to the driver
+        :return: None
+        """
+        buffer = b''
+        while True:
+            data = conn.read()
+            if data is None:
+                continue
+            elif data == b'':
+                # The driver has opened the port again, so anything sent before is discarded
+                buffer = b''
+                conn.discard()
+                with self.lock:
+                    self.opened()
+                continue
+
+            self.bytes_in += len(data)
+            *lines, buffer = re.split(b'[\r\n]', buffer + data)
+
+            for line in lines:
+                message = line.decode('latin-1').strip()
+                if message == '':
+                    continue
+
+                self.wait()
+                with self.lock:
+                    self.messages += 1
+                    answer = self.handle(message)
+
+                if answer is not None:
+                    self.send(conn, answer)
+
+    def send(self, conn, answer):
+        """ Sends an answer to the driver, adding the terminator
+
+        :param conn: The Connection to the driver
+        :param answer: The answer, as a string or bytes
+        :return: None
+        """
+        if isinstance(answer, str):
+            answer = answer.encode('latin-1')
+
+        answer += self.terminator.encode('latin-1')
+        self.answers += 1
+        self.bytes_out += len(answer)
+        conn.write(answer)
+
+    def wait(self, seconds=None):
+        """ Waits as the instrument does while processing a message
+
+        :param seconds: The waiting time. Default=None (the latency of the simulator)
+        :return: None
+        """
+        seconds = self.latency if seconds is None else seconds
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def noisy(self, value):
+        """ Adds noise to a measured value
+
+        :param value: A number or an array
+        :return: The value with the noise
+        """
+        if self.noise == 0:
+            return value
+
+        return value * (1 + self.noise * self.rng.standard_normal(np.shape(value)))
+
+    def report(self):
+        """ Summary of the traffic with the driver
+
+        :return: A string with the number of messages and answers and the bytes transferred
+        """
+        return '{0}: {1} messages, {2} answers, {3} bytes in, {4} bytes out'.format(self.name, self.messages,
+                                                                                     self.answers, self.bytes_in,
+                                                                                     self.bytes_out)
+
+
+def short_form(header):
+    """ Gets the short form of a SCPI header, so the long and short forms of a command can be treated equally, eg.
+    ':SOURce1:VOLTage:LEVel?' and 'SOUR:VOLT:LEV?' are both 'SOUR:VOLT:LEV?'. A numeric suffix of 1 is dropped, as it is
+    the default.
+
+    :param header: The header of the command
+    :return: The short form, in upper case
+    """
+    nodes = []
+    for node in header.strip().lstrip(':').split(':'):
+        query = '?' if node.endswith('?') else ''
+        match = re.match(r'^(\*?[A-Za-z]+)(\d*)$', node.rstrip('?'))
+        if match is None:
+            nodes.append(node.upper())
+            continue
+
+        word, suffix = match.groups()
+        if word.upper() != word and word.lower() != word:
+            # Mixed case: the short form are the capital letters
+            word = ''.join([c for c in word if c.isupper() or c == '*'])
+        else:
+            # Otherwise, the usual rule: four letters, or three if the fourth is a vowel
+            word = word.upper()
+            if len(word) > 4:
+                word = word[:3] if word[3] in 'AEIOU' else word[:4]
+
+        nodes.append(word + ('' if suffix == '1' else suffix) + query)
+
+    return ':'.join(nodes)
+
+
+class ScpiSimulator(Simulator):
+    """ Base class of the simulators of SCPI instruments. Messages may have several commands separated by ';', each of
+    them taken as a full path. The answers to the queries in a message are sent together, also separated by ';'.
+
+    Each simulator gives the commands and queries it understands in the dictionaries self.commands and self.queries,
+    with the short form of the header as key and a function as value. Commands are called with the arguments as a
+    string, and queries with the arguments and return the answer. Any other command just stores its arguments, which are
+    then returned when it is queried.
+
+    The status model is limited to the Operation Complete bit: after *OPC, it is set in the event status register once
+    the pending operations are finished (see self.busy_until), and it is summarised in the status byte if it is enabled
+    with *ESE 1.
+    """
+
+    name = 'SCPI instrument'
+    idn = 'Mordor,Simulator,0,1.0'
+    default_port = 5025
+
+    def __init__(self, *args, **kwargs):
+        """ Constructor of the ScpiSimulator class. It accepts the same arguments as Simulator.
+        """
+        Simulator.__init__(self, *args, **kwargs)
+
+        self.settings = {}
+        self.commands = {'*RST': lambda args: self.reset(),
+                         '*CLS': lambda args: self.clear_status(),
+                         '*OPC': lambda args: setattr(self, 'opc', self.busy_until()),
+                         '*ESE': lambda args: setattr(self, 'ese', int(float(args)))}
+        self.queries = {'*IDN?': lambda args: self.idn,
+                        '*OPC?': lambda args: '1',
+                        '*ESE?': lambda args: '{0:d}'.format(self.ese),
+                        '*ESR?': lambda args: '{0:d}'.format(self.read_event_status()),
+                        '*STB?': lambda args: '{0:d}'.format(self.status_byte())}
+
+        self.transactions = 0
+        self.ese = 0
+        self.clear_status()
+
+    def reset(self):
+        """ Sets the default settings of the instrument
+
+        :return: None
+        """
+        self.settings = {}
+
+    def busy_until(self):
+        """ The time at which the operations in progress, eg. a sweep, will be finished. To be implemented by the
+        simulators of instruments with overlapped commands.
+
+        :return: The time, as given by time.monotonic
+        """
+        return 0
+
+    def clear_status(self):
+        """ Clears the event status register and any pending *OPC
+
+        :return: None
+        """
+        self.esr = 0
+        self.opc = None
+
+    def event_status(self):
+        """ The event status register, with the Operation Complete bit set if the operations are finished
+
+        :return: The register
+        """
+        if self.opc is not None and time.monotonic() >= self.opc:
+            self.esr |= 1
+            self.opc = None
+
+        return self.esr
+
+    def read_event_status(self):
+        """ Reads the event status register, which clears it
+
+        :return: The register
+        """
+        esr = self.event_status()
+        self.esr = 0
+        return esr
+
+    def status_byte(self):
+        """ The status byte, with only the Event Summary Bit (32)
+
+        :return: The status byte
+        """
+        return 32 if self.event_status() & self.ese else 0
+
+    def handle(self, message):
+        """ Processes a message with one or more commands
+
+        :param message: The message
+        :return: The answers to the queries, separated by ';', or None if there were no queries. Answers with binary
+        data are joined as bytes.
+        """
+        self.transactions += 1
+
+        answers = []
+        for command in message.split(';'):
+            header, _, args = command.strip().partition(' ')
+            if header == '':
+                continue
+
+            key = short_form(header)
+            args = args.strip()
+            if key.endswith('?'):
+                answers.append(self.query(key, args))
+            else:
+                self.command(key, args)
+
+        if len(answers) == 0:
+            return None
+        elif any(isinstance(answer, bytes) for answer in answers):
+            return b';'.join([a if isinstance(a, bytes) else a.encode('latin-1') for a in answers])
+
+        return ';'.join(answers)
+
+    def command(self, key, args):
+        """ Executes a command
+
+        :param key: The short form of the header
+        :param args: The arguments, as a string
+        :return: None
+        """
+        if key in self.commands:
+            self.commands[key](args)
+        else:
+            self.settings[key] = args
+
+    def query(self, key, args):
+        """ Answers a query
+
+        :param key: The short form of the header, including the '?'
+        :param args: The arguments, as a string
+        :return: The answer
+        """
+        if key in self.queries:
+            return self.queries[key](args)
+
+        return self.settings.get(key[:-1], '0')
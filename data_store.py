@@ -0,0 +1,157 @@
+""" This module includes the store of the measurements of a session. It keeps in memory only the most recent
+measurements, leaving the rest in the disk, where they are safely kept by their journals.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MeasurementStore(object):
+    """ Ordered collection of the measurements of a session, with a bounded memory footprint. Only the N most recently
+    used measurements, plus those that are pinned, are kept in memory. The rest are evicted following a least recently
+    used policy and memory mapped from their journal in the disk, from where they are transparently reloaded when needed.
+    """
+
+    def __init__(self, index, capacity=20, on_evict=None):
+        """ Constructor of the MeasurementStore class
+
+        :param index: The JournalIndex of the folder where the journals of the measurements are stored
+        :param capacity: Maximum number of measurements kept in memory, not counting those that are pinned. Default=20
+        :param on_evict: Function called as on_evict(i, data) when the measurement in position i is evicted from
+        memory. data is the measurement memory mapped from the disk. Default=None
+        """
+        self.index = index
+        self.capacity = capacity
+        self.on_evict = on_evict
+
+        self.names = []
+        self.entries = []
+        self.cache = OrderedDict()
+        self.pinned = set()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return self.get(i)
+
+    def add(self, name, entry, data=None):
+        """ Adds a new measurement to the store.
+
+        :param name: The name of the measurement
+        :param entry: The entry describing the journal of the measurement, as given by Journal.entry or the JournalIndex.
+        If None, the measurement can not be evicted from memory
+        :param data: The data of the measurement. If None, it is loaded from the disk when needed. Default=None
+        :return: None
+        """
+        self.names.append(name)
+        self.entries.append(entry)
+
+        if data is not None:
+            self.cache[name] = data
+            self.evict()
+
+    def get(self, i):
+        """ Gets the data of a measurement, loading it in memory if it was in the disk. It becomes the most recently used.
+
+        :param i: The position of the measurement
+        :return: The data of the measurement
+        """
+        name = self.names[i]
+        if name in self.cache:
+            self.cache.move_to_end(name)
+        else:
+            self.cache[name] = np.array(self.index.load(self.entries[i]))
+            self.evict()
+
+        return self.cache[name]
+
+    def peek(self, i):
+        """ Gets the data of a measurement without loading it in memory nor changing the order of use. If it is in the
+        disk, it is memory mapped.
+
+        :param i: The position of the measurement
+        :return: The data of the measurement
+        """
+        name = self.names[i]
+        if name in self.cache:
+            return self.cache[name]
+        else:
+            return self.index.load(self.entries[i])
+
+    def arrays(self):
+        """ Gets the data of all the measurements, as in self.peek.
+
+        :return: A list with the data of the measurements
+        """
+        return [self.peek(i) for i in range(len(self))]
+
+    def pin(self, i):
+        """ Pins a measurement, so it is kept in memory until it is unpinned.
+
+        :param i: The position of the measurement
+        :return: None
+        """
+        self.pinned.add(self.names[i])
+
+    def unpin(self, i=None):
+        """ Unpins a measurement, so it can be evicted from memory.
+
+        :param i: The position of the measurement. Default=None (all measurements)
+        :return: None
+        """
+        if i is None:
+            self.pinned.clear()
+        else:
+            self.pinned.discard(self.names[i])
+
+        self.evict()
+
+    def evict(self):
+        """ Evicts from memory the least recently used measurements until there are no more than self.capacity. Pinned
+        measurements and those without a journal are never evicted.
+
+        :return: None
+        """
+        evictable = [name for name in self.cache if name not in self.pinned and self.entries[self.names.index(name)]]
+
+        for name in evictable[:max(len(evictable) - self.capacity, 0)]:
+            del self.cache[name]
+
+            if self.on_evict is not None:
+                i = self.names.index(name)
+                self.on_evict(i, self.index.load(self.entries[i]))
+
+    def remove(self, i):
+        """ Removes a measurement from the store. Its journal is not deleted.
+
+        :param i: The position of the measurement
+        :return: None
+        """
+        name = self.names.pop(i)
+        del self.entries[i]
+        self.cache.pop(name, None)
+        self.pinned.discard(name)
+
+    def clear(self):
+        """ Removes all measurements from the store. Their journals are not deleted.
+
+        :return: None
+        """
+        self.names = []
+        self.entries = []
+        self.cache.clear()
+        self.pinned.clear()
+
+    @property
+    def nbytes(self):
+        """ Memory used by the measurements kept in memory, in bytes. """
+        return sum([data.nbytes for data in self.cache.values()])
+
+    def in_memory(self):
+        """ Number of measurements kept in memory
+
+        :return: The number of measurements
+        """
+        return len(self.cache)
@@ -0,0 +1,309 @@
+""" This module includes the tools needed to keep the measurements safe in the disk while they are still running, so they
+can be recovered if Mordor (or the computer) crashes in the middle of a long scan.
+"""
+
+import os
+import time
+import configparser
+
+import numpy as np
+
+
+def journal_path(folder, name, partial=False):
+    """ Gets the path of the journal file of a measurement.
+
+    :param folder: The folder where the journals are stored, typically the tempdata folder
+    :param name: The name of the measurement
+    :param partial: If True, the path of the journal of a measurement in progress is returned. Default=False
+    :return: The path of the journal file
+    """
+    if partial:
+        return os.path.join(folder, name + '.part.npy')
+    else:
+        return os.path.join(folder, name + '.npy')
+
+
+def trim_unmeasured(data):
+    """ Removes the points at the end of a record that were not measured, those whose data columns are all NaN. The
+    first column, the x-data, is not considered, as it is often known before measuring.
+
+    :param data: The record array
+    :return: A view of the record up to the last point measured
+    """
+    if data.ndim != 2 or data.shape[1] < 2:
+        return data
+
+    measured = np.flatnonzero(~np.isnan(data[:, 1:]).all(axis=1))
+    return data[:measured[-1] + 1] if len(measured) > 0 else data[:0]
+
+
+class Journal(object):
+    """ Append-only binary journal of a measurement in progress. The data is stored in a preallocated .npy file that is
+    memory mapped, so every new point is in the file as soon as it is measured. The file is synchronised with the disk in
+    batches to keep the cost low. While the measurement is running, the file has the extension '.part.npy'. It is
+    renamed to '.npy' once it is closed.
+    """
+
+    def __init__(self, folder, name, shape, sync_points=10, sync_interval=2., index=None, experiment=''):
+        """ Constructor of the Journal class
+
+        :param folder: The folder where the journal will be created, typically the tempdata folder
+        :param name: The name of the measurement
+        :param shape: The shape of the record array
+        :param sync_points: Number of writes after which the journal is synchronised with the disk. Default=10
+        :param sync_interval: Maximum time (s) between synchronisations, if there is anything to synchronise. Default=2
+        :param index: The JournalIndex where the journal must be registered. Default=None
+        :param experiment: The id of the experiment the measurement belongs to. Default=''
+        """
+        self.folder = folder
+        self.name = name
+        self.path = journal_path(folder, name, partial=True)
+        self.sync_points = sync_points
+        self.sync_interval = sync_interval
+        self.index = index
+        self.experiment = experiment
+        self.timestamp = time.time()
+
+        self.data = None
+        self.shape = None
+        self.offset = 0
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+        self.allocate(shape)
+
+    def allocate(self, shape):
+        """ Creates (or re-creates) the file of the journal with the given shape. Unmeasured points are NaN.
+
+        :param shape: The shape of the record array
+        :return: None
+        """
+        self.data = None
+        self.data = np.lib.format.open_memmap(self.path, mode='w+', dtype=np.float64, shape=tuple(shape))
+        self.data[:] = np.nan
+        self.shape = self.data.shape
+        self.offset = self.data.offset
+        self.sync()
+
+        self.register(partial=True)
+
+    def register(self, partial):
+        """ Registers the journal in the index, if any.
+
+        :param partial: If the measurement is still in progress
+        :return: None
+        """
+        if self.index is None:
+            return
+
+        self.index.add(self.name, os.path.basename(self.path), self.shape, self.offset, self.timestamp, self.experiment,
+                       partial)
+
+    def entry(self):
+        """ Gets the information needed to load the data of the journal, in the same format used by the JournalIndex.
+
+        :return: A dictionary with the information of the measurement
+        """
+        return {'File': os.path.basename(self.path),
+                'Shape': self.shape,
+                'Offset': self.offset,
+                'Timestamp': self.timestamp,
+                'Partial': self.data is not None}
+
+    def write(self, data, new=None):
+        """ Writes new data in the journal. If the shape of the record has changed, the journal is allocated again.
+
+        :param data: The record array
+        :param new: Index or slice of the rows that have changed since the last write. Default=None (all rows)
+        :return: None
+        """
+        if data.shape != self.data.shape:
+            self.allocate(data.shape)
+            new = None
+
+        if new is None:
+            self.data[:] = data
+        else:
+            self.data[new] = data[new]
+
+        self.pending += 1
+        if self.pending >= self.sync_points or time.monotonic() - self.last_sync > self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """ Synchronises the journal with the disk.
+
+        :return: None
+        """
+        self.data.flush()
+        with open(self.path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self, data=None):
+        """ Writes the final data, if given, and closes the journal, marking the measurement as finished.
+
+        :param data: The final record array. Default=None
+        :return: The path of the finished journal
+        """
+        if data is not None:
+            self.write(data)
+
+        self.sync()
+        self.data = None
+
+        path = journal_path(self.folder, self.name)
+        os.replace(self.path, path)
+        self.path = path
+
+        self.register(partial=False)
+
+        return path
+
+
+class JournalIndex(object):
+    """ Index of the journals stored in a folder. It contains the name, file, shape, byte offset of the data, timestamp,
+    experiment and status of each measurement, so the measurements can be listed without reading their files and the data
+    can be memory mapped directly. The index is read from the disk before every change, so several experiments running in
+    parallel can share it.
+    """
+
+    def __init__(self, folder, filename='index.ini'):
+        """ Constructor of the JournalIndex class
+
+        :param folder: The folder where the journals are stored, typically the tempdata folder
+        :param filename: The name of the index file. Default='index.ini'
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, filename)
+        self.filename = filename
+
+    def read(self):
+        """ Reads the index from the disk.
+
+        :return: A configparser object with one section per measurement
+        """
+        index = configparser.ConfigParser()
+        try:
+            index.read(self.path)
+        except configparser.Error:
+            print('WARNING: The journal index is corrupted. It will be rebuilt.')
+            index = configparser.ConfigParser()
+
+        return index
+
+    def write(self, index):
+        """ Writes the index in the disk, replacing the previous one. If it is empty, the file is removed.
+
+        :param index: A configparser object with one section per measurement
+        :return: None
+        """
+        if len(index.sections()) == 0:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            index.write(f)
+        os.replace(tmp, self.path)
+
+    def add(self, name, filename, shape, offset, timestamp, experiment, partial):
+        """ Adds a measurement to the index or updates its entry.
+
+        :param name: The name of the measurement
+        :param filename: The name of the file containing the data
+        :param shape: The shape of the data
+        :param offset: The byte offset of the data within the file
+        :param timestamp: The time the measurement was started
+        :param experiment: The id of the experiment the measurement belongs to
+        :param partial: If the measurement is still in progress or was interrupted
+        :return: None
+        """
+        index = self.read()
+        index[name] = {'File': filename,
+                       'Shape': ','.join([str(n) for n in shape]),
+                       'Offset': str(offset),
+                       'Timestamp': str(timestamp),
+                       'Experiment': experiment,
+                       'Partial': str(partial)}
+        self.write(index)
+
+    def remove(self, names):
+        """ Removes measurements from the index. Their files are not deleted.
+
+        :param names: List with the names of the measurements
+        :return: None
+        """
+        index = self.read()
+        for name in names:
+            index.remove_section(name)
+        self.write(index)
+
+    def entries(self, experiment):
+        """ Gets the measurements of an experiment, sorted by the time they were started. Entries whose file does not
+        exist anymore are ignored.
+
+        :param experiment: The id of the experiment
+        :return: A list of (name, entry) tuples, where the entry is a dictionary with the information of the measurement
+        """
+        index = self.read()
+        entries = []
+        for name in index.sections():
+            entry = index[name]
+            if entry['Experiment'] != experiment or not os.path.exists(os.path.join(self.folder, entry['File'])):
+                continue
+
+            entries.append((name, {'File': entry['File'],
+                                   'Shape': tuple([int(n) for n in entry['Shape'].split(',') if n != '']),
+                                   'Offset': int(entry['Offset']),
+                                   'Timestamp': float(entry['Timestamp']),
+                                   'Partial': entry.getboolean('Partial')}))
+
+        return sorted(entries, key=lambda e: e[1]['Timestamp'])
+
+    def load(self, entry):
+        """ Memory maps the data of a measurement, so it is read from the disk only when it is actually used. The data
+        of a measurement that was interrupted ends at the last point measured.
+
+        :param entry: The entry of the measurement, as returned by self.entries
+        :return: A read-only array with the data
+        """
+        path = os.path.join(self.folder, entry['File'])
+        try:
+            data = np.memmap(path, dtype=np.float64, mode='r', offset=entry['Offset'], shape=entry['Shape'])
+        except ValueError:
+            # The file has changed since it was indexed, so we read its header again
+            data = np.load(path, mmap_mode='r')
+
+        if entry['Partial']:
+            data = trim_unmeasured(data)
+
+        return data
+
+    def scan(self, experiment):
+        """ Adds to the index the files of an experiment that are not indexed, like those written by older versions of
+        Mordor. Text files are converted to journals, so they don't need to be parsed again.
+
+        :param experiment: The id of the experiment
+        :return: None
+        """
+        indexed = [entry['File'] for name, entry in self.entries(experiment)]
+
+        for f in sorted(os.listdir(self.folder)):
+            name = f.split('.')[0]
+            path = os.path.join(self.folder, f)
+            if experiment not in name or f in indexed or f.startswith(self.filename):
+                continue
+
+            if f.endswith('.npy'):
+                data = np.load(path, mmap_mode='r')
+                self.add(name, f, data.shape, data.offset, os.path.getmtime(path), experiment, f.endswith('.part.npy'))
+            else:
+                data = np.loadtxt(path)
+                journal = Journal(self.folder, name, data.shape, index=self, experiment=experiment)
+                journal.timestamp = os.path.getmtime(path)
+                journal.close(data)
+                os.remove(path)
@@ -4,14 +4,26 @@ on a given subfigure.
 
 __author__ = 'diego'
 
+import time
+import warnings
+import weakref
+from collections import deque
 
-def update(subplot, ydata, xdata=None, idx=-1):
+import numpy as np
+
+# Decimators and bounds associated to each subplot. See 'get_decimator' and 'get_bounds' below.
+_decimators = weakref.WeakKeyDictionary()
+_bounds = weakref.WeakKeyDictionary()
+
+
+def update(subplot, ydata, xdata=None, idx=-1, new=None):
     """ Updates the x and y data in the plot idx. Afterwards, it changes the scale to fit all the data.
 
     :param subplot: Subplot that want to be updated
     :param ydata: The new y-data. It must be the same that the corresponding x-data
     :param xdata: The new x-data. By default, it uses the existing x-data
     :param idx: The index of the plot to be updated. By default, we update the last plot
+    :param new: Index or slice of the data that has changed since the last update. Default=None (all data is new)
     :return: 0 if OK
     """
 
@@ -19,25 +31,48 @@ def update(subplot, ydata, xdata=None, idx=-1):
     lplot = len(subplot.lines)
     assert lplot > 0, '*** Error udating the plot: There is no plot to update.'
 
+    # The line might show decimated data, so we use the full resolution data stored in the decimator
+    decimator = get_decimator(subplot)
+    line = subplot.lines[idx]
+    old_xdata, old_ydata = decimator.get_data(line)
+
     # Check if the lengths of the x and y data are compatible
     ly = len(ydata)
     if xdata is not None:
         lx = len(xdata)
     else:
-        lx = len(subplot.lines[idx].get_xdata())
+        lx = len(old_xdata)
     assert ly == lx, '*** Error udating the plot: x and y data must have the same lenght. x: {0}, y: {1}'.format(
         lx, ly)
 
     # So far, so good. We update the plot and the scale
-    subplot.lines[idx].set_ydata(ydata)
-    update_scale(subplot, ydata, axis='y')
-
     if xdata is not None:
-        subplot.lines[idx].set_xdata(xdata)
+        decimator.set_data(line, xdata, ydata)
         update_scale(subplot, xdata, axis='x')
+    else:
+        decimator.set_data(line, old_xdata, ydata)
+
+    update_scale(subplot, ydata, axis='y', new=new, source=line)
 
     return 0
 
+
+def plot(subplot, xdata, ydata, *args, **kwargs):
+    """ Plots new data in the subplot. Matplotlib only gets a decimated version of the data if it is too long to be
+    seen in the screen, but the full resolution data is kept in the decimator.
+
+    :param subplot: The subplot where data is to be ploted
+    :param xdata: The x-data
+    :param ydata: The y-data
+    :param args: Any other positional argument accepted by the matplotlib 'plot' function (eg. the format 'r')
+    :param kwargs: Any other keyword argument accepted by the matplotlib 'plot' function (eg. color='k')
+    :return: The new line
+    """
+    line, = subplot.plot([], [], *args, **kwargs)
+    get_decimator(subplot).set_data(line, xdata, ydata)
+
+    return line
+
 def update_labels(subplot, xlabel, ylabel):
     subplot.set_xlabel(xlabel)
     subplot.set_ylabel(ylabel)
@@ -81,40 +116,51 @@ def clear(subplot, xtitle=None, xticks='on', ytitle=None, yticks='on'):
     return 0
 
 
-def update_scale(subplot, data, axis='y'):
+def update_scale(subplot, data, axis='y', new=None, source=None):
     """ Updates the axis of a subplot to certain max/min values. Special care has to be taken in the case of log-scale
     to ensure that the limits are always possitive values.
 
+    The bounds of the data are tracked by the AxisBounds object of the subplot, so when only a few points have changed
+    since the last update of the same source, only those are checked. The limits of the axis are only changed when the
+    data leaves the current limits (or becomes much narrower than them), so most updates do not need a relayout.
+
     :param subplot: The subplot to be updated
     :param data: 1D array. The data used to calculate the scale
     :param axis: 'x' or 'y'. The axis whose scale is to be updated. Default='y'
-    :return: Return 0 if OK.
+    :param new: Index or slice of the data that has changed since the last update. Default=None (all data is new)
+    :param source: The object the data belongs to, usually a line. If it changes, all data is considered new.
+    :return: True if the limits of the axis have changed, False otherwise.
     """
     assert axis == 'x' or axis == 'y', '*** Error updating the scale: Axis option must be \'x\' or \'y\' '
 
-    if axis=='y':
-        scale_type = subplot.get_yaxis().get_scale()
+    bounds = get_bounds(subplot, axis)
 
-        if scale_type == 'log':
-            min_data = min(data[data > 0])
+    if axis == 'y':
+        if new is None or source is None or source is not bounds.source:
+            bounds.reset(data, source)
         else:
-            min_data = min(data) - 0.05*abs(min(data))
+            bounds.add(np.asarray(data)[new])
 
-        max_data = max(data) + 0.05*abs(max(data))
-        if abs(min_data)+abs(max_data) == 0:
-            min_data = -1
-            max_data = 1
+        return bounds.update()
+    else:
+        # Records allocated for the whole measurement have NaN in the points not measured yet
+        finite = np.flatnonzero(np.isfinite(data))
+        if len(finite) == 0:
+            return False
+        return bounds.update_ends(data[finite[0]], data[finite[-1]])
 
-        if scale_type == 'log' and min_data <= 0:
-            min_data = max_data/10
 
-        subplot.set_ybound(lower=min_data, upper=max_data)
-    else:
-        min_data = data[0]
-        max_data = data[-1]
-        subplot.set_xbound(lower=min_data, upper=max_data)
+def get_bounds(subplot, axis='y'):
+    """ Gets the AxisBounds object tracking the data of one of the axis of a subplot, creating it if it does not exist.
 
-    return 0
+    :param subplot: The subplot
+    :param axis: 'x' or 'y'. Default='y'
+    :return: The AxisBounds object
+    """
+    if subplot not in _bounds:
+        _bounds[subplot] = {'x': AxisBounds(subplot, 'x'), 'y': AxisBounds(subplot, 'y')}
+
+    return _bounds[subplot][axis]
 
 
 def plot_all(subplot, data, idx=(0, 1), color=None):
@@ -135,12 +181,448 @@ def plot_all(subplot, data, idx=(0, 1), color=None):
 
     if color is None:
         for i in range(n):
-            subplot.plot(data[i][:, idx[0]], data[i][:, idx[1]])
+            plot(subplot, data[i][:, idx[0]], data[i][:, idx[1]])
     else:
         for i in range(n):
-            subplot.plot(data[i][:, idx[0]], data[i][:, idx[1]], color=color)
+            plot(subplot, data[i][:, idx[0]], data[i][:, idx[1]], color=color)
 
     update_scale(subplot, data[-1][:, idx[0]], axis='x')
     update_scale(subplot, data[-1][:, idx[1]], axis='y')
 
-    return 0
\ No newline at end of file
+    return 0
+
+
+def decimate(xdata, ydata, bins):
+    """ Reduces the number of points of a trace keeping its envelope. The data is divided in bins of consecutive points
+    and only the minimum and the maximum of each bin are kept, in the same order they appear. NaN are ignored unless
+    all the points of a bin are NaN.
+
+    :param xdata: 1D array. The x-data
+    :param ydata: 1D array. The y-data
+    :param bins: Number of bins. The output will have, at most, twice this number of points.
+    :return: A tuple with the decimated x and y data
+    """
+    n = len(ydata)
+    bins = max(int(bins), 1)
+    if n <= 2 * bins:
+        return xdata, ydata
+
+    # We fill the last bin with NaN, so all bins have the same number of points and we can work with a 2D array
+    width = int(np.ceil(n / bins))
+    rows = int(np.ceil(n / width))
+    y = np.full(rows * width, np.nan)
+    y[:n] = ydata
+    y = y.reshape((rows, width))
+
+    nan = np.isnan(y)
+    offset = np.arange(rows) * width
+    i_min = np.argmin(np.where(nan, np.inf, y), axis=1) + offset
+    i_max = np.argmax(np.where(nan, -np.inf, y), axis=1) + offset
+
+    # Both points of each bin are sorted, so the trace is not folded back
+    idx = np.empty(2 * rows, dtype=int)
+    idx[0::2] = np.minimum(i_min, i_max)
+    idx[1::2] = np.maximum(i_min, i_max)
+    idx = np.minimum(idx, n - 1)
+
+    return np.asarray(xdata)[idx], np.asarray(ydata)[idx]
+
+
+def get_decimator(subplot):
+    """ Gets the decimator associated to a subplot, creating a new one if it does not exist.
+
+    :param subplot: The subplot
+    :return: The Decimator of the subplot
+    """
+    if subplot not in _decimators:
+        _decimators[subplot] = Decimator(subplot)
+
+    return _decimators[subplot]
+
+
+class AxisBounds(object):
+    """ Running bounds of the data shown in one axis of a subplot. The bounds can be updated with all the data at once,
+    using vectorized functions, or with just the new points, in O(1) per point. The limits of the axis are calculated
+    from these bounds with some hysteresis, so they only change when the data leaves the current limits or when the data
+    fills too small a fraction of them.
+    """
+
+    def __init__(self, subplot, axis='y', margin=0.05, hysteresis=0.1):
+        """ Constructor of the AxisBounds class
+
+        :param subplot: The subplot
+        :param axis: 'x' or 'y'. Default='y'
+        :param margin: Relative margin between the data and the limits of the axis. Default=0.05
+        :param hysteresis: Extra room, relative to the data range, left when the limits need to be expanded. Default=0.1
+        """
+        self.subplot = subplot
+        self.axis = axis
+        self.margin = margin
+        self.hysteresis = hysteresis
+
+        self.source = None
+        self.lo = np.inf
+        self.hi = -np.inf
+        self.ends = None
+        self.limits = None
+
+    def is_log(self):
+        """ Checks if the axis is in logarithmic scale
+
+        :return: True if it is log, False otherwise
+        """
+        if self.axis == 'y':
+            return self.subplot.get_yaxis().get_scale() == 'log'
+        else:
+            return self.subplot.get_xaxis().get_scale() == 'log'
+
+    def get_limits(self):
+        """ Gets the current limits of the axis
+
+        :return: A tuple with the lower and upper limits
+        """
+        if self.axis == 'y':
+            return self.subplot.get_ybound()
+        else:
+            return self.subplot.get_xbound()
+
+    def set_limits(self, lower, upper):
+        """ Sets the limits of the axis
+
+        :param lower: The lower limit
+        :param upper: The upper limit
+        :return: None
+        """
+        if self.axis == 'y':
+            self.subplot.set_ybound(lower=lower, upper=upper)
+        else:
+            self.subplot.set_xbound(lower=lower, upper=upper)
+
+    def reset(self, data, source=None):
+        """ Forgets the previous bounds and calculates them again with the new data
+
+        :param data: 1D array. All the data
+        :param source: The object the data belongs to. Default=None
+        :return: None
+        """
+        self.source = source
+        self.lo = np.inf
+        self.hi = -np.inf
+        self.add(data)
+
+    def add(self, data):
+        """ Updates the bounds with some new data. NaN are ignored and, in log scale, so are the negative values.
+
+        :param data: A number or an array with the new data
+        :return: None
+        """
+        data = np.asarray(data, dtype=float)
+        if data.size == 0:
+            return
+
+        if self.is_log():
+            data = np.where(data > 0, data, np.nan)
+
+        # All-NaN data simply do not change the bounds
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo = np.nanmin(data)
+            hi = np.nanmax(data)
+
+        if lo < self.lo:
+            self.lo = float(lo)
+        if hi > self.hi:
+            self.hi = float(hi)
+
+    def target(self):
+        """ Calculates the ideal limits for the current bounds of the data.
+
+        :return: A tuple with the lower and upper limits
+        """
+        log = self.is_log()
+
+        if log:
+            min_data = self.lo
+        else:
+            min_data = self.lo - self.margin * abs(self.lo)
+
+        max_data = self.hi + self.margin * abs(self.hi)
+        if abs(min_data) + abs(max_data) == 0:
+            min_data = -1
+            max_data = 1
+
+        if log and (min_data <= 0 or not np.isfinite(min_data)):
+            min_data = max_data / 10
+
+        return min_data, max_data
+
+    def update(self):
+        """ Updates the limits of the axis, if necessary.
+
+        :return: True if the limits have changed, False otherwise
+        """
+        if not np.isfinite(self.hi):
+            return False
+
+        lower, upper = self.target()
+        current_lower, current_upper = self.get_limits()
+
+        # In log scale, the comparison and the margins are calculated with the logarithm of the limits
+        log = self.is_log() and upper > 0
+        if log:
+            lower, upper = np.log10(lower), np.log10(upper)
+            current_lower = np.log10(current_lower) if current_lower > 0 else -np.inf
+            current_upper = np.log10(current_upper) if current_upper > 0 else -np.inf
+
+        span = upper - lower
+        inside = current_lower <= lower and upper <= current_upper
+        tight = span >= (1 - 2 * self.hysteresis) * (current_upper - current_lower)
+        if inside and tight:
+            return False
+
+        # We leave some extra room in the direction the data is growing
+        if lower < current_lower:
+            lower = lower - self.hysteresis * span
+        if upper > current_upper:
+            upper = upper + self.hysteresis * span
+
+        if log:
+            lower, upper = 10 ** lower, 10 ** upper
+
+        self.set_limits(lower, upper)
+        return True
+
+    def update_ends(self, first, last):
+        """ Updates the limits of the axis to go from the first to the last point of the data, typically the x axis.
+
+        :param first: The first point of the data
+        :param last: The last point of the data
+        :return: True if the limits have changed, False otherwise
+        """
+        if (first, last) == self.ends and self.get_limits() == self.limits:
+            return False
+
+        self.set_limits(first, last)
+        self.ends = (first, last)
+        self.limits = self.get_limits()
+        return True
+
+
+class Decimator(object):
+    """ Level-of-detail manager for the lines of a subplot. It keeps the full resolution data of each line, but matplotlib
+    only gets about twice as many points as pixels wide is the subplot. The decimated data is recalculated every time
+    the limits of the x axis change (eg. zooming or panning with the toolbar) so the detail comes back when zooming in.
+    """
+
+    def __init__(self, subplot, points_per_pixel=2):
+        """ Constructor of the Decimator class
+
+        :param subplot: The subplot whose lines are to be decimated
+        :param points_per_pixel: Approximate number of points sent to matplotlib per pixel of the subplot. Default=2
+        """
+        self.subplot = subplot
+        self.bins_per_pixel = points_per_pixel / 2.
+        self.sources = weakref.WeakKeyDictionary()
+        self.xlim = None
+
+        self.cid = self.subplot.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+    def get_data(self, line):
+        """ Gets the full resolution data of a line. If the line is not managed by the decimator, the data of the line
+        is returned.
+
+        :param line: The line
+        :return: A tuple with the x and y data
+        """
+        if line in self.sources:
+            return self.sources[line]
+        else:
+            return line.get_xdata(), line.get_ydata()
+
+    def set_data(self, line, xdata, ydata):
+        """ Sets the full resolution data of a line and updates the decimated data shown in the plot.
+
+        :param line: The line
+        :param xdata: 1D array. The x-data
+        :param ydata: 1D array. The y-data
+        :return: None
+        """
+        self.sources[line] = (xdata, ydata)
+        self.render(line)
+
+    def set_source(self, line, xdata, ydata):
+        """ Replaces the full resolution data of a line by an equivalent one, eg. the same data memory mapped from the
+        disk, without updating the plot.
+
+        :param line: The line
+        :param xdata: 1D array. The x-data
+        :param ydata: 1D array. The y-data
+        :return: None
+        """
+        if line in self.sources:
+            self.sources[line] = (xdata, ydata)
+
+    def render(self, line):
+        """ Decimates the data of a line within the current limits of the x axis.
+
+        :param line: The line
+        :return: None
+        """
+        xdata, ydata = self.sources[line]
+        bins = self.bins_per_pixel * self.subplot.bbox.width
+        if bins < 1:
+            bins = 1000
+
+        if len(ydata) > 2 * bins:
+            xdata, ydata = self.visible(xdata, ydata)
+            xdata, ydata = decimate(xdata, ydata, bins)
+
+        line.set_data(xdata, ydata)
+
+    def visible(self, xdata, ydata):
+        """ Crops the data to the current limits of the x axis, plus one point at each side so the line reaches the
+        edges of the plot. This is only possible for monotonically increasing x data; otherwise, all data is returned.
+
+        :param xdata: 1D array. The x-data
+        :param ydata: 1D array. The y-data
+        :return: A tuple with the cropped x and y data
+        """
+        xdata = np.asarray(xdata)
+        if not np.all(xdata[1:] >= xdata[:-1]):
+            return xdata, ydata
+
+        xmin, xmax = sorted(self.subplot.get_xlim())
+        i = max(np.searchsorted(xdata, xmin) - 1, 0)
+        k = np.searchsorted(xdata, xmax) + 1
+
+        return xdata[i:k], np.asarray(ydata)[i:k]
+
+    def refresh(self):
+        """ Updates the decimated data of all the lines of the subplot.
+
+        :return: None
+        """
+        for line in list(self.sources.keys()):
+            if line in self.subplot.lines:
+                self.render(line)
+
+    def on_xlim_changed(self, subplot):
+        """ Callback of the 'xlim_changed' event of the subplot. The data is only decimated again if the limits have
+        actually changed.
+
+        :param subplot: The subplot whose limits have changed
+        :return: None
+        """
+        xlim = tuple(subplot.get_xlim())
+        if xlim != self.xlim:
+            self.xlim = xlim
+            self.refresh()
+
+
+class Blitter(object):
+    """ Incremental renderer for a figure canvas. The static part of the figure (axes, grid, ticks and any old trace) is
+    cached as a background image and only the animated lines are redrawn on top of it when their data changes. A full
+    redraw is only needed when something in the background changes, eg. the limits of the axes.
+    """
+
+    def __init__(self, canvas, history=50):
+        """ Constructor of the Blitter class
+
+        :param canvas: The matplotlib canvas to render
+        :param history: Number of frames used to calculate the refresh rate. Default=50
+        """
+        self.canvas = canvas
+        self.background = None
+        self.artists = []
+
+        self.frames = 0
+        self.full_redraws = 0
+        self.frame_times = deque(maxlen=history)
+
+        # Every time the canvas is fully drawn (by us, the toolbar, a resize...) the background is captured again
+        self.cid = self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        """ Callback of the 'draw_event'. It stores the new background and draws the animated artists on top of it.
+
+        :param event: The matplotlib event. Not used.
+        :return: None
+        """
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        """ Draws the animated artists without drawing anything else.
+
+        :return: None
+        """
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+
+    def animate(self, artists=()):
+        """ Sets the artists that will be redrawn in every frame. Any previous animated artist becomes part of the static
+        background again. The whole canvas is redrawn to capture the new background.
+
+        :param artists: A list of artists (typically Line2D) that will change. Default=() (none)
+        :return: None
+        """
+        for artist in self.artists:
+            artist.set_animated(False)
+
+        self.artists = list(artists)
+        for artist in self.artists:
+            artist.set_animated(True)
+
+        self.canvas.draw()
+
+    def release(self):
+        """ Forgets the animated artists without redrawing the canvas. To be used when the artists are removed from
+        the axes.
+
+        :return: None
+        """
+        for artist in self.artists:
+            artist.set_animated(False)
+
+        self.artists = []
+
+    def update(self, full=False):
+        """ Refreshes the canvas. Only the animated artists are redrawn unless a full redraw is requested or there is
+        no background available, yet.
+
+        :param full: If True, the whole canvas is redrawn. Default=False
+        :return: None
+        """
+        if full or self.background is None:
+            self.canvas.draw()
+            self.full_redraws += 1
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+
+        self.frames += 1
+        self.frame_times.append(time.perf_counter())
+
+    def reset_counter(self):
+        """ Resets the frame counters.
+
+        :return: None
+        """
+        self.frames = 0
+        self.full_redraws = 0
+        self.frame_times.clear()
+
+    def fps(self):
+        """ Calculates the refresh rate of the canvas using the last frames.
+
+        :return: The number of frames per second, or 0 if there are not enough frames.
+        """
+        if len(self.frame_times) < 2:
+            return 0.
+
+        elapsed = self.frame_times[-1] - self.frame_times[0]
+        if elapsed <= 0:
+            return 0.
+
+        return (len(self.frame_times) - 1) / elapsed
@@ -0,0 +1,9 @@
+""" The tests import the modules of Mordor from its folder, as Mordor itself does. Run them from the Mordor folder with:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+""" Tests of the acquisition engine and of the scheduler that paces it """
+
+import time
+import threading
+
+from Experiments.acquisition import Acquisition, DeadlineScheduler
+
+
+class Window(object):
+    """ Stand-in for the widget used to schedule the draining of the buffer. The tests drain it themselves """
+
+    def after(self, ms, func, *args):
+        pass
+
+
+def test_scheduler_does_not_drift():
+    period = 0.02
+    scheduler = DeadlineScheduler(period)
+
+    start = time.monotonic()
+    for i in range(20):
+        scheduler.wait()
+        # The work of each step is part of the period, not added to it
+        time.sleep(period / 4)
+    elapsed = scheduler.times[-1] - start
+
+    assert abs(elapsed - 19 * period) < period / 2
+    assert scheduler.missed == 0
+
+
+def test_late_step_shifts_the_next_deadlines():
+    period = 0.02
+    scheduler = DeadlineScheduler(period)
+
+    scheduler.wait()
+    time.sleep(3 * period)
+    scheduler.wait()
+    late = time.monotonic()
+    scheduler.wait()
+
+    # The next step waits a whole period, rather than running at once to catch up
+    assert scheduler.missed == 1
+    assert time.monotonic() - late > 0.8 * period
+
+
+def test_scheduler_wait_is_interrupted():
+    scheduler = DeadlineScheduler(10.)
+    event = threading.Event()
+    event.set()
+
+    scheduler.wait(event)
+    start = time.monotonic()
+    assert scheduler.wait(event)
+    assert time.monotonic() - start < 1.
+
+
+def test_finite_acquisition_keeps_all_the_data():
+    data = []
+    acquisition = Acquisition(Window(), lambda i: i, data.extend, points=20000, maxlen=10)
+    acquisition.start()
+    acquisition.worker.join()
+    acquisition.poll()
+
+    assert data == list(range(20000))
+    assert acquisition.dropped == 0
+
+
+def test_endless_acquisition_counts_the_data_lost():
+    data = []
+    acquisition = Acquisition(Window(), lambda i: i, data.extend, maxlen=10)
+    acquisition.start()
+    time.sleep(0.05)
+    acquisition.stop()
+    acquisition.worker.join()
+    acquisition.poll()
+
+    assert len(data) == 10
+    assert acquisition.dropped == data[-1] + 1 - len(data)
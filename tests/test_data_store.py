@@ -0,0 +1,62 @@
+""" Tests of the store that keeps in memory only the most recent measurements """
+
+import numpy as np
+
+from journal import Journal, JournalIndex
+from data_store import MeasurementStore
+
+
+def fill(store, folder, count):
+    """ Adds some finished measurements to a store, each full of its number """
+    for i in range(count):
+        data = np.full((5, 3), float(i))
+        journal = Journal(folder, 'iv_{0}'.format(i), data.shape, index=store.index, experiment='iv')
+        journal.close(data)
+        store.add(journal.name, journal.entry(), data)
+
+
+def test_least_recently_used_are_evicted(tmpdir):
+    evicted = []
+    store = MeasurementStore(JournalIndex(str(tmpdir)), capacity=2, on_evict=lambda i, data: evicted.append(i))
+    fill(store, str(tmpdir), 4)
+
+    assert len(store) == 4
+    assert store.in_memory() == 2
+    assert evicted == [0, 1]
+
+    # Using an evicted measurement loads it again, and the least recently used one goes
+    np.testing.assert_array_equal(store.get(0), 0.)
+    assert evicted == [0, 1, 2]
+    assert list(store.cache) == ['iv_3', 'iv_0']
+
+
+def test_evicted_data_is_read_from_the_disk(tmpdir):
+    store = MeasurementStore(JournalIndex(str(tmpdir)), capacity=1)
+    fill(store, str(tmpdir), 3)
+
+    np.testing.assert_array_equal(store.peek(0), 0.)
+    assert store.in_memory() == 1
+    np.testing.assert_array_equal(store[1], 1.)
+
+
+def test_pinned_are_kept_until_unpinned(tmpdir):
+    store = MeasurementStore(JournalIndex(str(tmpdir)), capacity=1)
+    fill(store, str(tmpdir), 1)
+    store.pin(0)
+    fill(store, str(tmpdir), 3)
+
+    assert 'iv_0' in store.cache
+    assert store.in_memory() == 2
+
+    store.unpin(0)
+    assert 'iv_0' not in store.cache
+    assert store.in_memory() == 1
+
+
+def test_measurements_without_journal_are_never_evicted(tmpdir):
+    store = MeasurementStore(JournalIndex(str(tmpdir)), capacity=1)
+    store.add('live', None, np.zeros((5, 3)))
+    fill(store, str(tmpdir), 2)
+
+    assert 'live' in store.cache
+    assert store.in_memory() == 2
@@ -0,0 +1,86 @@
+""" Tests of the planner of the dwell time of the lock-in scans """
+
+import math
+
+import pytest
+
+from Experiments.dwell import DwellPlanner, settling_time
+
+
+class Lockin(object):
+    """ Stand-in for a lock-in, whose readings are given in advance """
+
+    def __init__(self, readings):
+        self.readings = list(readings)
+        self.count = 0
+
+    def measure(self):
+        self.count += 1
+        return self.readings.pop(0) if len(self.readings) > 1 else self.readings[0]
+
+
+class Waits(list):
+    """ Records the waits instead of waiting """
+
+    def __call__(self, seconds):
+        self.append(seconds)
+        return False
+
+
+def test_settling_time_of_one_stage():
+    assert settling_time(0.1, slope=6, accuracy=0.01) == pytest.approx(0.1 * math.log(100), rel=1e-5)
+
+
+def test_steeper_filters_settle_later():
+    times = [settling_time(1., slope) for slope in [6, 12, 18, 24]]
+    assert times == sorted(times)
+    assert settling_time(1., accuracy=1.) == 0.
+
+
+def test_fixed_dwell_without_check():
+    planner = DwellPlanner(0.1, slope=12, accuracy=0.01)
+    waits = Waits()
+    lockin = Lockin([(1., 0.)])
+
+    for _ in range(3):
+        planner.measure(lockin.measure, waits)
+
+    assert waits == [settling_time(0.1, 12, 0.01)] * 3
+    assert lockin.count == 3
+
+
+def test_flat_signal_needs_shorter_dwell():
+    planner = DwellPlanner(0.1, slope=12, accuracy=0.01, check=True, fixed=1.)
+    waits = Waits()
+    lockin = Lockin([(1., 0.)])
+
+    for _ in range(3):
+        planner.measure(lockin.measure, waits)
+
+    # After the first point, the change expected is small, but it is at least one time constant
+    assert planner.dwell() == pytest.approx(0.1)
+    assert planner.dwell() < settling_time(0.1, 12, 0.01)
+    assert 'Time saved' in planner.report()
+
+
+def test_unexpected_change_is_measured_again():
+    planner = DwellPlanner(0.1, slope=12, accuracy=0.01, check=True)
+    waits = Waits()
+    planner.measure(Lockin([(1., 0.)]).measure, waits)
+    planner.measure(Lockin([(1., 0.)]).measure, waits)
+
+    # A peak: the first reading is far from the last point, so we wait what that change needs and read again
+    lockin = Lockin([(2., 0.), (3., 0.), (3., 0.)])
+    reading = planner.measure(lockin.measure, waits)
+
+    assert reading[0] == 3.
+    assert lockin.count == 3
+    assert planner.checks > 0
+
+
+def test_planner_from_lockin_without_time_constant():
+    planner = DwellPlanner.from_lockin(object(), 300, check=True)
+
+    assert planner.time_constant == 0.3
+    assert planner.slope == 6
+    assert planner.check
@@ -0,0 +1,88 @@
+""" Tests of the journals that keep the measurements in the disk while they run, and of their recovery """
+
+import os
+
+import numpy as np
+
+from journal import Journal, JournalIndex, journal_path, trim_unmeasured
+
+
+def record(points):
+    data = np.full((points, 3), np.nan)
+    data[:, 0] = np.arange(points)
+    return data
+
+
+def test_trim_unmeasured_ignores_the_x_column():
+    data = record(5)
+    data[:2, 1:] = 1.
+    data[3, 2] = 2.
+
+    assert len(trim_unmeasured(data)) == 4
+    assert len(trim_unmeasured(record(5))) == 0
+
+
+def test_trim_unmeasured_keeps_other_shapes():
+    data = np.full(5, np.nan)
+    assert trim_unmeasured(data) is data
+
+
+def test_interrupted_journal_is_recovered_up_to_the_last_point(tmpdir):
+    folder = str(tmpdir)
+    index = JournalIndex(folder)
+    data = record(10)
+
+    journal = Journal(folder, 'iv_1', data.shape, sync_points=1, index=index, experiment='iv')
+    data[:4, 1:] = [[1., 2.]] * 4
+    journal.write(data, slice(0, 4))
+
+    # The journal is not closed, as if Mordor had crashed. A new session finds it in the index
+    entries = JournalIndex(folder).entries('iv')
+    assert [name for name, entry in entries] == ['iv_1']
+    assert entries[0][1]['Partial']
+    assert os.path.exists(journal_path(folder, 'iv_1', partial=True))
+
+    recovered = index.load(entries[0][1])
+    np.testing.assert_array_equal(recovered, data[:4])
+
+
+def test_closed_journal_is_complete(tmpdir):
+    folder = str(tmpdir)
+    index = JournalIndex(folder)
+    data = record(10)
+    data[:, 1:] = 1.
+
+    journal = Journal(folder, 'iv_1', data.shape, index=index, experiment='iv')
+    path = journal.close(data)
+
+    assert path == journal_path(folder, 'iv_1')
+    assert not os.path.exists(journal_path(folder, 'iv_1', partial=True))
+
+    name, entry = index.entries('iv')[0]
+    assert not entry['Partial']
+    np.testing.assert_array_equal(index.load(entry), data)
+
+
+def test_journal_is_allocated_again_if_the_record_changes(tmpdir):
+    folder = str(tmpdir)
+    index = JournalIndex(folder)
+
+    journal = Journal(folder, 'iv_1', (10, 3), index=index, experiment='iv')
+    data = record(4)
+    data[:, 1:] = 3.
+    journal.write(data, slice(0, 1))
+
+    assert journal.shape == (4, 3)
+    np.testing.assert_array_equal(index.load(index.entries('iv')[0][1]), data)
+
+
+def test_entries_without_file_are_ignored(tmpdir):
+    folder = str(tmpdir)
+    index = JournalIndex(folder)
+    Journal(folder, 'iv_1', (2, 3), index=index, experiment='iv').close(np.ones((2, 3)))
+    Journal(folder, 'iv_2', (2, 3), index=index, experiment='iv').close(np.ones((2, 3)))
+
+    os.remove(journal_path(folder, 'iv_1'))
+
+    assert [name for name, entry in index.entries('iv')] == ['iv_2']
+    assert index.entries('spec') == []
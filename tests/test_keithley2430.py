@@ -0,0 +1,110 @@
+""" Tests of the driver of the Keithley 2430, driven by its simulator instead of the instrument """
+
+import time
+
+import numpy as np
+import pytest
+
+from Devices.Keithley2430 import Keithley2430
+from Simulators.ports import TcpPort
+import Simulators.Keithley2430 as simulator
+
+
+@pytest.fixture
+def sim():
+    instrument = simulator.New(seed=0)
+    port = TcpPort(instrument, 0)
+    port.start()
+    yield instrument, port
+    port.close()
+
+
+@pytest.fixture
+def smu(sim):
+    device = Keithley2430(sim[1].address)
+    yield device
+    device.close()
+
+
+def test_coalesce_joins_the_commands():
+    assert Keithley2430.coalesce([':A 1', ':B 2', ':C 3']) == [':A 1;:B 2;:C 3']
+    assert Keithley2430.coalesce([]) == []
+
+
+def test_coalesce_keeps_the_messages_short():
+    commands = [':SOUR:VOLT:STAR {0}'.format(i) for i in range(20)]
+    messages = Keithley2430.coalesce(commands, max_length=60)
+
+    assert all(len(m) < 60 for m in messages)
+    assert ';'.join(messages).split(';') == commands
+
+
+def test_unchanged_settings_are_not_sent(sim, smu):
+    instrument = sim[0]
+    smu.setup_measurement('dc', 'v', compliance=0.1, measRange=0, intTime=1)
+    smu.report()
+    messages = instrument.messages
+
+    smu.setup_measurement('dc', 'v', compliance=0.1, measRange=0, intTime=1)
+    commands, skipped, transactions = smu.report()
+
+    assert skipped == commands
+    assert transactions == 0
+    assert instrument.messages == messages
+
+
+def test_settings_are_sent_in_few_messages(sim, smu):
+    instrument = sim[0]
+    smu.report()
+    messages = instrument.messages
+
+    smu.setup_measurement('dc', 'i', compliance=1, measRange=2, intTime=2)
+    commands, skipped, transactions = smu.report()
+
+    assert 0 < transactions < commands / 4
+    # The messages are written without waiting for the simulator to handle them
+    time.sleep(0.1)
+    assert instrument.messages == messages + transactions
+    assert instrument.settings['SOUR:FUNC'] == 'CURR'
+
+
+def test_invalidate_sends_everything_again(smu):
+    smu.set(':SOUR:DEL', 0.)
+    smu.flush()
+    smu.set(':SOUR:DEL', 0.)
+    assert smu.pending == []
+
+    smu.invalidate()
+    smu.set(':SOUR:DEL', 0.)
+    assert smu.pending == [':SOUR:DEL 0.0']
+
+
+def test_failed_write_invalidates_the_settings(smu):
+    smu.set(':SOUR:DEL', 0.)
+    smu.flush()
+
+    def fail(message):
+        raise IOError('The instrument is gone')
+
+    smu.device.write = fail
+    smu.set(':SOUR:DEL', 1.)
+    with pytest.raises(IOError):
+        smu.flush()
+
+    assert smu.state == {}
+
+
+def test_sweep_through_the_simulator(smu):
+    smu.measure(source='v', start=0., stop=0.6, step=0.01, compliance=0.1, measRange=0, intTime=0)
+
+    partial = smu.get_partial_data()
+    assert smu.wait_for_completion(timeout=30)
+    voltage, current = smu.get_data()
+
+    assert len(voltage) == len(current) == 61
+    np.testing.assert_allclose(voltage, np.linspace(0, 0.6, 61), atol=1e-6)
+    np.testing.assert_allclose(partial[0], voltage[:len(partial[0])], rtol=1e-5)
+
+    finished = smu.get_partial_data()
+    assert finished[2]
+    np.testing.assert_allclose(finished[1], current, rtol=1e-5)
@@ -0,0 +1,57 @@
+""" Tests of the reading of the IEEE 488.2 binary blocks sent by the instruments """
+
+import io
+
+import numpy as np
+import pytest
+
+from Devices.visa_resources import read_block
+
+
+class Resource(object):
+    """ Stand-in for a VISA resource, with the answer of the instrument already written """
+
+    def __init__(self, answer):
+        self.answer = io.BytesIO(answer)
+
+    def read_bytes(self, count):
+        return self.answer.read(count)
+
+    def read(self):
+        return self.answer.read().decode()
+
+
+def test_block_with_length():
+    values = np.arange(4, dtype='<f4')
+    data = read_block(Resource(b'#216' + values.tobytes() + b'\n'), '<f4')
+
+    np.testing.assert_array_equal(data, values)
+
+
+def test_leading_white_space_is_skipped():
+    values = np.arange(2, dtype='>f8')
+    data = read_block(Resource(b' \n#216' + values.tobytes() + b'\n'), '>f8')
+
+    np.testing.assert_array_equal(data, values)
+
+
+def test_block_without_length_needs_the_count():
+    values = np.arange(6, dtype='<f4')
+    resource = Resource(b'#0' + values.tobytes() + b'\n')
+
+    np.testing.assert_array_equal(read_block(resource, '<f4', count=6), values)
+
+    with pytest.raises(ValueError):
+        read_block(Resource(b'#0' + values.tobytes() + b'\n'), '<f4')
+
+
+def test_termination_is_consumed():
+    resource = Resource(b'#18' + np.ones(2, dtype='<f4').tobytes() + b'\n')
+    read_block(resource, '<f4')
+
+    assert resource.answer.read() == b''
+
+
+def test_text_answer_is_rejected():
+    with pytest.raises(ValueError):
+        read_block(Resource(b'1.0,2.0\n'), '<f4')